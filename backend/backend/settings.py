@@ -102,6 +102,35 @@ DATABASES = {
     }
 }
 
+# Cache
+# locmem：单进程内存缓存（默认）；redis / memcached：多个 worker 共享，版本失效对所有进程生效
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+_CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "rhythmfusion"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", "127.0.0.1:11211"),
+}
+CACHES = {
+    "default": {
+        "BACKEND": _CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.getenv("CACHE_LOCATION", _CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000} if CACHE_BACKEND == "locmem" else {},
+    }
+}
+# 各接口的响应缓存时长（秒），0 表示不缓存；写入时通过版本键立即失效。
+# locmem 下版本键只在本进程递增，其他 worker 会返回过期的个人数据，
+# 所以收藏、歌单推荐默认只在共享后端下缓存
+_USER_CACHE_TTL = "0" if CACHE_BACKEND == "locmem" else "300"
+API_CACHE_TTLS = {
+    "song_search": int(os.getenv("CACHE_TTL_SONG_SEARCH", "60")),
+    "genre_songs": int(os.getenv("CACHE_TTL_GENRE_SONGS", "300")),
+    "liked_songs": int(os.getenv("CACHE_TTL_LIKED_SONGS", _USER_CACHE_TTL)),
+    "playlist_recommendations": int(
+        os.getenv("CACHE_TTL_PLAYLIST_RECOMMENDATIONS", _USER_CACHE_TTL)
+    ),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -124,7 +153,7 @@ AUTH_USER_MODEL = "user.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "music.pagination.StandardResultsSetPagination",
@@ -139,6 +168,59 @@ SPECTACULAR_SETTINGS = {
     # OTHER SETTINGS
 }
 
+# Recommender
+# 推荐检索的初始 K；剔除歌单已有歌曲后不足 10 首时按倍数扩大
+RECOMMENDER_SEARCH_K = int(os.getenv("RECOMMENDER_SEARCH_K", "20"))
+# 每隔多少秒检查一次 index_manifest.json，发现新版本即热切换
+RECOMMENDER_INDEX_CHECK_SECONDS = float(
+    os.getenv("RECOMMENDER_INDEX_CHECK_SECONDS", "5")
+)
+# 每隔多少秒用数据库指纹检查一次内存中的歌曲元数据，歌曲的增删改最多滞后这么久
+RECOMMENDER_CATALOG_CHECK_SECONDS = float(
+    os.getenv("RECOMMENDER_CATALOG_CHECK_SECONDS", "5")
+)
+# 新歌曲上传 / 被收藏后，后台增量写入向量并发布新索引版本
+RECOMMENDER_INCREMENTAL_INDEXING = (
+    os.getenv("RECOMMENDER_INCREMENTAL_INDEXING", "1") == "1"
+)
+# “为你推荐”结果的按用户缓存时长（秒）；收藏变化时立即失效
+RECOMMENDER_FOR_YOU_TTL = int(os.getenv("RECOMMENDER_FOR_YOU_TTL", "600"))
+
+# Auth
+# 进程内用户缓存：用户信息变化时立即失效，否则最多缓存这么久（秒）
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+# 黑名单 Bloom 过滤器：每隔多少秒追加新拉黑的 token，多久整体重建一次（剔除过期 token）
+TOKEN_BLACKLIST_REFRESH_SECONDS = float(os.getenv("TOKEN_BLACKLIST_REFRESH_SECONDS", "5"))
+TOKEN_BLACKLIST_REBUILD_SECONDS = float(os.getenv("TOKEN_BLACKLIST_REBUILD_SECONDS", "3600"))
+
+# Music
+# 每隔多少秒用数据库指纹检查一次搜索提示索引，歌曲的修改、删除最多滞后这么久
+MUSIC_SUGGEST_CHECK_SECONDS = float(os.getenv("MUSIC_SUGGEST_CHECK_SECONDS", "5"))
+# 上传 / 导入时每批校验、写入的歌曲数
+MUSIC_UPLOAD_BATCH_SIZE = int(os.getenv("MUSIC_UPLOAD_BATCH_SIZE", "1000"))
+# 单次上传（一个事务）最多的条目数，更大的文件走后台导入任务
+MUSIC_UPLOAD_MAX_ITEMS = int(os.getenv("MUSIC_UPLOAD_MAX_ITEMS", "10000"))
+# 后台导入任务的线程数（每个进程）
+MUSIC_IMPORT_WORKERS = int(os.getenv("MUSIC_IMPORT_WORKERS", "2"))
+# 运行中的任务超过这么久没有 worker 心跳（或排队超过这么久未开始）视为中断，可以续传
+MUSIC_IMPORT_STALE_SECONDS = int(os.getenv("MUSIC_IMPORT_STALE_SECONDS", "600"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # 设为 DEBUG 可看到每个 K 步骤的命中情况
+        "recommender": {
+            "handlers": ["console"],
+            "level": os.getenv("RECOMMENDER_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -1,7 +1,7 @@
 # music/admin.py
 
 from django.contrib import admin
-from .models import Song
+from .models import ImportJob, Song
 
 
 @admin.register(Song)
@@ -9,3 +9,9 @@ class SongAdmin(admin.ModelAdmin):
     list_display = ("title", "artist", "school")
     search_fields = ("title", "artist")
     list_filter = ("artist",)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "processed", "created", "failed", "created_at")
+    list_filter = ("status",)
@@ -9,4 +9,22 @@ class MusicConfig(AppConfig):
     verbose_name = "音乐管理"
 
     def ready(self):
-        pass
+        from django.db.models.signals import post_delete, post_save
+        from . import caching
+        from .models import Song, SongLike
+        from .suggest import song_saved
+
+        # 新歌立即并入本进程的搜索提示索引；修改、删除由定期的指纹检查发现
+        post_save.connect(song_saved, sender=Song, dispatch_uid="suggest_song_saved")
+
+        # 歌曲、收藏变化时递增响应缓存的版本键
+        post_save.connect(caching.song_changed, sender=Song, dispatch_uid="cache_song_saved")
+        post_delete.connect(
+            caching.song_changed, sender=Song, dispatch_uid="cache_song_deleted"
+        )
+        post_save.connect(
+            caching.like_changed, sender=SongLike, dispatch_uid="cache_like_saved"
+        )
+        post_delete.connect(
+            caching.like_changed, sender=SongLike, dispatch_uid="cache_like_deleted"
+        )
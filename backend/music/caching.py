@@ -0,0 +1,138 @@
+# music/caching.py
+
+"""
+Read-through response cache for the hot read endpoints.
+
+A cached response is stored under a key built from the endpoint, the
+current values of the version keys it depends on, the user and the query
+string. Writes never delete entries: signal receivers bump the version
+keys ("songs", "likes:<user id>", "playlist:<id>") once the write has
+committed, so later reads build a new key and the old entries simply
+expire. With a shared backend
+(``CACHE_BACKEND=redis`` / ``memcached``) invalidation reaches every
+worker. Hits and misses are counted per endpoint in the cache itself.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = "api:version:{}"
+RESPONSE_KEY = "api:response:{}:{}"
+STATS_KEY = "api:stats:{}:{}"
+
+
+def _incr(key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, initial, timeout=None)
+        return initial
+
+
+def versions(names):
+    """Current values of the version keys *names*, creating missing ones."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # 被淘汰的版本键用新的随机起点，旧条目不会被误认成当前版本
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(name):
+    """
+    Invalidate every cached response that depends on version *name*, after
+    the current transaction commits (at once outside one).
+    """
+    # 提交前递增的话，事务内的并发读取会把旧数据缓存到新版本下
+    transaction.on_commit(lambda: _incr(VERSION_KEY.format(name), time.time_ns()))
+
+
+def _count(endpoint, outcome):
+    _incr(STATS_KEY.format(endpoint, outcome), 1)
+
+
+def stats(endpoints=None):
+    """``{endpoint: {"hit": n, "miss": n}}`` for the configured endpoints."""
+    endpoints = endpoints or settings.API_CACHE_TTLS
+    keys = {
+        (endpoint, outcome): STATS_KEY.format(endpoint, outcome)
+        for endpoint in endpoints
+        for outcome in ("hit", "miss")
+    }
+    counts = cache.get_many(keys.values())
+    result = {}
+    for (endpoint, outcome), key in keys.items():
+        result.setdefault(endpoint, {})[outcome] = counts.get(key, 0)
+    return result
+
+
+def cached_response(endpoint, request, depends_on, compute, extra=()):
+    """
+    Serve *endpoint* from the cache, or call *compute* (returning a DRF
+    Response) and cache its data when the status is 200. The TTL comes
+    from ``settings.API_CACHE_TTLS[endpoint]``; 0 disables caching.
+    *extra* adds values kept outside the cache (e.g. the live index
+    version) to the key.
+    """
+    ttl = settings.API_CACHE_TTLS.get(endpoint, 0)
+    if not ttl:
+        return compute()
+
+    user = request.user.pk if request.user.is_authenticated else ""
+    parts = [
+        *map(str, versions(depends_on)),
+        *map(str, extra),
+        str(user),
+        request.get_full_path(),
+    ]
+    digest = hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+    key = RESPONSE_KEY.format(endpoint, digest)
+
+    data = cache.get(key)
+    if data is not None:
+        _count(endpoint, "hit")
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    _count(endpoint, "miss")
+    response = compute()
+    if response.status_code == 200:
+        cache.set(key, response.data, ttl)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+# ---------- 信号：写入时递增版本 ----------
+def song_changed(sender, **kwargs):
+    bump("songs")
+
+
+def like_changed(sender, instance, **kwargs):
+    bump(f"likes:{instance.user_id}")
+
+
+def playlist_changed(sender, instance, **kwargs):
+    bump(f"playlist:{instance.pk}")
+
+
+def playlist_songs_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            bump(f"playlist:{instance.pk}")
+        return
+    # 从歌曲一侧修改（song.playlists.add(...)）：pk_set 是歌单 id，clear 时需在清空前取出
+    if action == "pre_clear":
+        pk_set = list(instance.playlists.values_list("pk", flat=True))
+    elif action not in ("post_add", "post_remove"):
+        return
+    for pid in pk_set:
+        bump(f"playlist:{pid}")
@@ -0,0 +1,23 @@
+# music/fields.py
+
+from django.db import models
+
+from .genres import normalize_genre
+
+
+class GenreField(models.CharField):
+    """
+    CharField that always stores the canonical genre code.
+
+    Values are normalised in pre_save (so bulk_create is covered too and the
+    instance sees the stored value) and in get_prep_value, so exact lookups
+    such as ``filter(school="Rock")`` hit the index on the normalised column.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = normalize_genre(getattr(model_instance, self.attname))
+        setattr(model_instance, self.attname, value)
+        return value
+
+    def get_prep_value(self, value):
+        return normalize_genre(super().get_prep_value(value))
@@ -0,0 +1,43 @@
+# music/genres.py
+
+"""
+Canonical genre codes. Song.school stores one of these lowercase codes
+(or the lowercased raw value for genres outside the list); Chinese display
+names and differently-cased spellings are mapped back on write.
+"""
+
+# 可用的流派列表，直接对应数据库中的值
+AVAILABLE_GENRES = [
+    "jpop", "blues", "classical", "country", "dance",
+    "electronic", "folk", "hiphop", "jazz", "kpop",
+    "metal", "pop", "punk", "rnb", "rock"
+]
+
+GENRE_MAP = {
+    "pop": "流行",
+    "rock": "摇滚",
+    "jazz": "爵士",
+    "classical": "古典",
+    "hiphop": "嘻哈",
+    "electronic": "电子",
+    "folk": "民谣",
+    "country": "乡村",
+    "blues": "蓝调",
+    "metal": "金属",
+    "jpop": "日本流行",
+    "kpop": "韩国流行",
+    "rnb": "R&B",
+    "punk": "朋克",
+    "dance": "舞曲",
+}
+
+# 显示名（小写）→ 代码，例如 "摇滚" → "rock"、"r&b" → "rnb"
+_NAME_TO_CODE = {name.lower(): code for code, name in GENRE_MAP.items()}
+
+
+def normalize_genre(value):
+    """Canonical lowercase code for *value*; None stays None."""
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return _NAME_TO_CODE.get(value, value)
@@ -0,0 +1,157 @@
+# music/imports.py
+
+"""
+Background catalog imports.
+
+``POST /api/music/imports/`` stores the file under ``MEDIA_ROOT/imports/``
+and queues an ImportJob on a per-process thread pool, so the request
+returns at once. The worker streams the file through music.ingest and
+commits every batch together with the job counters: progress is visible
+while the job runs, and a job interrupted by a crash or restart can be
+resumed from the last committed batch. Jobs are claimed with conditional
+UPDATEs and each batch is written only while the worker's heartbeat is
+still the one on the row, so one job never runs twice at once.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ingest import MAX_ERRORS, Ingestor, IngestError, iter_items, songs_created
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.MUSIC_IMPORT_WORKERS, thread_name_prefix="music-import"
+)
+
+
+def submit(job):
+    """Queue *job* once the transaction that created / reset it commits."""
+    transaction.on_commit(lambda: _executor.submit(run_job, job.pk))
+
+
+class ClaimLost(Exception):
+    """Another worker took over the job (ours was considered stale)."""
+
+
+def _resumable():
+    cutoff = timezone.now() - timedelta(seconds=settings.MUSIC_IMPORT_STALE_SECONDS)
+    return (
+        Q(status=ImportJob.FAILED)
+        # 运行中的任务看 worker 心跳；排队中的任务只可能因为进程重启而丢失
+        | Q(status=ImportJob.RUNNING, heartbeat_at__lt=cutoff)
+        | Q(status=ImportJob.RUNNING, heartbeat_at__isnull=True)
+        | Q(status=ImportJob.QUEUED, updated_at__lt=cutoff)
+    )
+
+
+def requeue(job):
+    """
+    Put a failed job, or one whose worker stopped sending heartbeats, back
+    in the queue. The status check and the update are one conditional
+    UPDATE, so concurrent resumes queue the job only once; returns whether
+    this call did.
+    """
+    queued = (
+        ImportJob.objects.filter(_resumable(), pk=job.pk)
+        .exclude(file="")
+        .update(status=ImportJob.QUEUED, detail="", updated_at=timezone.now())
+    )
+    if queued:
+        submit(job)
+    return bool(queued)
+
+
+def run_job(job_id):
+    try:
+        job = _claim(job_id)
+        if job is None:
+            logger.info("Import job %s is not queued any more, skipping", job_id)
+            return
+        try:
+            _run(job)
+        except ClaimLost:
+            raise
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            _report(job, status=ImportJob.FAILED, detail=str(e))
+    except ClaimLost:
+        logger.warning("Import job %s was taken over by another worker", job_id)
+    finally:
+        close_old_connections()
+
+
+def _claim(job_id):
+    """QUEUED -> RUNNING for this worker; None if someone else got it first."""
+    now = timezone.now()
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.QUEUED).update(
+        status=ImportJob.RUNNING, detail="", heartbeat_at=now, updated_at=now
+    )
+    return ImportJob.objects.get(pk=job_id) if claimed else None
+
+
+def _report(job, **fields):
+    """
+    Write *fields* and a fresh heartbeat, provided this worker still holds
+    *job* (its last heartbeat is unchanged); raise ClaimLost otherwise.
+    """
+    now = timezone.now()
+    fields.update(heartbeat_at=now, updated_at=now)
+    held = ImportJob.objects.filter(
+        pk=job.pk, status=ImportJob.RUNNING, heartbeat_at=job.heartbeat_at
+    ).update(**fields)
+    if not held:
+        raise ClaimLost(job.pk)
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def _run(job):
+    batch_size = settings.MUSIC_UPLOAD_BATCH_SIZE
+    ingestor = Ingestor(batch_size, offset=job.processed)
+    with job.file.open("rb") as f:
+        # 续传：跳过已经提交的条目
+        items = islice(iter_items(f), job.processed, None)
+        try:
+            while batch := list(islice(items, batch_size)):
+                created, duplicates, failed = (
+                    ingestor.created,
+                    ingestor.duplicates,
+                    ingestor.invalid,
+                )
+                errors = len(ingestor.errors)
+                with transaction.atomic():
+                    song_ids = ingestor.add_batch(batch)
+                    if song_ids:
+                        songs_created(song_ids)
+                    # 失去租约时抛出 ClaimLost，本批随事务回滚
+                    _report(
+                        job,
+                        processed=ingestor.received,
+                        created=job.created + ingestor.created - created,
+                        duplicates=job.duplicates + ingestor.duplicates - duplicates,
+                        failed=job.failed + ingestor.invalid - failed,
+                        errors=(job.errors + ingestor.errors[errors:])[:MAX_ERRORS],
+                    )
+        except IngestError as e:
+            # 出错之前的批次已经提交，保留进度
+            _report(
+                job, status=ImportJob.FAILED, detail=str(e), finished_at=timezone.now()
+            )
+            return
+
+    # 全部导入后不再需要续传，删除上传的文件
+    name = job.file.name
+    _report(job, file="", status=ImportJob.DONE, finished_at=timezone.now())
+    job.file.storage.delete(name)
+    logger.info(
+        "Import job %s done: %d processed, %d created", job.pk, job.processed, job.created
+    )
@@ -0,0 +1,278 @@
+# music/ingest.py
+
+"""
+Streaming bulk song ingestion shared by UploadView and the import tools.
+
+The body is read in fixed-size chunks and decoded item by item, either as
+one JSON array or as NDJSON (one object per line), so memory stays flat
+whatever the upload size. Items are validated and written in batches with
+``bulk_create``; songs whose (title, artist) already exists — in the
+catalog or earlier in the same upload — are skipped. Invalid
+items are skipped and reported; malformed JSON, or more items than the
+caller's limit, aborts the whole upload.
+"""
+
+import codecs
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Song
+
+READ_SIZE = 64 * 1024
+# 单个元素超过这个长度仍无法解析就视为格式错误，避免反复重试整段剩余数据
+MAX_ITEM_CHARS = 1024 * 1024
+MAX_ERRORS = 20
+
+DEFAULT_SCHOOL = Song._meta.get_field("school").default
+TITLE_MAX = Song._meta.get_field("title").max_length
+ARTIST_MAX = Song._meta.get_field("artist").max_length
+SCHOOL_MAX = Song._meta.get_field("school").max_length
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class IngestError(ValueError):
+    """The body is not a JSON array or NDJSON of objects."""
+
+
+class TooManyItems(IngestError):
+    """The body holds more items than one upload may ingest."""
+
+
+def _chunks(stream):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(data) if isinstance(data, bytes) else data
+        if text:
+            yield text
+
+
+def iter_items(stream):
+    """Yield the decoded items of a JSON array or NDJSON body one by one."""
+    chunks = _chunks(stream)
+    buf = ""
+    for buf in chunks:
+        buf = buf.lstrip(_WHITESPACE)
+        if buf:
+            break
+    if not buf:
+        raise IngestError("Expected a JSON array or NDJSON.")
+
+    if buf[0] == "[":
+        yield from _iter_array(buf[1:], chunks)
+    else:
+        yield from _iter_lines(buf, chunks)
+
+
+def _iter_array(buf, chunks):
+    pos, index, expect_item = 0, 0, True
+    while True:
+        # 跳过空白和元素之间的逗号
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                break
+            buf, pos = next(chunks, None), 0
+            if buf is None:
+                raise IngestError("Unterminated JSON array.")
+
+        char = buf[pos]
+        if char == "]":
+            if expect_item and index:
+                raise IngestError(f"Trailing ',' after item #{index}.")
+            return
+        if char == ",":
+            if expect_item:
+                raise IngestError(f"Unexpected ',' before item #{index + 1}.")
+            pos, expect_item = pos + 1, True
+            continue
+        if not expect_item:
+            raise IngestError(f"Expected ',' after item #{index}.")
+
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+                # 数字、字面量可能被分块截断，后面必须跟着分隔符才算完整
+                if char in "{[\"" or (end < len(buf) and buf[end] in _WHITESPACE + ",]"):
+                    break
+            except json.JSONDecodeError as e:
+                if len(buf) - pos > MAX_ITEM_CHARS:
+                    raise IngestError(f"Invalid JSON in item #{index + 1}: {e.msg}")
+                error = e
+            else:
+                error = None
+            more = next(chunks, None)
+            if more is None:
+                if error is None:
+                    break
+                raise IngestError(f"Invalid JSON in item #{index + 1}: {error.msg}")
+            buf, pos = buf[pos:] + more, 0
+
+        index += 1
+        yield item
+        pos, expect_item = end, False
+
+
+def _lines(buf, chunks):
+    for more in chunks:
+        # 最后一段可能是不完整的行，留到下一块
+        *lines, buf = (buf + more).split("\n")
+        yield from lines
+    yield from buf.split("\n")
+
+
+def _iter_lines(buf, chunks):
+    for line_no, line in enumerate(_lines(buf, chunks), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise IngestError(f"Invalid JSON on line {line_no}: {e.msg}")
+
+
+def _text(item, key, max_length, default=None):
+    value = item.get(key, default)
+    if not isinstance(value, str):
+        raise ValueError(f"missing or non-string {key!r}")
+    value = value.strip()
+    if not value:
+        raise ValueError(f"empty {key!r}")
+    if len(value) > max_length:
+        raise ValueError(f"{key!r} longer than {max_length} characters")
+    return value
+
+
+def _to_song(item):
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    return Song(
+        title=_text(item, "Track name", TITLE_MAX),
+        artist=_text(item, "Artist name", ARTIST_MAX),
+        school=_text(item, "School", SCHOOL_MAX, DEFAULT_SCHOOL),
+    )
+
+
+class Ingestor:
+    """Validate, dedupe and insert songs batch by batch; keeps the summary."""
+
+    def __init__(self, batch_size=1000, offset=0):
+        self.batch_size = batch_size
+        self.received = offset  # 续传时从已处理的条数开始编号
+        self.created = self.duplicates = self.invalid = 0
+        self.errors = []
+        self.seen = set()  # 本次上传中已写入的 (title, artist)
+
+    def add_batch(self, items):
+        """Ingest one batch; returns the ids of the songs it created."""
+        songs = []
+        for item in items:
+            self.received += 1
+            try:
+                songs.append(_to_song(item))
+            except ValueError as e:
+                self.invalid += 1
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append({"item": self.received, "detail": str(e)})
+
+        # 与曲库比对：按标题查出已有的 (title, artist)，走 (title, artist) 索引
+        existing = set(
+            Song.objects.filter(title__in={song.title for song in songs}).values_list(
+                "title", "artist"
+            )
+        )
+        new = []
+        for song in songs:
+            key = (song.title, song.artist)
+            if key in existing or key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            new.append(song)
+
+        Song.objects.bulk_create(new, batch_size=self.batch_size)
+        self.created += len(new)
+        return _created_ids(new)
+
+    def summary(self):
+        return {
+            "received": self.received,
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
+
+
+def _created_ids(songs):
+    if all(song.pk is not None for song in songs):
+        return [song.pk for song in songs]
+    # MySQL 的 bulk_create 不回填主键：按 (title, artist) 查回。这些键刚刚确认不在曲库中，
+    # 查到的就是本批写入的行
+    keys = {(song.title, song.artist) for song in songs}
+    rows = Song.objects.filter(title__in={title for title, _ in keys}).values_list(
+        "id", "title", "artist"
+    )
+    return [song_id for song_id, title, artist in rows if (title, artist) in keys]
+
+
+def songs_created(song_ids):
+    """
+    After commit, tell the serving caches about the bulk-created *song_ids*
+    (bulk_create sends no post_save signals).
+    """
+    from recommender.catalog import invalidate_catalog
+
+    from .caching import bump
+    from .suggest import songs_added
+
+    def notify():
+        invalidate_catalog()
+        bump("songs")
+        songs_added()
+
+    transaction.on_commit(notify)
+    if settings.RECOMMENDER_INCREMENTAL_INDEXING:
+        from recommender.incremental import schedule
+
+        schedule(song_ids)
+
+
+def ingest_items(items, batch_size=1000, max_items=None):
+    """
+    Ingest an iterable of upload items in one transaction and return the
+    summary dict. IngestError from the item source, or TooManyItems once
+    more than *max_items* arrive, rolls everything back.
+    """
+    ingestor = Ingestor(batch_size)
+    items = iter(items)
+    song_ids = []
+    with transaction.atomic():
+        while batch := list(islice(items, batch_size)):
+            # 限制单个事务的大小以及 seen 集合的内存
+            if max_items is not None and ingestor.received + len(batch) > max_items:
+                raise TooManyItems(
+                    f"More than {max_items} items; use an import job "
+                    "(POST /api/music/imports/) for large files."
+                )
+            song_ids += ingestor.add_batch(batch)
+        if song_ids:
+            songs_created(song_ids)
+    return ingestor.summary()
+
+
+def ingest_stream(stream, batch_size=1000, max_items=None):
+    """Ingest a JSON array / NDJSON body read incrementally from *stream*."""
+    return ingest_items(iter_items(stream), batch_size, max_items)
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0003_songlike'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='songlike',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
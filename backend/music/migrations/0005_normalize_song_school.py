@@ -0,0 +1,61 @@
+# Generated by Django 6.1.2 on 2026-10-18 10:32
+
+import music.fields
+from django.db import migrations
+from django.db.models import Case, CharField, Max, Value, When
+from django.db.models.functions import Lower, Trim
+from django.db.models.lookups import Exact
+
+# 迁移时的流派显示名 → 代码快照（不随 music.genres 变化）
+NAME_TO_CODE = {
+    "流行": "pop",
+    "摇滚": "rock",
+    "爵士": "jazz",
+    "古典": "classical",
+    "嘻哈": "hiphop",
+    "电子": "electronic",
+    "民谣": "folk",
+    "乡村": "country",
+    "蓝调": "blues",
+    "金属": "metal",
+    "日本流行": "jpop",
+    "韩国流行": "kpop",
+    "r&b": "rnb",
+    "朋克": "punk",
+    "舞曲": "dance",
+}
+
+
+BATCH_SIZE = 10000
+
+
+def normalize_school(apps, schema_editor):
+    Song = apps.get_model("music", "Song")
+    # 在 SQL 里规范化每一行，不按 distinct 取值比较：MySQL 的排序规则不区分大小写
+    # 与尾随空格，"Rock" / "rock" / "rock " 会被当成同一个值
+    cleaned = Lower(Trim("school"))
+    school = Case(
+        *[When(Exact(cleaned, name), then=Value(code)) for name, code in NAME_TO_CODE.items()],
+        default=cleaned,
+        output_field=CharField(),
+    )
+    # 按主键分批更新，避免一条语句长时间锁住整张表
+    max_id = Song.objects.aggregate(m=Max("id"))["m"] or 0
+    for start in range(0, max_id, BATCH_SIZE):
+        Song.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(school=school)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0004_alter_songlike_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_school, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='song',
+            name='school',
+            field=music.fields.GenreField(db_index=True, default='未知流派', max_length=255),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:05
+
+from django.db import migrations
+
+INDEX_NAME = "song_fulltext"
+
+
+def create_fulltext_index(apps, schema_editor):
+    # 仅 MySQL：ngram 解析器让中文标题无需分词也能检索；其他数据库走 LIKE 回退
+    if schema_editor.connection.vendor != "mysql":
+        return
+    Song = apps.get_model("music", "Song")
+    qn = schema_editor.quote_name
+    columns = ", ".join(qn(Song._meta.get_field(name).column) for name in ("title", "artist", "school"))
+    schema_editor.execute(
+        f"CREATE FULLTEXT INDEX {qn(INDEX_NAME)} ON {qn(Song._meta.db_table)} "
+        f"({columns}) WITH PARSER ngram"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    Song = apps.get_model("music", "Song")
+    schema_editor.execute(
+        f"DROP INDEX {schema_editor.quote_name(INDEX_NAME)} "
+        f"ON {schema_editor.quote_name(Song._meta.db_table)}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0005_normalize_song_school'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
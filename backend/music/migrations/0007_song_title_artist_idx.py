@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0006_song_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['title', 'artist'], name='song_title_artist_idx'),
+        ),
+    ]
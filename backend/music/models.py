@@ -3,11 +3,35 @@
 from django.conf import settings
 from django.db import models
 
+from .fields import GenreField
+
+
+class SongQuerySet(models.QuerySet):
+    def fingerprint(self):
+        """
+        ``(count, max id, max updated_at)`` of the rows: changes whenever a
+        row is added, edited or deleted, and costs one aggregate query.
+        """
+        agg = self.aggregate(
+            count=models.Count("id"),
+            max_id=models.Max("id"),
+            updated=models.Max("updated_at"),
+        )
+        return agg["count"], agg["max_id"] or 0, agg["updated"]
+
 
 class Song(models.Model):
     title = models.CharField(max_length=255)
     artist = models.CharField(max_length=255)
-    school = models.CharField(max_length=255, default="未知流派")
+    school = GenreField(max_length=255, default="未知流派", db_index=True)
+    # 供内存中的曲库 / 搜索提示判断是否有歌曲被修改（QuerySet.update 不会更新它）
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = SongQuerySet.as_manager()
+
+    class Meta:
+        # 上传去重按 (title, artist) 查询已有歌曲
+        indexes = [models.Index(fields=["title", "artist"], name="song_title_artist_idx")]
 
     def __str__(self):
         return f"{self.title} by {self.artist}"
@@ -18,8 +42,53 @@ class SongLike(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="liked_songs"
     )
     song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="likes")
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         unique_together = ("user", "song")
         db_table = "song_likes"
+
+
+class ImportJob(models.Model):
+    """
+    A catalog file queued for background ingestion (see music.imports).
+    Counters are committed together with each batch, so they always match
+    what is in the DB and an interrupted job resumes after ``processed``.
+    A worker claims the job with a conditional update and keeps
+    ``heartbeat_at`` fresh while it runs.
+    """
+
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "排队中"),
+        (RUNNING, "导入中"),
+        (DONE, "已完成"),
+        (FAILED, "失败"),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="import_jobs",
+    )
+    file = models.FileField(upload_to="imports/", blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    detail = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # 运行中的 worker 每提交一批刷新一次；同时作为租约，只有持有者能写回进度
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "song_import_jobs"
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.status})"
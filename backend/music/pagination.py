@@ -1,7 +1,71 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"  # ?page_size=20 覆盖
     max_page_size = 100
+
+
+class SongCursorPagination(CursorPagination):
+    """
+    Keyset pagination on ``id``: each page is ``WHERE id > last LIMIT n``,
+    so deep pages cost the same as the first. Opt in with ``?cursor=``
+    (empty for the first page, then follow ``next``); ``?count=false``
+    also skips the ``COUNT(*)``.
+    """
+
+    ordering = "id"
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, "").lower() not in (
+            "0",
+            "false",
+            "no",
+        ):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def decode_cursor(self, request):
+        # 空的 ?cursor= 表示第一页
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+    def get_paginated_response(self, data):
+        body = {"next": self.get_next_link(), "previous": self.get_previous_link()}
+        if self.count is not None:
+            body["count"] = self.count
+        body["results"] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"] = {"type": "integer", "example": 123}
+        return schema
+
+
+def wants_cursor(request):
+    """True when the client opted into keyset pagination with ``?cursor=``."""
+    return (
+        request is not None
+        and SongCursorPagination.cursor_query_param in request.query_params
+    )
+
+
+def paginated_songs(request, queryset, serializer_class, view=None):
+    """
+    Response for an APIView song list: keyset-paginated when requested,
+    otherwise the full list as before.
+    """
+    if not wants_cursor(request):
+        return Response(serializer_class(queryset, many=True).data)
+    paginator = SongCursorPagination()
+    page = paginator.paginate_queryset(queryset, request, view)
+    return paginator.get_paginated_response(serializer_class(page, many=True).data)
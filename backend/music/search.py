@@ -0,0 +1,73 @@
+# music/search.py
+
+"""
+Song search backend for SongSearchView.
+
+On MySQL the terms go to the ``song_fulltext`` FULLTEXT index (ngram parser,
+so CJK titles are searchable without word boundaries) in boolean mode and
+results are ordered by MATCH relevance. Other databases, and terms shorter
+than the ngram token size, fall back to DRF's ``icontains`` search with a
+simple title / artist ranking on top.
+"""
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# 与 MySQL 的 ngram_token_size 默认值一致；更短的词无法命中 ngram 索引
+NGRAM_TOKEN_SIZE = 2
+
+FULLTEXT_FIELDS = ("title", "artist", "school")
+
+
+def boolean_query(terms):
+    """``+"t1" +"t2"``: every term must appear, each as an ngram phrase."""
+    # 去掉双引号，避免破坏短语；其余布尔运算符在引号内不生效
+    phrases = (term.replace('"', " ").strip() for term in terms)
+    return " ".join(f'+"{phrase}"' for phrase in phrases if phrase)
+
+
+def fulltext_search(queryset, terms):
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(queryset.model._meta.db_table)
+    columns = ", ".join(
+        f"{table}.{qn(queryset.model._meta.get_field(name).column)}"
+        for name in FULLTEXT_FIELDS
+    )
+    match = RawSQL(
+        f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)", [boolean_query(terms)]
+    )
+    return (
+        queryset.annotate(relevance=match)
+        .filter(relevance__gt=0)
+        .order_by("-relevance", "id")
+    )
+
+
+class SongSearchFilter(filters.SearchFilter):
+    """SearchFilter that ranks results; uses the FULLTEXT index on MySQL."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not self.get_search_fields(view, request):
+            return queryset
+
+        if connections[queryset.db].vendor == "mysql" and all(
+            len(term) >= NGRAM_TOKEN_SIZE for term in terms
+        ):
+            return fulltext_search(queryset, terms)
+
+        # 回退：LIKE 过滤 + 标题 / 歌手完全匹配、前缀匹配优先
+        text = " ".join(terms)
+        relevance = Case(
+            When(title__iexact=text, then=Value(4)),
+            When(title__istartswith=text, then=Value(3)),
+            When(artist__iexact=text, then=Value(2)),
+            When(artist__istartswith=text, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        queryset = super().filter_queryset(request, queryset, view)
+        return queryset.annotate(relevance=relevance).order_by("-relevance", "id")
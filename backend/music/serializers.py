@@ -1,7 +1,7 @@
 # music/serializers.py
 
 from rest_framework import serializers
-from .models import Song, SongLike
+from .models import ImportJob, Song, SongLike
 
 
 class SongSerializer(serializers.ModelSerializer):
@@ -10,14 +10,27 @@ class SongSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "artist", "school"]
 
 
-class SongUploadSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Song
-        fields = ["title", "artist", "school"]
-
-
 class SongLikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = SongLike
         fields = ["song", "created_at"]
         read_only_fields = ["created_at"]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "processed",
+            "created",
+            "duplicates",
+            "failed",
+            "errors",
+            "detail",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
@@ -0,0 +1,148 @@
+# music/suggest.py
+
+"""
+In-memory typeahead index over song titles and artists.
+
+Every distinct title / artist is stored once per word start ("Love Story"
+is reachable from "love…" and "story…") in one sorted list of
+``(key, type, text)`` tuples, so a suggestion is a bisect plus a short
+forward scan. At most every MUSIC_SUGGEST_CHECK_SECONDS each worker
+compares ``Song.objects.fingerprint()`` with the one it built from: when
+only new songs were added it merges the rows above its high-water id,
+otherwise (edits, deletions) it rebuilds once.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Song
+
+# 前缀范围内最多扫描的条目数（相对 limit），保证最坏情况也是常数时间
+SCAN_FACTOR = 8
+
+
+def _normalize(text):
+    return " ".join(text.casefold().split())
+
+
+def _keys(text):
+    """The normalised text and each of its word-start suffixes."""
+    words = _normalize(text).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    def __init__(self, entries=(), seen=(), max_id=0):
+        self.entries = list(entries)  # 按 key 排序的 (key, type, text)
+        self.seen = set(seen)  # 已收录的 (type, 规范化文本)，同名只收一次
+        self.max_id = max_id
+        self.fingerprint = None  # 构建时 Song.objects.fingerprint() 的值
+
+    @classmethod
+    def build(cls, rows):
+        return cls().extended(rows)
+
+    def extended(self, rows):
+        """
+        New index with *rows* (``(id, title, artist)``) added. The current
+        index is left untouched, so readers never see a half-merged list.
+        """
+        seen, new, max_id = set(self.seen), [], self.max_id
+        for song_id, title, artist in rows:
+            max_id = max(max_id, song_id)
+            for kind, text in (("title", title), ("artist", artist)):
+                ident = (kind, _normalize(text))
+                if not ident[1] or ident in seen:
+                    continue
+                seen.add(ident)
+                new.extend((key, kind, text) for key in _keys(text))
+        if not new:
+            return PrefixIndex(self.entries, seen, max_id)
+        new.sort()
+        # 两段各自有序，timsort 合并是线性的
+        entries = self.entries + new
+        entries.sort()
+        return PrefixIndex(entries, seen, max_id)
+
+    def suggest(self, prefix, limit=10):
+        key = _normalize(prefix)
+        if not key:
+            return []
+        entries = self.entries
+        start = bisect_left(entries, (key,))
+        results, returned = [], set()
+        for i in range(start, min(start + limit * SCAN_FACTOR, len(entries))):
+            entry_key, kind, text = entries[i]
+            if not entry_key.startswith(key):
+                break
+            if (kind, text) in returned:
+                continue
+            returned.add((kind, text))
+            results.append({"text": text, "type": kind})
+            if len(results) == limit:
+                break
+        return results
+
+
+_index = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def _load(queryset):
+    rows = queryset.order_by("id").values_list("id", "title", "artist")
+    return rows.iterator(chunk_size=5000)
+
+
+def _refresh(index):
+    fingerprint = Song.objects.fingerprint()
+    if index is not None and fingerprint == index.fingerprint:
+        return index
+    if index is not None and (
+        Song.objects.filter(id__lte=index.max_id).fingerprint() == index.fingerprint
+    ):
+        # 已收录的部分没变：只是新增了歌曲
+        index = index.extended(_load(Song.objects.filter(id__gt=index.max_id)))
+    else:
+        index = PrefixIndex.build(_load(Song.objects.all()))
+    index.fingerprint = fingerprint
+    return index
+
+
+def get_suggest_index():
+    """
+    Current index. At most every MUSIC_SUGGEST_CHECK_SECONDS one thread
+    checks the DB fingerprint and extends or rebuilds; the others keep
+    serving the current index meanwhile.
+    """
+    global _index, _next_check
+    now = time.monotonic()
+    if _index is not None and now < _next_check:
+        return _index
+
+    if _index is None:
+        _lock.acquire()
+    elif not _lock.acquire(blocking=False):
+        return _index
+    try:
+        if _index is None or time.monotonic() >= _next_check:
+            _index = _refresh(_index)
+            _next_check = now + settings.MUSIC_SUGGEST_CHECK_SECONDS
+    finally:
+        _lock.release()
+    return _index
+
+
+def songs_added():
+    """Check for new songs on the next request in this process."""
+    global _next_check
+    _next_check = 0.0
+
+
+def song_saved(sender, instance, created, **kwargs):
+    """Signal receiver: new songs show up at once in this process."""
+    if created:
+        songs_added()
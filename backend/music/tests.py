@@ -1,7 +1,32 @@
 # music/tests.py
 
-from django.test import TestCase
-from .models import Song
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+import faiss
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from recommender import index as index_module
+from recommender.index import IndexHandle, build_index, search_excluding
+from recommender.models import SongVector
+from recommender.serving import _UserFactors
+from recommender.similar import _SimilarTable
+from .genres import normalize_genre
+from .models import ImportJob, Song, SongLike
+from . import imports
+from .ingest import Ingestor, _created_ids, iter_items
+from .search import boolean_query, fulltext_search
+from .suggest import PrefixIndex
 from datetime import timedelta
 
 
@@ -24,3 +49,614 @@ class SongModelTest(TestCase):
         self.assertEqual(self.song.title, "Test Song")
         self.assertEqual(self.song.artist, "Test Artist")
         self.assertEqual(self.song.duration, timedelta(minutes=3, seconds=30))
+
+
+class SongGenreFieldTest(TestCase):
+    def test_normalize_genre(self):
+        self.assertEqual(normalize_genre(" Rock "), "rock")
+        self.assertEqual(normalize_genre("摇滚"), "rock")
+        self.assertEqual(normalize_genre("R&B"), "rnb")
+        self.assertEqual(normalize_genre("未知流派"), "未知流派")
+        self.assertIsNone(normalize_genre(None))
+
+    def test_school_is_stored_normalized(self):
+        song = Song.objects.create(title="A", artist="X", school="JPop")
+        self.assertEqual(song.school, "jpop")
+        Song.objects.bulk_create([Song(title="B", artist="X", school="爵士")])
+        self.assertEqual(
+            sorted(Song.objects.values_list("school", flat=True)), ["jazz", "jpop"]
+        )
+        # 精确查询的参数同样被规范化
+        self.assertEqual(Song.objects.filter(school="JAZZ").count(), 1)
+        self.assertEqual(Song.objects.filter(school__in=["Jpop", "爵士"]).count(), 2)
+
+
+class SongSearchTest(TestCase):
+    def setUp(self):
+        self.partial = Song.objects.create(title="Love Story Remix", artist="B", school="pop")
+        self.by_artist = Song.objects.create(title="Other", artist="Love Story", school="pop")
+        self.exact = Song.objects.create(title="Love Story", artist="A", school="pop")
+        Song.objects.create(title="Unrelated", artist="C", school="rock")
+
+    def test_ranked_by_relevance(self):
+        resp = self.client.get("/api/music/", {"search": "love story"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [row["id"] for row in resp.data["results"]],
+            [self.exact.id, self.partial.id, self.by_artist.id],
+        )
+        self.assertEqual(resp.data["count"], 3)
+
+    def test_boolean_query(self):
+        self.assertEqual(boolean_query(["周杰伦", 'a"b']), '+"周杰伦" +"a b"')
+
+    def test_fulltext_sql(self):
+        sql = str(fulltext_search(Song.objects.all(), ["晴天"]).query)
+        self.assertIn("MATCH (", sql)
+        self.assertIn("IN BOOLEAN MODE", sql)
+
+
+class UploadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Song.objects.create(title="Existing", artist="Band", school="rock")
+
+    def _post(self, body, content_type="application/json"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/music/upload/", body, content_type=content_type)
+
+    @staticmethod
+    def _item(title, artist="Band", **extra):
+        return {"Track name": title, "Artist name": artist, **extra}
+
+    @override_settings(MUSIC_UPLOAD_MAX_ITEMS=150)
+    def test_too_many_items_rolls_back(self):
+        items = [self._item(f"Song {i}") for i in range(150)]
+        self.assertEqual(self._post(json.dumps(items)).status_code, 201)
+        items = [self._item(f"Big {i}") for i in range(151)]
+        resp = self._post("\n".join(map(json.dumps, items)), "application/x-ndjson")
+        self.assertEqual(resp.status_code, 413)
+        self.assertIn("/api/music/imports/", resp.data["detail"])
+        self.assertFalse(Song.objects.filter(title__startswith="Big").exists())
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_json_array_summary(self):
+        items = [self._item(f"Song {i}", School="Jazz") for i in range(100)]
+        items += [self._item(" Existing ", "Band"), self._item("Song 1"), {"Track name": "x"}, 5]
+        resp = self._post(json.dumps(items))
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(
+            {k: v for k, v in resp.data.items() if k != "errors"},
+            {"received": 104, "created": 100, "duplicates": 2, "invalid": 2},
+        )
+        self.assertEqual([e["item"] for e in resp.data["errors"]], [103, 104])
+        self.assertEqual(Song.objects.filter(school="jazz").count(), 100)
+        # 批量写入后搜索提示能看到新歌
+        self.assertEqual(
+            self.client.get("/api/music/suggest/?q=song 99").data,
+            [{"text": "Song 99", "type": "title"}],
+        )
+
+    def test_ndjson_and_repeat_upload(self):
+        body = "\n".join(json.dumps(self._item(t)) for t in ("A", "B")) + "\n"
+        resp = self._post(body, "application/x-ndjson")
+        self.assertEqual((resp.status_code, resp.data["created"]), (201, 2))
+        self.assertEqual(Song.objects.get(title="A").school, "未知流派")
+        resp = self._post(body, "application/x-ndjson")
+        self.assertEqual((resp.status_code, resp.data["duplicates"]), (200, 2))
+
+    @override_settings(RECOMMENDER_INCREMENTAL_INDEXING=True)
+    def test_schedules_only_created_ids(self):
+        with mock.patch("recommender.incremental.schedule") as schedule:
+            resp = self._post(json.dumps([self._item("A"), self._item("Existing"), self._item("B")]))
+        self.assertEqual(resp.data["created"], 2)
+        expected = set(Song.objects.filter(title__in=["A", "B"]).values_list("id", flat=True))
+        self.assertEqual(set(schedule.call_args.args[0]), expected)
+
+    def test_created_ids_without_returned_pks(self):
+        # 模拟 MySQL：bulk_create 后对象没有主键
+        songs = [Song(title="X", artist="Band"), Song(title="Existing", artist="Other")]
+        Song.objects.bulk_create(songs)
+        expected = [song.pk for song in songs]
+        for song in songs:
+            song.pk = None
+        self.assertEqual(sorted(_created_ids(songs)), sorted(expected))
+
+    def test_malformed_body_rolls_back(self):
+        body = json.dumps([self._item("Fine")])[:-1] + ', {"Track name": ]'
+        resp = self._post(body)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Song.objects.filter(title="Fine").exists())
+        self.assertEqual(self._post("").status_code, 400)
+
+    def test_iter_items_small_reads(self):
+        items = [self._item("晴天", "周杰伦"), 1.5, [1, "]"], None]
+        with mock.patch("music.ingest.READ_SIZE", 3):
+            self.assertEqual(list(iter_items(BytesIO(json.dumps(items).encode()))), items)
+
+
+class ImportJobTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(
+            override_settings(MEDIA_ROOT=media.name, MUSIC_UPLOAD_BATCH_SIZE=10)
+        )
+        # 在当前线程里同步执行，便于断言
+        self.enterContext(
+            mock.patch("music.imports._executor.submit", lambda fn, *a: fn(*a))
+        )
+        self.admin = get_user_model().objects.create_user(
+            username="importer", password="x", is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _submit(self, body):
+        upload = SimpleUploadedFile("songs.json", body.encode(), "application/json")
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post("/api/music/imports/", {"file": upload})
+        self.assertEqual(resp.status_code, 202)
+        return resp.data["id"]
+
+    def _items(self, n, start=0):
+        return [{"Track name": f"T{i}", "Artist name": "A"} for i in range(start, n)]
+
+    def test_import_and_progress(self):
+        job_id = self._submit(json.dumps(self._items(25) + [{"Track name": "bad"}]))
+        data = self.client.get(f"/api/music/imports/{job_id}/").data
+        self.assertEqual(data["status"], ImportJob.DONE)
+        self.assertEqual(
+            (data["processed"], data["created"], data["failed"]), (26, 25, 1)
+        )
+        self.assertEqual(data["errors"][0]["item"], 26)
+        self.assertEqual(Song.objects.count(), 25)
+        self.assertFalse(ImportJob.objects.get(pk=job_id).file)
+        self.assertEqual(self.client.post("/api/music/imports/").status_code, 400)
+
+    def test_resume_after_failure(self):
+        # 第 3 批格式错误：前两批已提交，任务失败但保留进度
+        body = json.dumps(self._items(25))[:-1] + ", {oops}]"
+        job_id = self._submit(body)
+        job = ImportJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.processed, job.created), (ImportJob.FAILED, 20, 20))
+
+        # 修好文件后续传，只处理剩下的条目
+        with job.file.open("wb") as f:
+            f.write(json.dumps(self._items(30)).encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(f"/api/music/imports/{job_id}/resume/")
+        self.assertEqual(resp.status_code, 202)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.created), (ImportJob.DONE, 30, 30))
+        self.assertEqual(job.duplicates, 0)
+        self.assertEqual(
+            self.client.post(f"/api/music/imports/{job_id}/resume/").status_code, 409
+        )
+
+    def _stored_job(self, n, **fields):
+        upload = SimpleUploadedFile("songs.json", json.dumps(self._items(n)).encode())
+        return ImportJob.objects.create(owner=self.admin, file=upload, **fields)
+
+    def test_resume_uses_heartbeat_and_claims_once(self):
+        old = timezone.now() - timedelta(hours=1)
+        # 排队很久、但 worker 心跳新鲜的运行中任务不能续传，也不会被重复执行
+        job = self._stored_job(5, status=ImportJob.RUNNING, heartbeat_at=timezone.now())
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=old)
+        self.assertEqual(self.client.post(f"/api/music/imports/{job.pk}/resume/").status_code, 409)
+        imports.run_job(job.pk)
+        self.assertEqual(Song.objects.count(), 0)
+
+        # 心跳过期后可以续传；同一任务排了两次队也只执行一次
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=old)
+        with mock.patch("music.imports._executor.submit") as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(f"/api/music/imports/{job.pk}/resume/")
+        self.assertEqual((resp.status_code, resp.data["status"]), (202, ImportJob.QUEUED))
+        self.assertEqual(self.client.post(f"/api/music/imports/{job.pk}/resume/").status_code, 409)
+        imports.run_job(job.pk)
+        imports.run_job(job.pk)
+        submit.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, Song.objects.count()), (ImportJob.DONE, 5, 5))
+
+    def test_worker_stops_after_losing_its_claim(self):
+        job = self._stored_job(25)
+        add_batch = Ingestor.add_batch
+
+        def taken_over(ingestor, batch):
+            if ingestor.received:
+                # 第二批时另一个 worker 接手了任务
+                ImportJob.objects.filter(pk=job.pk).update(
+                    heartbeat_at=timezone.now() + timedelta(seconds=1)
+                )
+            return add_batch(ingestor, batch)
+
+        with mock.patch.object(Ingestor, "add_batch", taken_over):
+            with self.assertLogs("music.imports", "WARNING"):
+                imports.run_job(job.pk)
+        job.refresh_from_db()
+        # 第二批随事务回滚，任务仍归接手的 worker
+        self.assertEqual((job.status, job.processed), (ImportJob.RUNNING, 10))
+        self.assertEqual(Song.objects.count(), 10)
+
+    def test_requires_admin_and_owner(self):
+        job_id = self._submit(json.dumps(self._items(1)))
+
+        self.client.force_authenticate(None)
+        upload = SimpleUploadedFile("songs.json", b"[]", "application/json")
+        self.assertEqual(self.client.post("/api/music/imports/", {"file": upload}).status_code, 401)
+        self.assertEqual(self.client.get(f"/api/music/imports/{job_id}/").status_code, 401)
+
+        # 其他管理员看不到、也不能续传别人的任务
+        other = get_user_model().objects.create_user(username="other", password="x", is_staff=True)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"/api/music/imports/{job_id}/").status_code, 404)
+        self.assertEqual(self.client.post(f"/api/music/imports/{job_id}/resume/").status_code, 404)
+
+
+@override_settings(
+    API_CACHE_TTLS={"song_search": 60, "genre_songs": 300, "liked_songs": 300}
+)
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="cached", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.songs = [Song.objects.create(title=f"C{i}", artist="A") for i in range(3)]
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp["X-Cache"], resp.data
+
+    def test_liked_songs_invalidated_by_like(self):
+        SongLike.objects.create(user=self.user, song=self.songs[0])
+        self.assertEqual(self._get("/api/music/likes/")[0], "MISS")
+        state, data = self._get("/api/music/likes/")
+        self.assertEqual((state, len(data)), ("HIT", 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/music/{self.songs[1].id}/like/")
+        state, data = self._get("/api/music/likes/")
+        self.assertEqual((state, len(data)), ("MISS", 2))
+
+        # 歌曲信息变化也会失效
+        self._get("/api/music/likes/")
+        Song.objects.filter(pk=self.songs[0].pk).update(title="ignored")  # update() 不发信号
+        self.assertEqual(self._get("/api/music/likes/")[0], "HIT")
+        self.songs[0].title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.songs[0].save()
+        state, data = self._get("/api/music/likes/")
+        self.assertEqual(state, "MISS")
+        self.assertIn("Renamed", [row["title"] for row in data])
+
+    def test_search_and_stats(self):
+        self._get("/api/music/?search=C")
+        self.assertEqual(self._get("/api/music/?search=C")[0], "HIT")
+        # 不同的查询参数是不同的条目
+        self.assertEqual(self._get("/api/music/?search=C&page_size=2")[0], "MISS")
+        with self.captureOnCommitCallbacks(execute=True):
+            Song.objects.create(title="C9", artist="B")
+        state, data = self._get("/api/music/?search=C")
+        self.assertEqual((state, data["count"]), ("MISS", 4))
+
+        self.assertEqual(self.client.get("/api/music/cache/stats/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get("/api/music/cache/stats/").data
+        self.assertEqual(stats["song_search"], {"hit": 1, "miss": 3})
+
+    def test_search_invalidated_by_upload(self):
+        self._get("/api/music/?search=C")
+        self.assertEqual(self._get("/api/music/?search=C")[0], "HIT")
+        # bulk_create 不发 post_save，由上传后的通知递增版本
+        body = json.dumps([{"Track name": "C9", "Artist name": "B"}])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/music/upload/", body, content_type="application/json")
+        state, data = self._get("/api/music/?search=C")
+        self.assertEqual((state, data["count"]), ("MISS", 4))
+
+    def test_bump_waits_for_commit(self):
+        self._get("/api/music/likes/")
+        with self.captureOnCommitCallbacks() as callbacks:
+            SongLike.objects.create(user=self.user, song=self.songs[0])
+            # 提交前读到的仍是旧数据，不能写进新版本的条目
+            state, data = self._get("/api/music/likes/")
+            self.assertEqual((state, len(data)), ("HIT", 0))
+        for callback in callbacks:
+            callback()
+        state, data = self._get("/api/music/likes/")
+        self.assertEqual((state, len(data)), ("MISS", 1))
+
+    @override_settings(API_CACHE_TTLS={})
+    def test_disabled(self):
+        resp = self.client.get("/api/music/likes/")
+        self.assertNotIn("X-Cache", resp)
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(title=f"Song {i}", artist="A") for i in range(25)]
+        self.user = get_user_model().objects.create_user(username="pager", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url):
+        ids, pages = [], []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            pages.append(resp.data)
+            ids += [row["id"] for row in resp.data["results"]]
+            url = resp.data["next"]
+        return ids, pages
+
+    def test_search_keyset_pages(self):
+        ids, pages = self._walk("/api/music/?search=song&cursor=&page_size=10")
+        self.assertEqual(ids, [s.id for s in self.songs])
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(pages[0]["count"], 25)
+        self.assertIsNone(pages[0]["previous"])
+
+        resp = self.client.get("/api/music/?cursor=&count=false")
+        self.assertNotIn("count", resp.data)
+        # 未使用 ?cursor= 时仍是页码分页
+        self.assertIn("count", self.client.get("/api/music/?page=2").data)
+        self.assertEqual(self.client.get("/api/music/?cursor=bogus").status_code, 404)
+
+    def test_liked_songs(self):
+        for song in self.songs[:12]:
+            SongLike.objects.create(user=self.user, song=song)
+        # 不带 cursor 保持原来的完整列表
+        self.assertEqual(len(self.client.get("/api/music/likes/").data), 12)
+        ids, pages = self._walk("/api/music/likes/?cursor=&page_size=5&count=0")
+        self.assertEqual(ids, [s.id for s in self.songs[:12]])
+        self.assertEqual(len(pages), 3)
+
+
+class SongSuggestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Song.objects.create(title="Love Story", artist="Taylor Swift", school="pop")
+        Song.objects.create(title="Love Story", artist="Indila", school="pop")
+        Song.objects.create(title="Lovely", artist="Billie Eilish", school="pop")
+        Song.objects.create(title="晴天", artist="周杰伦", school="pop")
+
+    def _suggest(self, q, **params):
+        resp = self.client.get("/api/music/suggest/", {"q": q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [(row["type"], row["text"]) for row in resp.data]
+
+    def test_prefix_and_word_start(self):
+        # 同名歌曲只出现一次，按字典序
+        self.assertEqual(
+            self._suggest("LOVE"), [("title", "Love Story"), ("title", "Lovely")]
+        )
+        self.assertEqual(self._suggest("swi"), [("artist", "Taylor Swift")])
+        self.assertEqual(self._suggest("story"), [("title", "Love Story")])
+        self.assertEqual(self._suggest("周"), [("artist", "周杰伦")])
+        self.assertEqual(self._suggest("lov", limit=1), [("title", "Love Story")])
+        self.assertEqual(self._suggest(""), [])
+
+    @override_settings(MUSIC_SUGGEST_CHECK_SECONDS=0)
+    def test_upload_extends_and_delete_rebuilds(self):
+        self.assertEqual(self._suggest("晴"), [("title", "晴天")])
+        song = Song.objects.create(title="晴天娃娃", artist="X", school="pop")
+        with mock.patch.object(PrefixIndex, "build", wraps=PrefixIndex.build) as build:
+            self.assertEqual(self._suggest("晴"), [("title", "晴天"), ("title", "晴天娃娃")])
+        build.assert_not_called()  # 新歌只做增量合并
+        song.delete()
+        self.assertEqual(self._suggest("晴"), [("title", "晴天")])
+
+    @override_settings(MUSIC_SUGGEST_CHECK_SECONDS=3600)
+    def test_other_process_changes_within_check_interval(self):
+        self._suggest("晴")
+        # 其他进程的改名与批量写入不会通知本进程，到检查时间后才生效
+        Song.objects.filter(title="晴天").update(title="雨天", updated_at=timezone.now())
+        Song.objects.bulk_create([Song(title="晴空", artist="Y")])
+        self.assertEqual(self._suggest("晴"), [("title", "晴天")])
+        with mock.patch("music.suggest._next_check", 0.0):
+            self.assertEqual(self._suggest("晴"), [("title", "晴空")])
+        self.assertEqual(self._suggest("雨"), [("title", "雨天")])
+
+    def test_extended_keeps_original(self):
+        index = PrefixIndex.build([(1, "B", "x")])
+        bigger = index.extended([(2, "Ba", "y")])
+        self.assertEqual(len(index.suggest("b")), 1)
+        self.assertEqual(len(bigger.suggest("b")), 2)
+        self.assertEqual(bigger.max_id, 2)
+
+
+class UserRecommendationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="foryou", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # hybrid = [cf(1 维); content(2 维)]：content 在单位圆上依次排开，cf 递增
+        n = 30
+        angles = np.linspace(0, np.pi, n, dtype=np.float32)
+        cf = np.linspace(-1, 1, n, dtype=np.float32)[:, None]
+        vecs = np.hstack([cf * 0.1, np.cos(angles)[:, None], np.sin(angles)[:, None]])
+        self.songs = [Song.objects.create(title=f"Song {i}", artist="A") for i in range(n)]
+        for song, vec in zip(self.songs, vecs):
+            SongVector.objects.create(song=song, hybrid_vector=vec)
+
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        faiss.normalize_L2(vecs)
+        index, params = build_index(vecs, ids=[s.id for s in self.songs])
+        handle = IndexHandle("v1", index, None, params)
+
+        self.factors = _UserFactors()
+        self.factors.next_check = float("inf")  # 不读磁盘
+        self.factors.content_dim = 2
+        for target, value in (
+            ("music.views.get_index", mock.Mock(return_value=handle)),
+            ("recommender.serving._user_factors", self.factors),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _ids(self):
+        resp = self.client.get("/api/music/recommendations/")
+        self.assertEqual(resp.status_code, 200)
+        return [row["id"] for row in resp.data]
+
+    def test_fallback_to_liked_centroid(self):
+        for song in self.songs[:2]:
+            SongLike.objects.create(user=self.user, song=song)
+        ids = self._ids()
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(ids[:2], [self.songs[2].id, self.songs[3].id])
+
+    def test_user_factor_ranks_by_cf(self):
+        self.factors.user_ids = np.array([self.user.id], dtype=np.int64)
+        self.factors.factors = np.array([[1.0]], dtype=np.float32)
+        SongLike.objects.create(user=self.user, song=self.songs[-1])
+        ids = self._ids()
+        # cf 最大的歌排在前面，已收藏的被排除
+        self.assertEqual(ids[:3], [s.id for s in self.songs[-2:-5:-1]])
+
+    def test_no_index_returns_empty(self):
+        # 新部署：没有发布过的版本，也没有旧版单文件索引
+        empty = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, empty)
+        with mock.patch("music.views.get_index", index_module.get_index), mock.patch.multiple(
+            index_module,
+            MANIFEST_PATH=os.path.join(empty, "index_manifest.json"),
+            INDEX_PATH=os.path.join(empty, "song_hybrid.index"),
+            MAP_PATH=os.path.join(empty, "song_id_map.npy"),
+            PARAMS_PATH=os.path.join(empty, "song_hybrid.params.json"),
+            _handle=None,
+            _manifest_mtime=None,
+            _next_check=0.0,
+        ):
+            resp = self.client.get("/api/music/recommendations/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, [])
+
+    def test_cache_invalidated_by_like(self):
+        SongLike.objects.create(user=self.user, song=self.songs[0])
+        with mock.patch(
+            "music.views.search_excluding", wraps=search_excluding
+        ) as search:
+            first = self._ids()
+            self.assertEqual(self._ids(), first)
+            self.assertEqual(search.call_count, 1)
+
+            self.client.post(f"/api/music/{first[0]}/like/")
+            self.assertNotIn(first[0], self._ids())
+            self.assertEqual(search.call_count, 2)
+
+    def test_no_likes_no_factor(self):
+        self.assertEqual(self._ids(), [])
+
+
+class SimilarSongsTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for target, value in (
+            ("recommender.similar.SIMILAR_PATH", os.path.join(tmp.name, "similar.npy")),
+            ("recommender.similar._table", _SimilarTable()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # 20 首歌在单位圆上依次排开，相邻的歌最相似
+        angles = np.linspace(0, np.pi, 20, dtype=np.float32)
+        self.vecs = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        self.songs = [Song.objects.create(title=f"Song {i}", artist="A") for i in range(20)]
+        for song, vec in zip(self.songs, self.vecs):
+            SongVector.objects.create(song=song, hybrid_vector=vec)
+        call_command(
+            "build_similar_tracks", k=3, block_size=7, threads=2, stdout=StringIO()
+        )
+
+    def test_precomputed_neighbours(self):
+        resp = self.client.get(f"/api/music/{self.songs[5].id}/similar/")
+        self.assertEqual(resp.status_code, 200)
+        ids = [row["id"] for row in resp.data]
+        self.assertEqual(sorted(ids[:2]), [self.songs[4].id, self.songs[6].id])
+        self.assertEqual(len(ids), 3)
+        self.assertNotIn(self.songs[5].id, ids)
+
+        resp = self.client.get(f"/api/music/{self.songs[0].id}/similar/?limit=1")
+        self.assertEqual([row["id"] for row in resp.data], [self.songs[1].id])
+
+    def test_new_song_falls_back_to_index(self):
+        song = Song.objects.create(title="New", artist="B")
+        SongVector.objects.create(song=song, hybrid_vector=self.vecs[10])
+        index, params = build_index(self.vecs, ids=[s.id for s in self.songs])
+        handle = IndexHandle("v1", index, None, params)
+        with mock.patch("music.views.get_index", return_value=handle):
+            resp = self.client.get(f"/api/music/{song.id}/similar/?limit=1")
+        self.assertEqual([row["id"] for row in resp.data], [self.songs[10].id])
+
+    def test_precomputed_hit_needs_no_query(self):
+        url = f"/api/music/{self.songs[5].id}/similar/"
+        self.client.get(url)  # 预热曲库
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_new_song_without_index(self):
+        song = Song.objects.create(title="New", artist="B")
+        SongVector.objects.create(song=song, hybrid_vector=self.vecs[10])
+        with mock.patch("music.views.get_index", side_effect=RuntimeError("no index")):
+            resp = self.client.get(f"/api/music/{song.id}/similar/")
+        self.assertEqual((resp.status_code, resp.data), (200, []))
+
+    def test_unknown_song(self):
+        self.assertEqual(self.client.get("/api/music/999999/similar/").status_code, 404)
+
+
+class GenreRecommendationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.jazz = {Song.objects.create(title=f"J{i}", artist="A", school="jazz").id for i in range(30)}
+        Song.objects.create(title="Loud", artist="B", school="Metal")
+
+    def _ids(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return [row["id"] for row in resp.data]
+
+    def test_sample_from_genre(self):
+        ids = self._ids("/api/music/genres/jazz/")
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertTrue(set(ids) <= self.jazz)
+        # 大小写不敏感，少于 10 首时全部返回
+        self.assertEqual(len(self._ids("/api/music/genres/METAL/")), 1)
+        self.assertEqual(self._ids("/api/music/genres/rock/"), [])
+        self.assertEqual(len(self._ids("/api/music/genres/金属/")), 1)
+
+    def test_seed_is_reproducible(self):
+        first = self._ids("/api/music/genres/jazz/?seed=7")
+        self.assertEqual(self._ids("/api/music/genres/jazz/?seed=7"), first)
+        self.assertNotEqual(self._ids("/api/music/genres/jazz/?seed=8"), first)
+        self.assertEqual(self.client.get("/api/music/genres/jazz/?seed=x").status_code, 400)
+
+    def test_sees_new_upload(self):
+        song = Song.objects.create(title="Fresh", artist="C", school="folk")
+        self.assertEqual(self._ids("/api/music/genres/folk/"), [song.id])
+
+    @override_settings(RECOMMENDER_CATALOG_CHECK_SECONDS=3600)
+    def test_never_returns_deleted_or_moved_songs(self):
+        self._ids("/api/music/genres/jazz/")  # 加载曲库
+        # 其他进程删除 / 修改了歌曲：本进程的曲库在检查间隔内尚未更新
+        gone = sorted(self.jazz)[:25]
+        Song.objects.filter(id__in=gone[:20]).delete()
+        Song.objects.filter(id__in=gone[20:]).update(school="rock")
+        for seed in range(5):
+            ids = self._ids(f"/api/music/genres/jazz/?seed={seed}")
+            self.assertTrue(set(ids) <= self.jazz - set(gone))
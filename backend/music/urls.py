@@ -2,17 +2,34 @@
 from django.urls import path
 from .views import (
     SongSearchView,
+    SongSuggestView,
+    CacheStatsView,
     UploadView,
+    ImportJobCreateView,
+    ImportJobDetailView,
+    ImportJobResumeView,
     GenreRecommendationView,
     SongLikeToggleView,
     UserLikedSongsView,
     LikedSongDeleteView,
+    UserRecommendationView,
+    SimilarSongsView,
 )
 
 urlpatterns = [
     path("", SongSearchView.as_view(), name="song-search"),
+    path("suggest/", SongSuggestView.as_view(), name="song-suggest"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache-stats"),
     path("upload/", UploadView.as_view(), name="song-upload"),
+    path("imports/", ImportJobCreateView.as_view(), name="import-create"),
+    path("imports/<int:job_id>/", ImportJobDetailView.as_view(), name="import-detail"),
+    path(
+        "imports/<int:job_id>/resume/",
+        ImportJobResumeView.as_view(),
+        name="import-resume",
+    ),
     path("<int:song_id>/like/", SongLikeToggleView.as_view(), name="song-like"),
+    path("<int:song_id>/similar/", SimilarSongsView.as_view(), name="song-similar"),
     path(
         "genres/<str:code>/",
         GenreRecommendationView.as_view(),
@@ -20,4 +37,9 @@ urlpatterns = [
     ),
     path("likes/", UserLikedSongsView.as_view(), name="user-liked-songs"),
     path("likes/<int:song_id>/", LikedSongDeleteView.as_view(), name="liked-song-delete"),
+    path(
+        "recommendations/",
+        UserRecommendationView.as_view(),
+        name="user-recommendations",
+    ),
 ]
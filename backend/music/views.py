@@ -1,90 +1,177 @@
 # music/views.py
 from django.shortcuts import get_object_or_404
-from rest_framework import generics, status, filters, permissions
+from rest_framework import generics, status, permissions
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from django.conf import settings
 from django.http import Http404
-from django.db.models import Q
-import random
-
-from .models import Song, SongLike
-from .serializers import SongSerializer, SongUploadSerializer
-from .pagination import StandardResultsSetPagination
-
-# 可用的流派列表，直接对应数据库中的值
-AVAILABLE_GENRES = [
-    "jpop", "blues", "classical", "country", "dance", 
-    "electronic", "folk", "hiphop", "jazz", "kpop", 
-    "metal", "pop", "punk", "rnb", "rock"
-]
-
-GENRE_MAP = {
-    "pop": "流行",
-    "rock": "摇滚",
-    "jazz": "爵士",
-    "classical": "古典",
-    "hiphop": "嘻哈",
-    "electronic": "电子",
-    "folk": "民谣",
-    "country": "乡村",
-    "blues": "蓝调",
-    "metal": "金属",
-    "jpop": "日本流行",
-    "kpop": "韩国流行",
-    "rnb": "R&B",
-    "punk": "朋克",
-    "dance": "舞曲",
-}
+import logging
+import numpy as np
+from io import BytesIO
+
+from recommender.catalog import get_catalog
+from recommender.index import get_index, search_excluding
+from recommender.similar import similar_songs
+from recommender.serving import (
+    cache_for_you,
+    cached_for_you,
+    centroid_queries,
+    invalidate_for_you,
+    serialize_ranked,
+    user_query,
+)
+
+from .genres import AVAILABLE_GENRES, normalize_genre
+from .ingest import IngestError, TooManyItems, ingest_stream
+from . import imports
+from .caching import cached_response, stats as cache_stats
+from .models import ImportJob, Song, SongLike
+from .serializers import ImportJobSerializer, SongSerializer
+from .pagination import (
+    SongCursorPagination,
+    StandardResultsSetPagination,
+    paginated_songs,
+    wants_cursor,
+)
+from .search import SongSearchFilter
+from .suggest import get_suggest_index
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_BATCH_SIZE = getattr(settings, "MUSIC_UPLOAD_BATCH_SIZE", 1000)  # 每批校验 / 写入的条数
 
 
 class SongSearchView(generics.ListAPIView):
     """
-    Read-only list with simple keyword search on title / artist / school.
+    Read-only list with keyword search on title / artist / school, ranked
+    by relevance (FULLTEXT on MySQL, see music.search).
     Inherits *ListAPIView* to get pagination off by default and
     to keep the view minimal.
     """
 
     serializer_class = SongSerializer
     queryset = Song.objects.all()
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [SongSearchFilter]
     search_fields = ["title", "artist", "school"]  # maps to ?search=
 
-    pagination_class = StandardResultsSetPagination
+    @property
+    def pagination_class(self):
+        # ?cursor= 时按 id 键集分页（结果按 id 而非相关度排序）
+        if wants_cursor(getattr(self, "request", None)):
+            return SongCursorPagination
+        return StandardResultsSetPagination
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            "song_search",
+            request,
+            ["songs"],
+            lambda: super(SongSearchView, self).list(request, *args, **kwargs),
+        )
+
+
+class CacheStatsView(APIView):
+    """Hit / miss counters of the response cache, per endpoint (admins only)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class SongSuggestView(APIView):
+    """
+    Typeahead suggestions: titles / artists starting with ``?q=`` (or with
+    a word in them starting with it), served from the in-memory prefix
+    index without touching the DB.
+    """
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 20)
+        except ValueError:
+            limit = 10
+        q = request.query_params.get("q", "")
+        return Response(get_suggest_index().suggest(q, limit))
 
 
 class UploadView(APIView):
+    """
+    Bulk song upload. The body is a JSON array or NDJSON of
+    ``{"Track name", "Artist name", "School"}`` objects, parsed as a stream
+    and inserted in batches; songs already in the catalog are skipped.
+    Returns a summary instead of the created rows. Bodies with more than
+    MUSIC_UPLOAD_MAX_ITEMS items are rejected with 413.
+    """
+
     def post(self, request, format=None):
-        raw = request.data
-        if not isinstance(raw, list):
+        # 不读 request.data，直接流式解析请求体，内存占用与上传大小无关
+        try:
+            summary = ingest_stream(
+                request.stream or BytesIO(),
+                UPLOAD_BATCH_SIZE,
+                settings.MUSIC_UPLOAD_MAX_ITEMS,
+            )
+        except TooManyItems as e:
             return Response(
-                {"detail": "Expected a JSON array."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"detail": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
             )
+        except IngestError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 把带空格的键 → title / artist / school
-        normalized = []
-        for idx, item in enumerate(raw, start=1):
-            try:
-                normalized.append(
-                    {
-                        "title": item["Track name"],
-                        "artist": item["Artist name"],
-                        "school": item.get("School", "未知流派"),
-                    }
-                )
-            except KeyError as e:
-                return Response(
-                    {"detail": f"Item #{idx} missing key: {e}"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        # many=True 批量校验 & 保存
-        serializer = SongUploadSerializer(data=normalized, many=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()  # 每行都 insert，一般足够；如需极致性能可自行改 bulk_create
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        code = status.HTTP_201_CREATED if summary["created"] else status.HTTP_200_OK
+        return Response(summary, status=code)
+
+
+class ImportJobCreateView(APIView):
+    """
+    Queue a catalog file (multipart field ``file``, same format as the
+    upload body) for background import and return the job at once.
+    """
+
+    parser_classes = [MultiPartParser]
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"detail": "file required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        job = ImportJob.objects.create(owner=request.user, file=upload)
+        imports.submit(job)
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    """Progress of an import job: status and processed / failed counts."""
+
+    serializer_class = ImportJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    lookup_url_kwarg = "job_id"
+
+    def get_queryset(self):
+        # 只能查看自己创建的任务
+        return ImportJob.objects.filter(owner=self.request.user)
+
+
+class ImportJobResumeView(APIView):
+    """Re-queue a failed or interrupted job from its last committed batch."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, job_id):
+        job = get_object_or_404(ImportJob, pk=job_id, owner=request.user)
+        if not imports.requeue(job):
+            job.refresh_from_db()
+            return Response(
+                {"detail": f"job is {job.status}, nothing to resume"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        job.refresh_from_db()
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 class GenreRecommendationView(APIView):
@@ -92,8 +179,8 @@ class GenreRecommendationView(APIView):
     Return a list of songs for a specified genre.
     """
     def get(self, request, code, *args, **kwargs):
-        # 确保流派代码是小写的
-        genre_code = code.lower()
+        # 规范化为流派代码：大小写不敏感，中文显示名也可以
+        genre_code = normalize_genre(code)
         
         # 检查是否是支持的流派
         if genre_code not in AVAILABLE_GENRES:
@@ -103,30 +190,30 @@ class GenreRecommendationView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
             
-        # 构建精确匹配查询
-        query = Q(school__iexact=genre_code)
-        
-        # 查询匹配的歌曲
-        matching_songs = Song.objects.filter(query)
-        
-        # 如果没有找到匹配的歌曲，返回空列表
-        if not matching_songs.exists():
-            return Response([])
-            
-        # 随机选择最多10首歌曲
-        count = min(matching_songs.count(), 10)
-        if count < matching_songs.count():
-            # 获取所有ID，然后随机选择
-            all_ids = list(matching_songs.values_list('id', flat=True))
-            random_ids = random.sample(all_ids, count)
-            result_songs = Song.objects.filter(id__in=random_ids)
-        else:
-            # 如果歌曲数量少于10，直接使用所有匹配的歌曲
-            result_songs = matching_songs
-            
-        # 序列化并返回结果
-        serializer = SongSerializer(result_songs, many=True)
-        return Response(serializer.data)
+        seed = request.query_params.get("seed")
+        try:
+            rng = np.random.default_rng(None if seed is None else int(seed))
+        except ValueError:
+            return Response(
+                {"detail": "seed must be a non-negative integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def sample():
+            # 从内存中的流派 id 数组随机抽取，开销与流派大小无关；曲库最多滞后
+            # RECOMMENDER_CATALOG_CHECK_SECONDS，所以按主键回库取行，已删除或
+            # 改了流派的歌曲不会返回。多抽一些，被过滤掉后仍能凑满 10 首
+            genre_ids = get_catalog().genre_ids(genre_code)
+            picked = rng.choice(len(genre_ids), size=min(len(genre_ids), 20), replace=False)
+            picked = genre_ids[picked].tolist()
+            songs = Song.objects.filter(id__in=picked, school=genre_code).in_bulk()
+            found = [songs[sid] for sid in picked if sid in songs][:10]
+            return Response(SongSerializer(found, many=True).data)
+
+        # 只有指定 seed 的结果是确定的，才能缓存
+        if seed is None:
+            return sample()
+        return cached_response("genre_songs", request, ["songs"], sample)
 
 
 class SongLikeToggleView(APIView):
@@ -136,6 +223,7 @@ class SongLikeToggleView(APIView):
         song = get_object_or_404(Song, pk=song_id)
         like, created = SongLike.objects.get_or_create(user=request.user, song=song)
         if created:
+            invalidate_for_you(request.user.id)
             return Response({"detail": "liked"}, status=status.HTTP_201_CREATED)
         return Response({"detail": "already liked"}, status=status.HTTP_200_OK)
 
@@ -143,6 +231,7 @@ class SongLikeToggleView(APIView):
         song = get_object_or_404(Song, pk=song_id)
         deleted, _ = SongLike.objects.filter(user=request.user, song=song).delete()
         if deleted:
+            invalidate_for_you(request.user.id)
             return Response({"detail": "unliked"}, status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"detail": "not liked before"}, status=status.HTTP_400_BAD_REQUEST
@@ -156,13 +245,20 @@ class UserLikedSongsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        return cached_response(
+            "liked_songs",
+            request,
+            ["songs", f"likes:{request.user.pk}"],
+            lambda: self._list(request),
+        )
+
+    def _list(self, request):
         # 获取用户喜欢的所有SongLike对象
         liked_song_ids = SongLike.objects.filter(user=request.user).values_list('song_id', flat=True)
         # 获取对应的Song对象
         songs = Song.objects.filter(id__in=liked_song_ids)
-        # 序列化并返回结果
-        serializer = SongSerializer(songs, many=True)
-        return Response(serializer.data)
+        # 序列化并返回结果（?cursor= 时分页）
+        return paginated_songs(request, songs, SongSerializer, self)
 
 
 class LikedSongDeleteView(APIView):
@@ -176,6 +272,99 @@ class LikedSongDeleteView(APIView):
         try:
             like = SongLike.objects.get(user=request.user, song_id=song_id)
             like.delete()
+            invalidate_for_you(request.user.id)
             return Response({"detail": "已从收藏列表中移除"}, status=status.HTTP_204_NO_CONTENT)
         except SongLike.DoesNotExist:
             return Response({"detail": "未找到此收藏歌曲"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class UserRecommendationView(APIView):
+    """
+    GET /api/music/recommendations/
+    为当前用户推荐歌曲：用用户隐因子（没有时退回到已收藏歌曲 hybrid 向量的均值）
+    检索 FAISS 索引，排除已收藏的歌曲。结果按用户缓存，收藏变化或索引换版本时失效
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    top_n = 10
+
+    def get(self, request):
+        user_id = request.user.id
+        try:
+            handle = get_index(settings.RECOMMENDER_INDEX_CHECK_SECONDS)
+        except (RuntimeError, OSError):
+            # 新部署尚未构建索引：没有可推荐的内容
+            logger.warning("No FAISS index available; returning no recommendations")
+            return Response([])
+        data = cached_for_you(user_id, handle.version)
+        if data is not None:
+            return Response(data)
+
+        liked = list(SongLike.objects.filter(user_id=user_id).values_list("song_id", flat=True))
+        query = user_query(
+            user_id, liked, handle.index.d, settings.RECOMMENDER_INDEX_CHECK_SECONDS
+        )
+        data = []
+        if query is not None:
+            ids, scores = search_excluding(
+                handle.index,
+                handle.song_map,
+                query,
+                [set(liked)],
+                self.top_n,
+                settings.RECOMMENDER_SEARCH_K,
+            )
+            data = serialize_ranked({user_id: (ids[0], scores[0])})[user_id]
+
+        cache_for_you(user_id, handle.version, data, settings.RECOMMENDER_FOR_YOU_TTL)
+        return Response(data)
+
+
+class SimilarSongsView(APIView):
+    """
+    GET /api/music/<id>/similar/?limit=10
+    返回预计算的相似歌曲（build_similar_tracks）；表中还没有的新歌
+    退回到用其 hybrid 向量实时检索一次索引
+    """
+
+    max_limit = 50
+
+    def get(self, request, song_id):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            return Response(
+                {"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, self.max_limit))
+
+        found = similar_songs(song_id, limit, settings.RECOMMENDER_INDEX_CHECK_SECONDS)
+        if found is None:
+            # 表中没有：先确认歌曲存在（内存曲库里没有时才查库），再实时检索
+            _, missing = get_catalog().lookup([song_id])
+            if missing and not Song.objects.filter(pk=song_id).exists():
+                raise Http404
+            found = self._search(song_id, limit)
+        if found is None:
+            return Response([])
+        return Response(serialize_ranked({song_id: found})[song_id])
+
+    def _search(self, song_id, limit):
+        _, query = centroid_queries({song_id: [song_id]})
+        if not len(query):
+            return None
+        try:
+            handle = get_index(settings.RECOMMENDER_INDEX_CHECK_SECONDS)
+        except (RuntimeError, OSError):
+            return None  # 尚未构建索引
+        if query.shape[1] != handle.index.d:
+            return None
+        ids, scores = search_excluding(
+            handle.index,
+            handle.song_map,
+            query,
+            [{song_id}],
+            limit,
+            settings.RECOMMENDER_SEARCH_K,
+        )
+        return ids[0], scores[0]
@@ -9,4 +9,19 @@ class PlaylistConfig(AppConfig):
     verbose_name = "歌单管理"
 
     def ready(self):
-        pass
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+        from music import caching
+        from .models import Playlist
+
+        # 歌单本身或其中的歌曲变化时，让该歌单的缓存推荐失效
+        post_save.connect(
+            caching.playlist_changed, sender=Playlist, dispatch_uid="cache_playlist_saved"
+        )
+        post_delete.connect(
+            caching.playlist_changed, sender=Playlist, dispatch_uid="cache_playlist_deleted"
+        )
+        m2m_changed.connect(
+            caching.playlist_songs_changed,
+            sender=Playlist.songs.through,
+            dispatch_uid="cache_playlist_songs",
+        )
@@ -1,8 +1,16 @@
 # playlist/tests.py
 
-from django.test import TestCase
+from unittest import mock
+
+import faiss
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
+from rest_framework.test import APIClient
 from music.models import Song
+from recommender.models import SongVector
 from .models import Playlist
 from datetime import timedelta
 
@@ -32,3 +40,128 @@ class PlaylistModelTest(TestCase):
     def test_playlist_songs(self):
         # 测试歌单中歌曲是否添加成功
         self.assertEqual(self.playlist.songs.count(), 2)
+
+
+class TrackListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="tracks", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.songs = [Song.objects.create(title=f"T{i}", artist="A") for i in range(7)]
+        self.playlist = Playlist.objects.create(name="P", owner=self.user)
+        self.playlist.songs.add(*self.songs)
+
+    def test_cursor_is_opt_in(self):
+        url = f"/api/playlists/{self.playlist.id}/tracks/"
+        self.assertEqual(len(self.client.get(url).data), 7)
+
+        resp = self.client.get(url, {"cursor": "", "page_size": 5})
+        self.assertEqual(resp.data["count"], 7)
+        self.assertEqual([r["id"] for r in resp.data["results"]], [s.id for s in self.songs[:5]])
+        resp = self.client.get(resp.data["next"])
+        self.assertEqual([r["id"] for r in resp.data["results"]], [s.id for s in self.songs[5:]])
+        self.assertIsNone(resp.data["next"])
+
+
+@override_settings(API_CACHE_TTLS={"playlist_recommendations": 300})
+class PlaylistRecommendationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="recuser", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # 30 首歌，向量在单位圆上依次排开，相邻的歌最相似
+        angles = np.linspace(0, np.pi, 30, dtype=np.float32)
+        vecs = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        self.songs = [
+            Song.objects.create(title=f"Song {i}", artist="Artist") for i in range(30)
+        ]
+        for song, vec in zip(self.songs, vecs):
+            SongVector.objects.create(song=song, hybrid_vector=vec)
+
+        index = faiss.IndexFlatIP(2)
+        index.add(vecs)
+        song_map = np.array([s.id for s in self.songs], dtype=np.int64)
+        patcher = mock.patch(
+            "playlist.views._load_index", return_value=(index, song_map)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.handle = mock.Mock(version="v1")
+        patcher = mock.patch("playlist.views.get_index", return_value=self.handle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.head = Playlist.objects.create(name="Head", owner=self.user)
+        self.head.songs.add(*self.songs[:3])
+        self.tail = Playlist.objects.create(name="Tail", owner=self.user)
+        self.tail.songs.add(*self.songs[-3:])
+
+    def test_single_playlist(self):
+        resp = self.client.get(f"/api/playlists/{self.head.pk}/recommendations/")
+        self.assertEqual(resp.status_code, 200)
+        ids = [s["id"] for s in resp.data]
+        # 不包含歌单已有歌曲，按相似度排序
+        self.assertEqual(ids, [s.id for s in self.songs[3:13]])
+        scores = [s["score"] for s in resp.data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(resp.data[0]["title"], "Song 3")
+
+    def test_cached_until_tracks_change(self):
+        url = f"/api/playlists/{self.head.pk}/recommendations/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.head.songs.add(self.songs[3])
+        resp = self.client.get(url)
+        self.assertEqual(resp["X-Cache"], "MISS")
+        self.assertNotIn(self.songs[3].id, [s["id"] for s in resp.data])
+        # 从歌曲一侧修改同样失效
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.songs[3].playlists.remove(self.head)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_cache_follows_index_version(self):
+        url = f"/api/playlists/{self.head.pk}/recommendations/"
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        # 索引热切换到新版本后不再命中旧结果
+        self.handle.version = "v2"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_k_expands_for_large_playlist(self):
+        # 初始 K 很小、歌单很大时，仍应返回满 10 首
+        big = Playlist.objects.create(name="Big", owner=self.user)
+        big.songs.add(*self.songs[:15])
+        with mock.patch("playlist.views.SEARCH_K", 4):
+            resp = self.client.get(f"/api/playlists/{big.pk}/recommendations/")
+        self.assertEqual([s["id"] for s in resp.data], [s.id for s in self.songs[15:25]])
+
+    def test_returns_what_is_left_when_catalog_exhausted(self):
+        big = Playlist.objects.create(name="Almost all", owner=self.user)
+        big.songs.add(*self.songs[:25])
+        resp = self.client.get(f"/api/playlists/{big.pk}/recommendations/")
+        self.assertEqual(len(resp.data), 5)
+
+    def test_batch_keyed_by_playlist(self):
+        resp = self.client.get(
+            "/api/playlists/recommendations/",
+            {"ids": f"{self.head.pk},{self.tail.pk}"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [s["id"] for s in resp.data[str(self.head.pk)]],
+            [s.id for s in self.songs[3:13]],
+        )
+        self.assertEqual(
+            [s["id"] for s in resp.data[str(self.tail.pk)]],
+            [s.id for s in reversed(self.songs[-13:-3])],
+        )
+
+    def test_batch_rejects_bad_ids(self):
+        resp = self.client.get("/api/playlists/recommendations/", {"ids": "1,x"})
+        self.assertEqual(resp.status_code, 400)
@@ -7,6 +7,7 @@ from .views import (
     TrackListCreateView,
     TrackDeleteView,
     PlaylistRecommendationView,
+    PlaylistBatchRecommendationView,
 )
 
 urlpatterns = [
@@ -14,6 +15,12 @@ urlpatterns = [
     path("", PlaylistCreateView.as_view(), name="playlist-create"),
     # /api/playlists/list/
     path("list/", PlaylistListView.as_view(), name="playlist-list"),
+    # /api/playlists/recommendations/?ids=1,2,3
+    path(
+        "recommendations/",
+        PlaylistBatchRecommendationView.as_view(),
+        name="playlist-batch-recommendations",
+    ),
     # /api/playlists/{id}/
     path("<int:pk>/", PlaylistDetailView.as_view(), name="playlist-detail"),
     # /api/playlists/{id}/tracks/
@@ -1,7 +1,4 @@
 # playlist/views.py
-import os
-import numpy as np
-import faiss
 
 from django.shortcuts import get_object_or_404
 from django.conf import settings
@@ -12,26 +9,26 @@ from rest_framework.views import APIView
 from .models import Playlist
 from .serializers import PlaylistSerializer, PlaylistSummarySerializer
 
+from music.caching import cached_response
+from music.pagination import paginated_songs
 from music.serializers import SongSerializer
 from music.models import Song
-from recommender.models import SongVector
+from recommender.index import get_index, search_excluding
+from recommender.catalog import get_catalog
+from recommender.serving import centroid_queries, serialize_ranked
 
 
-DATA_DIR = os.path.join(settings.BASE_DIR, "recommender", "data")
-INDEX_PATH = os.path.join(DATA_DIR, "song_hybrid.index")
-MAP_PATH = os.path.join(DATA_DIR, "song_id_map.npy")
-
+def _load_index():
+    handle = get_index(settings.RECOMMENDER_INDEX_CHECK_SECONDS)
+    get_catalog()  # 与索引一同预热歌曲元数据
+    return handle.index, handle.song_map
 
-_index = None
-_song_map = None
 
-
-def _load_index():
-    global _index, _song_map
-    if _index is None:
-        _index = faiss.read_index(INDEX_PATH)
-        _song_map = np.load(MAP_PATH)
-    return _index, _song_map
+def _index_version():
+    try:
+        return get_index(settings.RECOMMENDER_INDEX_CHECK_SECONDS).version
+    except (RuntimeError, OSError):
+        return None  # 尚未构建索引，由 _recommend 处理
 
 
 # ---------- POST /api/playlists/ ----------
@@ -89,8 +86,7 @@ class TrackListCreateView(APIView):
 
     def get(self, request, pk):
         playlist = self._get_playlist(request, pk)
-        serializer = SongSerializer(playlist.songs.all(), many=True)
-        return Response(serializer.data)
+        return paginated_songs(request, playlist.songs.all(), SongSerializer, self)
 
     def post(self, request, pk):
         playlist = self._get_playlist(request, pk)
@@ -118,45 +114,95 @@ class TrackDeleteView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# ---------- 推荐公共逻辑 ----------
+SEARCH_K = getattr(settings, "RECOMMENDER_SEARCH_K", 20)  # 初始 K，不足时逐步翻倍
+TOP_N = 10
+MAX_BATCH = 50  # 批量接口一次最多处理的歌单数
+
+
+def _recommend(members):
+    """
+    Return ``{playlist id: (song ids, scores)}`` with at most TOP_N songs
+    each, best match first.
+    """
+    pids, queries = centroid_queries(members)
+    if not pids:
+        return {}
+
+    index, song_map = _load_index()
+    excludes = [set(members[pid]) for pid in pids]
+    ids, scores = search_excluding(index, song_map, queries, excludes, TOP_N, SEARCH_K)
+    return dict(zip(pids, zip(ids, scores)))
+
+
 # ---------- GET /api/playlists/{id}/recommendations/ ----------
 class PlaylistRecommendationView(APIView):
     """
-    先留空，后续实现推荐逻辑
+    根据歌单内歌曲的 hybrid 向量均值检索相似歌曲，返回 10 首推荐
     """
 
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
+        # 缓存键包含用户，命中的一定是该用户有权访问的歌单；
+        # 也包含索引版本，热切换或增量追加后的索引立即生效
+        return cached_response(
+            "playlist_recommendations",
+            request,
+            ["songs", f"playlist:{pk}"],
+            lambda: self._recommend(request, pk),
+            extra=[_index_version()],
+        )
+
+    def _recommend(self, request, pk):
         playlist = get_object_or_404(Playlist, pk=pk, owner=request.user)
         song_ids = list(playlist.songs.values_list("id", flat=True))
         if not song_ids:
             return Response([], status=status.HTTP_200_OK)
 
-        # —— 1. 取歌单向量 ——
-        vecs = [
-            sv.hybrid_vector
-            for sv in SongVector.objects.filter(song_id__in=song_ids)
-            if sv.hybrid_vector
-        ]
-        if not vecs:
-            return Response([], status=status.HTTP_200_OK)
+        recs = _recommend({playlist.pk: song_ids})
+        data = serialize_ranked(recs).get(playlist.pk, [])
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# ---------- GET /api/playlists/recommendations/?ids=1,2,3 ----------
+class PlaylistBatchRecommendationView(APIView):
+    """
+    一次为多个歌单生成推荐：所有查询向量合并成一次 index.search，
+    结果以歌单 id 为键返回，只包含当前用户自己的歌单
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
 
-        arr = np.array(vecs, dtype=np.float32)
-        faiss.normalize_L2(arr)
-        query = arr.mean(axis=0, keepdims=True)
-        faiss.normalize_L2(query)
-
-        # —— 2. 检索 3×10 条候选（足够剔除后仍≥10） ——
-        index, song_map = _load_index()
-        SEARCH_K = 50  # 检索更大 K
-        D, I = index.search(query, SEARCH_K)
-        rec_ids = song_map[I[0]].tolist()
-
-        # —— 3. 剔除歌单已有歌曲，再取前 10 ——
-        original_set = set(song_ids)
-        filtered = [sid for sid in rec_ids if sid not in original_set][:10]
-
-        # 若过滤后不足 10，可按需再扩 K 或直接返回现有结果
-        songs = Song.objects.filter(id__in=filtered)
-        serializer = SongSerializer(songs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def get(self, request):
+        raw = request.query_params.get("ids", "")
+        try:
+            pids = [int(x) for x in raw.split(",") if x.strip()]
+        except ValueError:
+            return Response(
+                {"detail": "ids must be a comma-separated list of integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not pids:
+            return Response(
+                {"detail": "ids required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(pids) > MAX_BATCH:
+            return Response(
+                {"detail": f"at most {MAX_BATCH} playlists per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 一次查询取出所有歌单的歌曲
+        owned = Playlist.objects.filter(owner=request.user, pk__in=pids)
+        members = {pid: [] for pid in owned.values_list("pk", flat=True)}
+        through = Playlist.songs.through.objects.filter(playlist_id__in=members)
+        for pid, sid in through.values_list("playlist_id", "song_id"):
+            members[pid].append(sid)
+
+        recs = _recommend({pid: ids for pid, ids in members.items() if ids})
+        data = serialize_ranked(recs)
+        return Response(
+            {str(pid): data.get(pid, []) for pid in members},
+            status=status.HTTP_200_OK,
+        )
@@ -4,3 +4,54 @@ from django.apps import AppConfig
 class RecommenderConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recommender"
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_delete, post_save
+        from music.models import Song, SongLike
+        # 新歌让本进程的歌曲元数据立即追加；修改、删除与其他进程的变化
+        # 由 get_catalog 的定期指纹检查发现
+        post_save.connect(
+            _song_created, sender=Song, dispatch_uid="catalog_song_created"
+        )
+
+        # 记录取消的点赞，供交互矩阵增量构建使用
+        post_delete.connect(
+            _record_unlike, sender=SongLike, dispatch_uid="record_unlike"
+        )
+
+        # 新上传 / 新被收藏的歌曲增量加入向量索引
+        if settings.RECOMMENDER_INCREMENTAL_INDEXING:
+            post_save.connect(
+                _index_new_song, sender=Song, dispatch_uid="index_new_song"
+            )
+            post_save.connect(
+                _index_liked_song, sender=SongLike, dispatch_uid="index_liked_song"
+            )
+
+
+def _song_created(sender, instance, created, **kwargs):
+    if created:
+        from .catalog import invalidate_catalog
+
+        invalidate_catalog()
+
+
+def _index_new_song(sender, instance, created, **kwargs):
+    if created:
+        from .incremental import schedule
+
+        schedule([instance.pk])
+
+
+def _index_liked_song(sender, instance, created, **kwargs):
+    if created:
+        from .incremental import schedule
+
+        schedule([instance.song_id])
+
+
+def _record_unlike(sender, instance, **kwargs):
+    from .models import LikeDeletion
+
+    LikeDeletion.objects.create(user_id=instance.user_id, song_id=instance.song_id)
@@ -0,0 +1,185 @@
+# recommender/catalog.py
+
+"""
+In-process song metadata (id → title / artist / school) for serving
+recommendations straight after the ANN search without another DB round trip.
+
+Strings are packed into one UTF-8 buffer plus an offsets array and schools
+into small integer codes, so a large catalog costs a few bytes of overhead
+per song instead of one Python object per field.
+
+Each worker compares ``Song.objects.fingerprint()`` with the one it loaded
+at most every RECOMMENDER_CATALOG_CHECK_SECONDS, so staleness is bounded
+whatever the cache backend. When only new rows were appended they are
+merged in; edits and deletions trigger one full reload.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from music.models import Song
+
+
+class _StringColumn:
+    def __init__(self, values):
+        encoded = [v.encode("utf-8") for v in values]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=self.offsets[1:])
+        self.data = b"".join(encoded)
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i] : self.offsets[i + 1]].decode("utf-8")
+
+    def concat(self, other):
+        column = _StringColumn([])
+        column.offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        column.data = self.data + other.data
+        return column
+
+
+class SongCatalog:
+    def __init__(self, ids, titles, artists, schools):
+        order = np.argsort(ids, kind="stable")
+        names, codes = np.unique(np.asarray(schools, dtype=object), return_inverse=True)
+        self._set(
+            np.asarray(ids, dtype=np.int64)[order],
+            _StringColumn([titles[i] for i in order]),
+            _StringColumn([artists[i] for i in order]),
+            names.tolist(),
+            codes.astype(np.uint16)[order],
+        )
+
+    def _set(self, ids, titles, artists, school_names, school_codes):
+        self.ids = ids
+        self.titles = titles
+        self.artists = artists
+        self.school_names = school_names
+        self.school_codes = school_codes
+        self.fingerprint = None  # 加载时 Song.objects.fingerprint() 的值
+
+        # 每个流派（不区分大小写）一个 id 数组，按流派随机抽样时直接取用
+        by_code = np.argsort(self.school_codes, kind="stable")
+        bounds = np.searchsorted(
+            self.school_codes[by_code], np.arange(len(school_names) + 1)
+        )
+        genres = {}
+        for code, name in enumerate(self.school_names):
+            genres.setdefault(name.lower(), []).append(
+                self.ids[by_code[bounds[code] : bounds[code + 1]]]
+            )
+        self.genres = {name: np.concatenate(parts) for name, parts in genres.items()}
+
+    def extended(self, other):
+        """New catalog with *other* (songs whose ids are all above ours) appended."""
+        names = list(self.school_names)
+        codes = {name: code for code, name in enumerate(names)}
+        for name in other.school_names:
+            if name not in codes:
+                codes[name] = len(names)
+                names.append(name)
+        remap = np.array([codes[name] for name in other.school_names], dtype=np.uint16)
+        catalog = SongCatalog.__new__(SongCatalog)
+        catalog._set(
+            np.concatenate([self.ids, other.ids]),
+            self.titles.concat(other.titles),
+            self.artists.concat(other.artists),
+            names,
+            np.concatenate([self.school_codes, remap[other.school_codes]]),
+        )
+        return catalog
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, queryset=None):
+        ids, titles, artists, schools = [], [], [], []
+        queryset = Song.objects.all() if queryset is None else queryset
+        rows = queryset.values_list("id", "title", "artist", "school")
+        for song_id, title, artist, school in rows.iterator(chunk_size=5000):
+            ids.append(song_id)
+            titles.append(title)
+            artists.append(artist)
+            schools.append(school)
+        return cls(ids, titles, artists, schools)
+
+    def genre_ids(self, school):
+        """Ids of the songs whose school equals *school*, ignoring case."""
+        return self.genres.get(school.lower(), self.ids[:0])
+
+    def lookup(self, song_ids):
+        """
+        Return ``(rows, missing)``: serialised songs for the ids that are
+        known, in the order given, and the ids that are not in the catalog.
+        """
+        rows, missing = [], []
+        if not len(self.ids):
+            return rows, list(song_ids)
+        for sid in song_ids:
+            i = int(np.searchsorted(self.ids, sid))
+            if i < len(self.ids) and self.ids[i] == sid:
+                rows.append(
+                    {
+                        "id": sid,
+                        "title": self.titles[i],
+                        "artist": self.artists[i],
+                        "school": self.school_names[self.school_codes[i]],
+                    }
+                )
+            else:
+                missing.append(sid)
+        return rows, missing
+
+
+_catalog = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def _refresh(catalog):
+    fingerprint = Song.objects.fingerprint()
+    if catalog is not None and fingerprint == catalog.fingerprint:
+        return catalog
+    if catalog is not None:
+        # 已加载部分没有变化：只是追加了新歌，合并即可，不必整表重读
+        _, max_id, _ = catalog.fingerprint
+        if Song.objects.filter(id__lte=max_id).fingerprint() == catalog.fingerprint:
+            catalog = catalog.extended(SongCatalog.load(Song.objects.filter(id__gt=max_id)))
+            catalog.fingerprint = fingerprint
+            return catalog
+    catalog = SongCatalog.load()
+    catalog.fingerprint = fingerprint
+    return catalog
+
+
+def get_catalog():
+    """
+    Current catalog. At most every RECOMMENDER_CATALOG_CHECK_SECONDS one
+    thread compares the DB fingerprint and refreshes; the others keep
+    serving the current catalog meanwhile.
+    """
+    global _catalog, _next_check
+    now = time.monotonic()
+    if _catalog is not None and now < _next_check:
+        return _catalog
+
+    if _catalog is None:
+        _lock.acquire()
+    elif not _lock.acquire(blocking=False):
+        return _catalog
+    try:
+        if _catalog is None or time.monotonic() >= _next_check:
+            _catalog = _refresh(_catalog)
+            _next_check = now + settings.RECOMMENDER_CATALOG_CHECK_SECONDS
+    finally:
+        _lock.release()
+    return _catalog
+
+
+def invalidate_catalog(**kwargs):
+    """Check the fingerprint on the next get_catalog() in this process."""
+    global _next_check
+    _next_check = 0.0
@@ -0,0 +1,124 @@
+# recommender/content.py
+
+"""
+Content (artist / school) encoders behind SongVector.content_vector.
+
+``hashed`` maps each artist / school into a fixed number of signed hash
+buckets, so the vector length does not depend on catalog size and new songs
+can be encoded without refitting. ``onehot`` is the original encoding whose
+length is ``len(artists) + len(schools)``.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+ENCODER_PATH = os.path.join(DATA_DIR, "content_encoder.json")
+
+ENCODINGS = ("hashed", "onehot")
+
+
+def _signed_bucket(namespace, token, dim):
+    # 用稳定哈希（不能用内置 hash，进程间会随机化）
+    digest = hashlib.blake2b(f"{namespace}\x00{token}".encode("utf-8"), digest_size=8)
+    h = int.from_bytes(digest.digest(), "little")
+    return h % dim, (1.0 if h >> 63 == 0 else -1.0)
+
+
+class HashedContentEncoder:
+    encoding = "hashed"
+
+    def __init__(self, artist_dim=64, school_dim=16):
+        self.artist_dim = artist_dim
+        self.school_dim = school_dim
+
+    @property
+    def dim(self):
+        return self.artist_dim + self.school_dim
+
+    def fit(self, songs):
+        # 无需拟合：维度与曲库无关
+        return self
+
+    def encode(self, songs):
+        """*songs* is a sequence of ``(artist, school)``; returns ``(n, dim)`` float32."""
+        out = np.zeros((len(songs), self.dim), dtype=np.float32)
+        for row, (artist, school) in enumerate(songs):
+            j, sign = _signed_bucket("artist", artist, self.artist_dim)
+            out[row, j] = sign
+            j, sign = _signed_bucket("school", school, self.school_dim)
+            out[row, self.artist_dim + j] = sign
+        return out
+
+    def config(self):
+        return {
+            "encoding": self.encoding,
+            "artist_dim": self.artist_dim,
+            "school_dim": self.school_dim,
+        }
+
+
+class OneHotContentEncoder:
+    encoding = "onehot"
+
+    def __init__(self, artists=(), schools=()):
+        self.artists = list(artists)
+        self.schools = list(schools)
+        self._index()
+
+    def _index(self):
+        self.artist_idx = {a: i for i, a in enumerate(self.artists)}
+        self.school_idx = {s: i for i, s in enumerate(self.schools)}
+
+    @property
+    def dim(self):
+        return len(self.artists) + len(self.schools)
+
+    def fit(self, songs):
+        self.artists = sorted({artist for artist, _ in songs})
+        self.schools = sorted({school for _, school in songs})
+        self._index()
+        return self
+
+    def encode(self, songs):
+        out = np.zeros((len(songs), self.dim), dtype=np.float32)
+        offset = len(self.artists)
+        for row, (artist, school) in enumerate(songs):
+            if artist in self.artist_idx:
+                out[row, self.artist_idx[artist]] = 1
+            if school in self.school_idx:
+                out[row, offset + self.school_idx[school]] = 1
+        return out
+
+    def config(self):
+        return {
+            "encoding": self.encoding,
+            "artists": self.artists,
+            "schools": self.schools,
+        }
+
+
+def make_encoder(encoding="hashed", **params):
+    if encoding == "hashed":
+        return HashedContentEncoder(**params)
+    if encoding == "onehot":
+        return OneHotContentEncoder(**params)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def save_encoder(encoder, path=ENCODER_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(encoder.config(), f, ensure_ascii=False)
+
+
+def load_encoder(path=ENCODER_PATH):
+    """Return the encoder last used by generate_content_vectors, or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        params = json.load(f)
+    return make_encoder(**params)
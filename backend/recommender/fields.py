@@ -0,0 +1,36 @@
+# recommender/fields.py
+
+import numpy as np
+from django.db import models
+
+
+class Float32VectorField(models.BinaryField):
+    """
+    Packed little-endian float32 vector stored as a raw binary column.
+
+    Reads hand back a read-only ``np.ndarray`` view over the column bytes
+    (no text parsing at all); writes accept any 1-D list / array of numbers.
+    Empty vectors are stored as NULL.
+    """
+
+    dtype = np.dtype("<f4")
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=self.dtype)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return np.frombuffer(value, dtype=self.dtype)
+        return np.asarray(value, dtype=self.dtype)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        arr = np.ascontiguousarray(value, dtype=self.dtype).reshape(-1)
+        if not arr.size:
+            return None
+        return arr.tobytes()
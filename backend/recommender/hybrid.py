@@ -0,0 +1,43 @@
+# recommender/hybrid.py
+
+"""
+hybrid_vector = [cf_weight · cf_vector ; content_weight · content_vector].
+
+The weights used by the last full build are saved next to the content
+encoder so that incrementally indexed songs are scaled the same way.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .content import DATA_DIR
+
+WEIGHTS_PATH = os.path.join(DATA_DIR, "hybrid_weights.json")
+
+
+def combine(cf, content, cf_weight=1.0, content_weight=1.0):
+    """Row-wise weighted concatenation of two ``(n, d)`` blocks, as float32."""
+    return np.hstack(
+        [
+            np.asarray(cf, dtype=np.float32) * np.float32(cf_weight),
+            np.asarray(content, dtype=np.float32) * np.float32(content_weight),
+        ]
+    )
+
+
+def save_weights(cf_weight, content_weight, path=WEIGHTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"cf_weight": cf_weight, "content_weight": content_weight}, f)
+
+
+def load_weights(path=WEIGHTS_PATH):
+    """``(cf_weight, content_weight)`` of the last build, ``(1.0, 1.0)`` by default."""
+    try:
+        with open(path) as f:
+            weights = json.load(f)
+    except FileNotFoundError:
+        return 1.0, 1.0
+    return weights["cf_weight"], weights["content_weight"]
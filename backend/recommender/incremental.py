@@ -0,0 +1,146 @@
+# recommender/incremental.py
+
+"""
+Incremental path from "song uploaded" to "song recommendable".
+
+New songs get a content vector from the saved content encoder and a hybrid
+vector with an all-zero CF part (they have no likes yet). They are added to
+a copy of the live index, which is published as a new version that every
+worker hot-swaps (see recommender.index). Work is batched and runs on one
+background thread per process; the periodic full rebuild
+(``update_faiss_index --compact``) recomputes everything from scratch.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from django.db import close_old_connections, transaction
+
+from music.models import Song
+
+from . import index as index_module
+from .content import load_encoder
+from .hybrid import combine, load_weights
+from .models import SongVector
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_ATTEMPTS = 3
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommender-index")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def index_songs(song_ids):
+    """
+    Vectorise *song_ids* and add the ones not yet in the live index.
+    Returns the number of songs added (0 if there is nothing to do or no
+    published index / content encoder to extend).
+    """
+    encoder = load_encoder()
+    if encoder is None or index_module.read_manifest() is None:
+        logger.debug("No published index or content encoder; skipping %d songs", len(song_ids))
+        return 0
+
+    # 已有 hybrid 向量的歌曲由全量重建负责，这里只处理真正的新歌
+    vectorised = SongVector.objects.filter(
+        song_id__in=song_ids, hybrid_vector__isnull=False
+    ).values_list("song_id", flat=True)
+    song_ids = set(song_ids) - set(vectorised)
+    if not song_ids:
+        return 0
+
+    # 基准版本在锁外读取；发布时若已有其他版本（如全量重建）上线，就基于新版本重做
+    for _ in range(PUBLISH_ATTEMPTS):
+        try:
+            return _add_to_live_index(encoder, song_ids)
+        except index_module.StaleIndexError:
+            logger.info("Live index changed while adding %d songs; retrying", len(song_ids))
+    logger.warning("Gave up adding %d songs after %d attempts", len(song_ids), PUBLISH_ATTEMPTS)
+    return 0
+
+
+def _add_to_live_index(encoder, song_ids):
+    manifest = index_module.read_manifest()
+    version_dir = os.path.join(index_module.VERSIONS_DIR, manifest["version"])
+    known = np.load(os.path.join(version_dir, index_module.MAP_FILE))
+    wanted = np.setdiff1d(np.fromiter(song_ids, dtype=np.int64), known)
+    if not len(wanted):
+        return 0
+
+    songs = list(
+        Song.objects.filter(id__in=wanted.tolist()).values_list("id", "artist", "school")
+    )
+    if not songs:
+        return 0
+
+    # 读入可写副本（mmap 读出的索引不可追加）
+    index = faiss.read_index(os.path.join(version_dir, index_module.INDEX_FILE))
+    with open(os.path.join(version_dir, index_module.PARAMS_FILE)) as f:
+        params = json.load(f)
+
+    content = encoder.encode([(artist, school) for _, artist, school in songs])
+    cf_dim = index.d - encoder.dim
+    if cf_dim < 0:
+        logger.warning(
+            "Index dimension %d is smaller than content dimension %d; "
+            "run a full rebuild", index.d, encoder.dim,
+        )
+        return 0
+    cf = np.zeros((len(songs), cf_dim), dtype=np.float32)
+    hybrid = combine(cf, content, *load_weights())
+
+    ids = np.array([song_id for song_id, _, _ in songs], dtype=np.int64)
+    # normalize_L2 原地修改，先留一份未归一化的向量用于保存
+    stored = hybrid.copy()
+    faiss.normalize_L2(hybrid)
+    if params.get("id_map"):
+        index.add_with_ids(hybrid, ids)
+    else:
+        index.add(hybrid)  # 旧式索引：标签为位置，追加到 song_map 末尾
+    version = index_module.publish_index(
+        index, np.concatenate([known, ids]), params, base_version=manifest["version"]
+    )
+    # 发布成功后再记录向量，否则重试时这些歌曲会被当作“已向量化”而跳过
+    SongVector.objects.bulk_upsert(ids, content_vector=content, hybrid_vector=stored)
+
+    logger.info("Added %d songs to index, version %s", len(ids), version)
+    return len(ids)
+
+
+def _drain():
+    with _pending_lock:
+        song_ids = list(_pending)
+        _pending.clear()
+    if not song_ids:
+        return
+    try:
+        index_songs(song_ids)
+    except Exception:
+        logger.exception("Incremental indexing of %d songs failed", len(song_ids))
+    finally:
+        close_old_connections()
+
+
+def schedule(song_ids):
+    """
+    Queue *song_ids* for incremental indexing once the current transaction
+    commits. Calls that arrive while a batch is queued are merged into it.
+    """
+    song_ids = list(song_ids)
+
+    def enqueue():
+        # 提交后才加入队列：其他事务触发的 _drain 不会取走尚未提交的歌曲，
+        # 回滚时也不会残留
+        with _pending_lock:
+            _pending.update(song_ids)
+        # 多余的 _drain 会发现队列已空而直接返回
+        _executor.submit(_drain)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,390 @@
+# recommender/index.py
+
+"""
+FAISS index construction, publishing and serving.
+
+build_faiss_index publishes each index as an immutable version directory
+(index, song id map, build/search params) and then atomically replaces
+``index_manifest.json``, which names the live version and the sha256 of
+every file. Serving processes poll the manifest, load a new version next
+to the old one (memory-mapped, so N workers share the same pages) and swap
+a single reference; searches already running keep the handle they started
+with. search_excluding() is the shared query path that grows K until
+exclusions still leave enough results.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+INDEX_PATH = os.path.join(DATA_DIR, "song_hybrid.index")
+MAP_PATH = os.path.join(DATA_DIR, "song_id_map.npy")
+PARAMS_PATH = os.path.join(DATA_DIR, "song_hybrid.params.json")
+MANIFEST_PATH = os.path.join(DATA_DIR, "index_manifest.json")
+VERSIONS_DIR = os.path.join(DATA_DIR, "index_versions")
+
+INDEX_FILE = "song_hybrid.index"
+MAP_FILE = "song_id_map.npy"
+PARAMS_FILE = "params.json"
+KEEP_VERSIONS = 3
+LOCK_STALE_SECONDS = 300
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+logger = logging.getLogger(__name__)
+
+# 每个 K 步骤的统计 {K: [检索的查询行数, 在该步填满的行数]}，用于调优初始 K
+search_stats = defaultdict(lambda: [0, 0])
+
+
+def default_nlist(n):
+    # 经验值：nlist ≈ 4·√N，且每个簇至少约 39 个训练点
+    return max(1, min(int(4 * math.sqrt(n)), n // 39 or 1))
+
+
+def build_index(
+    vecs,
+    index_type="flat",
+    *,
+    nlist=None,
+    pq_m=8,
+    hnsw_m=32,
+    ef_construction=200,
+    train_vecs=None,
+    ids=None,
+):
+    """
+    Build an inner-product index over L2-normalised *vecs*.
+
+    *train_vecs* (defaults to *vecs*) is what IVF quantizers are trained on.
+    With *ids* the index is wrapped in an IndexIDMap2 so search labels are
+    song ids and new songs can later be added with add_with_ids.
+    Returns ``(index, build_params)``.
+    """
+    n, d = vecs.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+    params = {"index_type": index_type}
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(n)
+        params["nlist"] = nlist
+        if index_type == "ivf_flat":
+            index = faiss.index_factory(d, f"IVF{nlist},Flat", metric)
+        else:
+            if d % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide vector dimension {d}")
+            params["pq_m"] = pq_m
+            index = faiss.index_factory(d, f"IVF{nlist},PQ{pq_m}", metric)
+        index.train(vecs if train_vecs is None else train_vecs)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+        params.update(hnsw_m=hnsw_m, ef_construction=ef_construction)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if ids is None:
+        index.add(vecs)
+    else:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vecs, np.asarray(ids, dtype=np.int64))
+        params["id_map"] = True
+    return index, params
+
+
+def search_params(index_type, *, nprobe=None, ef_search=None):
+    """Query-time knobs for *index_type*, keyed by faiss ParameterSpace names."""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return {"nprobe": nprobe or 16}
+    if index_type == "hnsw":
+        return {"efSearch": ef_search or 64}
+    return {}
+
+
+def apply_search_params(index, params):
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+
+def load_params(path=PARAMS_PATH):
+    if not os.path.exists(path):
+        return {"index_type": "flat", "search": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+# ---------- 版本化发布 ----------
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_live_params():
+    """Build/search params of the published version, or None."""
+    manifest = read_manifest()
+    if manifest is None:
+        return None
+    with open(os.path.join(VERSIONS_DIR, manifest["version"], PARAMS_FILE)) as f:
+        return json.load(f)
+
+
+class StaleIndexError(RuntimeError):
+    """The live version changed since the caller read its base version."""
+
+
+@contextmanager
+def _publish_lock(timeout=60):
+    """Cross-process lock (O_EXCL lock file) serialising manifest swaps."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, ".publish.lock")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                    os.remove(path)  # 上一个持有者异常退出
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError("Timed out waiting for the index publish lock")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def publish_index(index, song_ids, params, base_version=None):
+    """
+    Write a new index version and make it live. Returns the version string.
+
+    Files go to a temporary directory that is renamed into place, then the
+    manifest is swapped with os.replace, so readers never see a partial
+    version. Publishes are serialised by a lock file; when *base_version*
+    is given (an index derived from that version) and another version went
+    live in the meantime, StaleIndexError is raised instead.
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version = time.strftime("%Y%m%d%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+    tmp_dir = os.path.join(VERSIONS_DIR, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+    np.save(os.path.join(tmp_dir, MAP_FILE), np.asarray(song_ids, dtype=np.int64))
+    with open(os.path.join(tmp_dir, PARAMS_FILE), "w") as f:
+        json.dump(params, f, indent=2)
+
+    files = {
+        name: _sha256(os.path.join(tmp_dir, name))
+        for name in (INDEX_FILE, MAP_FILE, PARAMS_FILE)
+    }
+    with _publish_lock():
+        manifest = read_manifest()
+        if base_version is not None and (manifest or {}).get("version") != base_version:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise StaleIndexError(f"Live index is no longer {base_version}")
+        os.rename(tmp_dir, os.path.join(VERSIONS_DIR, version))
+        _write_json_atomic(
+            MANIFEST_PATH,
+            {"version": version, "ntotal": int(index.ntotal), "files": files},
+        )
+        _prune_versions(keep=version)
+    return version
+
+
+def _prune_versions(keep):
+    # 保留最近几个版本；已 mmap 旧文件的进程不受删除影响
+    versions = sorted(
+        v for v in os.listdir(VERSIONS_DIR) if not v.startswith(".") and v != keep
+    )
+    for old in versions[: max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(os.path.join(VERSIONS_DIR, old), ignore_errors=True)
+
+
+# ---------- 加载与热切换 ----------
+class IndexHandle:
+    """
+    One loaded index version; immutable once built. ``song_map`` turns
+    search labels into song ids and is None when the labels already are
+    song ids (IndexIDMap2 indexes).
+    """
+
+    def __init__(self, version, index, song_map, params):
+        self.version = version
+        self.index = index
+        self.song_map = song_map
+        self.params = params
+
+
+def _read_index(path):
+    try:
+        # mmap：多个 gunicorn worker 共享同一份页缓存
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def load_version(manifest):
+    version_dir = os.path.join(VERSIONS_DIR, manifest["version"])
+    for name, digest in manifest["files"].items():
+        if _sha256(os.path.join(version_dir, name)) != digest:
+            raise ValueError(f"Checksum mismatch for {name} in {manifest['version']}")
+
+    with open(os.path.join(version_dir, PARAMS_FILE)) as f:
+        params = json.load(f)
+    index = _read_index(os.path.join(version_dir, INDEX_FILE))
+    apply_search_params(index, params.get("search", {}))
+    song_map = None
+    if not params.get("id_map"):
+        song_map = np.load(os.path.join(version_dir, MAP_FILE), mmap_mode="r")
+    return IndexHandle(manifest["version"], index, song_map, params)
+
+
+def _load_legacy():
+    # 尚未发布过版本时，退回到 data/ 下的旧版单文件索引
+    params = load_params()
+    index = _read_index(INDEX_PATH)
+    apply_search_params(index, params.get("search", {}))
+    return IndexHandle(None, index, np.load(MAP_PATH, mmap_mode="r"), params)
+
+
+_handle = None
+_manifest_mtime = None
+_next_check = 0.0
+_load_lock = threading.Lock()
+
+
+def get_index(check_interval=5.0):
+    """
+    Live IndexHandle for this process.
+
+    At most every *check_interval* seconds the manifest mtime is compared
+    with the one last loaded. A changed manifest is loaded by one thread
+    while the others keep serving the current handle.
+    """
+    global _handle, _manifest_mtime, _next_check
+
+    now = time.monotonic()
+    if _handle is not None and now < _next_check:
+        return _handle
+
+    if _handle is None:
+        _load_lock.acquire()
+    elif not _load_lock.acquire(blocking=False):
+        return _handle  # 另一个线程正在加载新版本
+    try:
+        _next_check = now + check_interval
+        try:
+            mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if _handle is None or mtime != _manifest_mtime:
+            manifest = read_manifest()
+            if manifest is None:
+                handle = _load_legacy() if _handle is None else _handle
+            elif _handle is not None and manifest["version"] == _handle.version:
+                handle = _handle
+            else:
+                try:
+                    handle = load_version(manifest)
+                except (OSError, ValueError, RuntimeError):
+                    if _handle is None:
+                        raise
+                    logger.exception("Failed to load index %s", manifest["version"])
+                    # 记下这个损坏的 manifest，直到它再次变化前不再重复校验
+                    _manifest_mtime = mtime
+                    return _handle
+                logger.info("Loaded index version %s", manifest["version"])
+            _handle, _manifest_mtime = handle, mtime
+        return _handle
+    finally:
+        _load_lock.release()
+
+
+def _to_song_ids(song_map, labels):
+    return (labels if song_map is None else song_map[labels]).tolist()
+
+
+def search_excluding(index, song_map, queries, excludes, n, k=20):
+    """
+    Top-*n* song ids per query row, skipping ``excludes[row]``.
+
+    Searches with *k* and doubles it only for rows that are still short
+    after exclusion. A row stops growing once it is full, once K covers
+    ``n + len(excludes[row])`` (enough for an exact index) or once K reaches
+    ``index.ntotal``. *song_map* maps labels to song ids (None when the
+    labels are song ids). Returns ``(ids, scores)`` lists, one per row.
+    """
+    ntotal = index.ntotal
+    ids = [[] for _ in range(len(queries))]
+    scores = [[] for _ in range(len(queries))]
+    pending = np.arange(len(queries))
+
+    while len(pending) and ntotal:
+        k_eff = min(k, ntotal)
+        D, I = index.search(queries[pending], k_eff)
+        still = []
+        for row, dist, labels in zip(pending, D, I):
+            valid = labels >= 0  # IVF/HNSW 候选不足时会返回 -1
+            exclude = excludes[row]
+            hits = [
+                (sid, score)
+                for sid, score in zip(_to_song_ids(song_map, labels[valid]), dist[valid].tolist())
+                if sid not in exclude
+            ][:n]
+            ids[row] = [sid for sid, _ in hits]
+            scores[row] = [score for _, score in hits]
+            if len(hits) < n and k_eff < ntotal and k_eff < n + len(exclude):
+                still.append(row)
+
+        stats = search_stats[k_eff]
+        stats[0] += len(pending)
+        stats[1] += len(pending) - len(still)
+        logger.debug(
+            "search k=%d: %d/%d rows filled", k_eff, len(pending) - len(still), len(pending)
+        )
+        pending = np.asarray(still, dtype=np.int64)
+        k *= 2
+
+    return ids, scores
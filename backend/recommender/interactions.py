@@ -0,0 +1,168 @@
+# recommender/interactions.py
+
+"""
+Users × songs like matrix shared by the CF trainers.
+
+Row / column mappings are append-only int64 arrays (position = matrix
+index), stored in ``user_song_map.npz`` together with a ``created_at``
+watermark. A delta refresh appends new users and songs, reads only the
+likes created since the watermark and the unlikes recorded in
+LikeDeletion since then, and patches the stored matrix, so existing
+indices stay stable between refreshes.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import scipy.sparse as sp
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from music.models import Song, SongLike
+
+from .content import DATA_DIR
+from .models import LikeDeletion
+
+MATRIX_PATH = os.path.join(DATA_DIR, "interaction_coo.npz")
+MAP_PATH = os.path.join(DATA_DIR, "user_song_map.npz")
+LEGACY_MAP_PATH = os.path.join(DATA_DIR, "user_song_map.json")
+
+# 事务提交时 created_at 可能早于提交时刻：每次多回看一段时间，重复的点赞是幂等的
+OVERLAP = timedelta(minutes=5)
+
+
+def _ids(queryset):
+    return np.fromiter(queryset.order_by("id").values_list("id", flat=True), dtype=np.int64)
+
+
+def _pairs(queryset):
+    return np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+
+
+def _keys(user_ids, song_ids, pairs):
+    """Flat ``row * n_songs + col`` keys of the pairs whose ids are mapped."""
+    # 映射是追加的，不一定有序，先按 id 排序后再 searchsorted
+    u_order, s_order = np.argsort(user_ids), np.argsort(song_ids)
+    rows = np.searchsorted(user_ids, pairs[:, 0], sorter=u_order).clip(max=len(user_ids) - 1)
+    cols = np.searchsorted(song_ids, pairs[:, 1], sorter=s_order).clip(max=len(song_ids) - 1)
+    rows, cols = u_order[rows], s_order[cols]
+    known = (user_ids[rows] == pairs[:, 0]) & (song_ids[cols] == pairs[:, 1])
+    return rows[known] * len(song_ids) + cols[known]
+
+
+def _to_matrix(keys, shape):
+    keys = np.unique(keys)
+    rows, cols = np.divmod(keys, shape[1])
+    return sp.coo_matrix((np.ones(len(keys), dtype=np.float32), (rows, cols)), shape=shape)
+
+
+def build_matrix(user_ids, song_ids, pairs):
+    """
+    Binary users × songs COO matrix of the ``(user_id, song_id)`` *pairs*;
+    row / column i is ``user_ids[i]`` / ``song_ids[i]``. Pairs whose ids
+    are not mapped are dropped.
+    """
+    if not len(user_ids) or not len(song_ids):
+        keys = np.empty(0, dtype=np.int64)
+    else:
+        keys = _keys(user_ids, song_ids, np.asarray(pairs, dtype=np.int64).reshape(-1, 2))
+    return _to_matrix(keys, (len(user_ids), len(song_ids)))
+
+
+def build_full():
+    """Rebuild mappings and matrix from every user, song and like."""
+    watermark = timezone.now()
+    User = get_user_model()
+    user_ids, song_ids = _ids(User.objects), _ids(Song.objects)
+    coo = build_matrix(
+        user_ids, song_ids, _pairs(SongLike.objects.values_list("user_id", "song_id"))
+    )
+    save(coo, user_ids, song_ids, watermark)
+    LikeDeletion.objects.filter(deleted_at__lt=watermark - OVERLAP).delete()
+    return coo, user_ids, song_ids, {"likes": coo.nnz, "unlikes": 0}
+
+
+def apply_delta():
+    """
+    Patch the stored matrix with changes since its watermark. Falls back to
+    build_full() when nothing has been built yet. Returns ``(coo, user_ids,
+    song_ids, stats)``.
+    """
+    stored = load()
+    if stored is None or stored[3] is None:
+        return build_full()
+    coo, user_ids, song_ids, watermark = stored
+
+    started = timezone.now()
+    since = watermark - OVERLAP
+    User = get_user_model()
+
+    # 1. 新用户 / 新歌曲追加到映射末尾（自增 id 只增不减）
+    new_users = _ids(User.objects.filter(id__gt=user_ids.max(initial=0)))
+    new_songs = _ids(Song.objects.filter(id__gt=song_ids.max(initial=0)))
+    n_songs_old = len(song_ids)
+    user_ids = np.concatenate([user_ids, new_users])
+    song_ids = np.concatenate([song_ids, new_songs])
+
+    # 2. 旧矩阵的键按新的列数重新编码
+    keys = coo.row.astype(np.int64) * len(song_ids) + coo.col
+
+    # 3. 先删后加：还存在的点赞一定创建于取消之后，会出现在本次增量里
+    likes = _pairs(
+        SongLike.objects.filter(created_at__gte=since).values_list("user_id", "song_id")
+    )
+    unlikes = _pairs(
+        LikeDeletion.objects.filter(deleted_at__gte=since).values_list("user_id", "song_id")
+    )
+    if len(user_ids) and len(song_ids):
+        keys = keys[~np.isin(keys, _keys(user_ids, song_ids, unlikes))]
+        keys = np.concatenate([keys, _keys(user_ids, song_ids, likes)])
+
+    coo = _to_matrix(keys, (len(user_ids), len(song_ids)))
+    save(coo, user_ids, song_ids, started)
+    LikeDeletion.objects.filter(deleted_at__lt=started - OVERLAP).delete()
+    stats = {
+        "likes": len(likes),
+        "unlikes": len(unlikes),
+        "new_users": len(new_users),
+        "new_songs": len(song_ids) - n_songs_old,
+    }
+    return coo, user_ids, song_ids, stats
+
+
+def save(coo, user_ids, song_ids, watermark):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    sp.save_npz(MATRIX_PATH, coo)
+    tmp = f"{MAP_PATH}.tmp.{os.getpid()}.npz"
+    np.savez(
+        tmp,
+        user_ids=np.asarray(user_ids, dtype=np.int64),
+        song_ids=np.asarray(song_ids, dtype=np.int64),
+        watermark=np.array(watermark.isoformat()),
+    )
+    os.replace(tmp, MAP_PATH)
+
+
+def load():
+    """
+    ``(coo, user_ids, song_ids, watermark)`` of the stored matrix, or None.
+    Mappings written by older versions (JSON) load with a None watermark.
+    """
+    if not os.path.exists(MATRIX_PATH):
+        return None
+    coo = sp.load_npz(MATRIX_PATH).tocoo()
+    if os.path.exists(MAP_PATH):
+        with np.load(MAP_PATH, allow_pickle=False) as f:
+            user_ids, song_ids = f["user_ids"], f["song_ids"]
+            watermark = datetime.fromisoformat(str(f["watermark"]))
+    elif os.path.exists(LEGACY_MAP_PATH):
+        with open(LEGACY_MAP_PATH) as f:
+            mapping = json.load(f)
+        user_ids = np.array(mapping["user_ids"], dtype=np.int64)
+        song_ids = np.array(mapping["song_ids"], dtype=np.int64)
+        watermark = None
+    else:
+        return None
+    return coo, user_ids, song_ids, watermark
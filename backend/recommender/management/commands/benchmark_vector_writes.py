@@ -0,0 +1,69 @@
+# recommender/management/commands/benchmark_vector_writes.py
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from music.models import Song
+from recommender.models import SongVector
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "对比逐行 update_or_create 与分批 bulk_upsert 写 SongVector 的吞吐量；"
+        "在事务中用临时歌曲测试，结束后全部回滚"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000, help="测试行数")
+        parser.add_argument("--dim", type=int, default=50, help="向量维度")
+        parser.add_argument(
+            "--batch-size", type=int, action="append", help="bulk_upsert 批大小，可重复指定"
+        )
+
+    def handle(self, *args, **opts):
+        n, dim = opts["rows"], opts["dim"]
+        batch_sizes = opts["batch_size"] or [500, 1000, 5000]
+        rng = np.random.default_rng(0)
+
+        try:
+            with transaction.atomic():
+                songs = Song.objects.bulk_create(
+                    Song(title=f"bench-{i}", artist="bench", school="bench")
+                    for i in range(n)
+                )
+                song_ids = [s.id for s in songs]
+                # 先插入空行，下面各轮测的都是更新已有行（定期重训时的情形）
+                SongVector.objects.bulk_create(SongVector(song_id=i) for i in song_ids)
+
+                def per_row():
+                    vecs = rng.standard_normal((n, dim), dtype=np.float32)
+                    for song_id, vec in zip(song_ids, vecs):
+                        SongVector.objects.update_or_create(
+                            song_id=song_id, defaults={"cf_vector": vec}
+                        )
+
+                self._run("update_or_create", per_row, n)
+                for size in batch_sizes:
+                    vecs = rng.standard_normal((n, dim), dtype=np.float32)
+                    self._run(
+                        f"bulk_upsert({size})",
+                        lambda: SongVector.objects.bulk_upsert(
+                            song_ids, batch_size=size, cf_vector=vecs
+                        ),
+                        n,
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, label, fn, n):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<22}{elapsed:>8.2f} s{n / elapsed:>12.0f} rows/s")
@@ -1,45 +1,158 @@
 # recommender/management/commands/build_faiss_index.py
 
 import os
+import time
 import numpy as np
 import faiss
 from django.core.management.base import BaseCommand
+from recommender.index import (
+    DATA_DIR,
+    INDEX_TYPES,
+    apply_search_params,
+    build_index,
+    publish_index,
+    search_params,
+)
 from recommender.models import SongVector
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "../../data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-INDEX_PATH = os.path.join(DATA_DIR, "song_hybrid.index")
-MAP_PATH = os.path.join(DATA_DIR, "song_id_map.npy")
+EVAL_K = 10
+
+
+def add_index_arguments(parser):
+    """Index options shared with rebuild_recommender."""
+    parser.add_argument(
+        "--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index type"
+    )
+    parser.add_argument(
+        "--nlist", type=int, help="IVF: number of clusters (default ≈ 4·√N)"
+    )
+    parser.add_argument(
+        "--nprobe", type=int, default=16, help="IVF: clusters probed per query"
+    )
+    parser.add_argument(
+        "--pq-m", type=int, default=8, help="IVF-PQ: sub-quantizers (must divide d)"
+    )
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW: graph degree M")
+    parser.add_argument(
+        "--ef-construction", type=int, default=200, help="HNSW: efConstruction"
+    )
+    parser.add_argument(
+        "--ef-search", type=int, default=64, help="HNSW: efSearch at query time"
+    )
+
+
+def index_options(opts):
+    """``(build_index kwargs, search params)`` from parsed index options."""
+    build_kwargs = {
+        "index_type": opts["index_type"],
+        "nlist": opts["nlist"],
+        "pq_m": opts["pq_m"],
+        "hnsw_m": opts["hnsw_m"],
+        "ef_construction": opts["ef_construction"],
+    }
+    search = search_params(
+        opts["index_type"], nprobe=opts["nprobe"], ef_search=opts["ef_search"]
+    )
+    return build_kwargs, search
 
 
 class Command(BaseCommand):
     help = "Build and save FAISS index for hybrid vectors"
 
+    def add_arguments(self, parser):
+        add_index_arguments(parser)
+        parser.add_argument(
+            "--eval-queries",
+            type=int,
+            default=0,
+            help="Hold out N vectors as queries and report recall/latency vs the flat index",
+        )
+
     def handle(self, *args, **opts):
         # 1. Collect all hybrid vectors
-        entries = SongVector.objects.exclude(hybrid_vector__isnull=True)
-        song_ids = []
-        vecs = []
-        for sv in entries:
-            song_ids.append(sv.song_id)
-            vecs.append(sv.hybrid_vector)
-
-        vecs = np.array(vecs, dtype=np.float32)
+        song_ids, vecs = SongVector.objects.as_matrix("hybrid_vector")
         # 2. Normalize for cosine
         faiss.normalize_L2(vecs)
 
-        # 3. Build Flat IP index
-        d = vecs.shape[1]
-        index = faiss.IndexFlatIP(d)
-        index.add(vecs)
+        build_kwargs, search = index_options(opts)
+        index_type = build_kwargs["index_type"]
+        rng = np.random.default_rng(42)
+        n_eval = min(opts["eval_queries"], len(vecs))
+        eval_rows = rng.choice(len(vecs), n_eval, replace=False) if n_eval else None
 
-        # 4. Persist
-        faiss.write_index(index, INDEX_PATH)
-        np.save(MAP_PATH, np.array(song_ids, dtype=np.int64))
+        # 3. Build index (held-out queries are excluded from quantizer training)
+        train_vecs = None
+        if eval_rows is not None:
+            train_vecs = np.delete(vecs, eval_rows, axis=0)
+        index, params = build_index(
+            vecs, train_vecs=train_vecs, ids=song_ids, **build_kwargs
+        )
+        params["search"] = search
+        apply_search_params(index, search)
 
+        # 4. Publish as a new version; serving workers pick it up on their own
+        version = publish_index(index, song_ids, params)
+
+        d = vecs.shape[1]
         self.stdout.write(
             self.style.SUCCESS(
-                f"Built FAISS index ({vecs.shape[0]}×{d}) at {INDEX_PATH}"
+                f"Built FAISS {index_type} index ({vecs.shape[0]}×{d}), version {version}"
             )
         )
+
+        if eval_rows is not None:
+            self._report(index, params, vecs, song_ids, eval_rows)
+
+    def _report(self, index, params, vecs, song_ids, eval_rows):
+        """Recall@K and per-query latency of *index* against exact search."""
+        queries, query_ids = vecs[eval_rows], song_ids[eval_rows]
+        flat = faiss.IndexFlatIP(vecs.shape[1])
+        flat.add(vecs)
+        flat_ms, truth = _timed_search(flat, queries)
+        truth = [song_ids[t] for t in truth]  # 与 ANN 索引的标签（歌曲 id）对齐
+        truth = _without_self(truth, query_ids)
+        self.stdout.write(f"flat: {flat_ms:.3f} ms/query (exact)")
+
+        # 在选定参数附近扫一遍，给出 recall-latency 曲线
+        if "nprobe" in params["search"]:
+            nlist = params["nlist"]
+            values = sorted({min(v, nlist) for v in (1, 2, 4, 8, 16, 32, 64, 128)}
+                            | {params["search"]["nprobe"]})
+            sweeps = [{"nprobe": v} for v in values]
+        elif "efSearch" in params["search"]:
+            values = sorted({16, 32, 64, 128, 256, params["search"]["efSearch"]})
+            sweeps = [{"efSearch": v} for v in values]
+        else:
+            sweeps = [{}]
+
+        for setting in sweeps:
+            apply_search_params(index, setting)
+            ms, found = _timed_search(index, queries)
+            found = _without_self(found, query_ids)
+            recall = np.mean(
+                [len(set(t) & set(f)) / EVAL_K for t, f in zip(truth, found)]
+            )
+            chosen = " (chosen)" if setting == params["search"] else ""
+            label = ", ".join(f"{k}={v}" for k, v in setting.items()) or params["index_type"]
+            self.stdout.write(
+                f"{label}: recall@{EVAL_K}={recall:.3f}  {ms:.3f} ms/query{chosen}"
+            )
+        apply_search_params(index, params["search"])
+
+
+def _without_self(results, query_ids):
+    """Drop each query's own id and keep the top EVAL_K of the rest."""
+    return [[i for i in ids if i != qid][:EVAL_K] for ids, qid in zip(results, query_ids)]
+
+
+def _timed_search(index, queries):
+    # 逐条查询以反映线上单请求延迟；多取一个，去掉查询自身后仍有 K 个
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        _, I = index.search(q[None, :], EVAL_K + 1)
+        found.append(I[0])
+    elapsed = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+    return elapsed, found
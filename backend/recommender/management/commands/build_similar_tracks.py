@@ -0,0 +1,88 @@
+# recommender/management/commands/build_similar_tracks.py
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand
+from recommender.index import get_index
+from recommender.models import SongVector
+from recommender.similar import SIMILAR_PATH, save_table
+
+
+class Command(BaseCommand):
+    help = "为每首歌预计算 top-K 相似歌曲（hybrid 向量 kNN 自连接），写入 similar_tracks.npy"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=20, help="每首歌保存的相似歌曲数")
+        parser.add_argument(
+            "--block-size", type=int, default=4096, help="每次 index.search 的查询行数"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=os.cpu_count() or 1, help="并行检索的线程数"
+        )
+        parser.add_argument(
+            "--index",
+            choices=("flat", "live"),
+            default="flat",
+            help="flat: 精确内积检索；live: 使用当前发布的 ANN 索引（大曲库更快）",
+        )
+
+    def handle(self, *args, **opts):
+        k = opts["k"]
+        song_ids, vecs = SongVector.objects.as_matrix("hybrid_vector")
+        if not len(song_ids):
+            self.stdout.write(self.style.WARNING("No hybrid vectors; nothing to do."))
+            return
+        faiss.normalize_L2(vecs)
+
+        if opts["index"] == "flat":
+            index = faiss.IndexFlatIP(vecs.shape[1])
+            index.add(vecs)
+            label_map = song_ids
+        else:
+            handle = get_index(check_interval=0)
+            index, label_map = handle.index, handle.song_map
+
+        neighbors = np.full((len(song_ids), k), -1, dtype=np.int64)
+        scores = np.zeros((len(song_ids), k), dtype=np.float32)
+
+        def search_block(start):
+            stop = min(start + opts["block_size"], len(vecs))
+            # 多取一个：结果里通常包含歌曲自身
+            D, I = index.search(vecs[start:stop], k + 1)
+            valid = I >= 0
+            labels = np.where(valid, I, 0)
+            found = labels if label_map is None else np.asarray(label_map)[labels]
+            found = np.where(valid, found, -1)
+            for row in range(stop - start):
+                keep = (found[row] != song_ids[start + row]) & (found[row] >= 0)
+                hits = found[row][keep][:k]
+                neighbors[start + row, : len(hits)] = hits
+                scores[start + row, : len(hits)] = D[row][keep][:k]
+            return stop - start
+
+        start_time = time.perf_counter()
+        threads = max(1, opts["threads"])
+        # 各线程内部不再开 OpenMP，避免线程数相乘
+        omp_threads = faiss.omp_get_max_threads()
+        faiss.omp_set_num_threads(1)
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                done = 0
+                for n in pool.map(search_block, range(0, len(vecs), opts["block_size"])):
+                    done += n
+                    self.stdout.write(f"  {done}/{len(vecs)} songs")
+        finally:
+            faiss.omp_set_num_threads(omp_threads)
+        elapsed = time.perf_counter() - start_time
+
+        save_table(song_ids, neighbors, scores)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved top-{k} neighbours for {len(song_ids)} songs to {SIMILAR_PATH} "
+                f"in {elapsed:.1f}s ({len(song_ids) / elapsed:.0f} songs/s)"
+            )
+        )
@@ -1,47 +1,89 @@
 # recommender/management/commands/generate_content_vectors.py
 
-import json
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from music.models import Song
+from recommender.content import ENCODINGS, make_encoder, save_encoder
 from recommender.models import SongVector
 
 
+def add_content_arguments(parser):
+    """Content encoder options shared with rebuild_recommender."""
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODINGS,
+        default="hashed",
+        help="hashed: 固定维度的哈希编码；onehot: 维度随 artist/school 数增长",
+    )
+    parser.add_argument(
+        "--artist-dim", type=int, default=64, help="hashed 编码中 artist 的桶数"
+    )
+    parser.add_argument(
+        "--school-dim", type=int, default=16, help="hashed 编码中 school 的桶数"
+    )
+
+
+def add_write_arguments(parser):
+    """SongVector write options shared by the vector-generating commands."""
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="每条 upsert 语句写入的行数"
+    )
+
+
+def write_progress(stdout, every=0.1):
+    """Progress callback for bulk_upsert that prints roughly every 10%."""
+    step = [0.0]
+
+    def report(written, total):
+        if written == total or written / total >= step[0] + every:
+            step[0] = written / total
+            stdout.write(f"  wrote {written}/{total} ({written / total:.0%})")
+
+    return report
+
+
+def encoder_from_options(options):
+    if options["encoding"] == "hashed":
+        return make_encoder(
+            "hashed",
+            artist_dim=options["artist_dim"],
+            school_dim=options["school_dim"],
+        )
+    return make_encoder("onehot")
+
+
 class Command(BaseCommand):
-    help = "为每首歌生成 One-Hot content_vector 并写入 song_vectors 表"
+    help = "为每首歌生成 content_vector（hashed / One-Hot）并写入 song_vectors 表"
+
+    def add_arguments(self, parser):
+        add_content_arguments(parser)
+        add_write_arguments(parser)
 
     def handle(self, *args, **options):
         # 1. 收集所有歌曲的 artist 和 school
-        songs = list(Song.objects.all().values("id", "artist", "school"))
-        artists = sorted({rec["artist"] for rec in songs})
-        schools = sorted({rec["school"] for rec in songs})
+        songs = list(Song.objects.values_list("id", "artist", "school"))
+        pairs = [(artist, school) for _, artist, school in songs]
 
-        # 2. 构建 One-Hot 索引
-        artist_idx = {a: i for i, a in enumerate(artists)}
-        school_idx = {s: i for i, s in enumerate(schools)}
-        vector_len = len(artists) + len(schools)
+        # 2. 构建编码器
+        encoder = encoder_from_options(options).fit(pairs)
 
-        # —— 下面这一行确保完整闭合 f-string ——
         self.stdout.write(
             self.style.NOTICE(
-                f"Found {len(artists)} artists, {len(schools)} schools, vector_len={vector_len}"
+                f"Encoding {len(songs)} songs with {encoder.encoding}, vector_len={encoder.dim}"
             )
         )
 
-        # 3. 用事务批量写入/更新 content_vector
-        with transaction.atomic():
-            for rec in songs:
-                song_id = rec["id"]
-                vector = [0] * vector_len
-                art, sch = rec["artist"], rec["school"]
-                if art in artist_idx:
-                    vector[artist_idx[art]] = 1
-                if sch in school_idx:
-                    vector[len(artists) + school_idx[sch]] = 1
-
-                SongVector.objects.update_or_create(
-                    song_id=song_id, defaults={"content_vector": vector}
-                )
+        vectors = encoder.encode(pairs)
+
+        # 3. 分批 upsert content_vector（每批一条语句）
+        SongVector.objects.bulk_upsert(
+            [song_id for song_id, _, _ in songs],
+            batch_size=options["batch_size"],
+            progress=write_progress(self.stdout),
+            content_vector=vectors,
+        )
+
+        # 4. 记录编码参数，供增量编码新歌曲时复用
+        save_encoder(encoder)
 
         self.stdout.write(
             self.style.SUCCESS("All content_vectors have been generated and saved.")
@@ -2,37 +2,93 @@
 
 import numpy as np
 from django.core.management.base import BaseCommand
+from recommender.hybrid import combine, save_weights
 from recommender.models import SongVector
-from django.db import transaction
+
+from .generate_content_vectors import add_write_arguments, write_progress
+
+
+def add_hybrid_arguments(parser):
+    """Hybrid weighting options shared with rebuild_recommender."""
+    parser.add_argument(
+        "--cf-weight", type=float, default=1.0, help="hybrid 中 cf_vector 的权重"
+    )
+    parser.add_argument(
+        "--content-weight",
+        type=float,
+        default=1.0,
+        help="hybrid 中 content_vector 的权重",
+    )
+
+
+def _dim(field):
+    # 取任意一个非空向量的维度；整列为空时为 0
+    vec = (
+        SongVector.objects.exclude(**{f"{field}__isnull": True})
+        .values_list(field, flat=True)
+        .first()
+    )
+    return 0 if vec is None else len(vec)
+
+
+def _stack(vectors, dim):
+    # 缺失的向量用零向量补齐，保证每块维度一致
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, vec in enumerate(vectors):
+        if vec is not None:
+            out[i] = vec
+    return out
 
 
 class Command(BaseCommand):
-    help = "Generate hybrid_vector = [cf_vector; content_vector] with null handling"
+    help = (
+        "Generate hybrid_vector = [cf_weight·cf_vector; content_weight·content_vector], "
+        "streaming SongVector rows in chunks"
+    )
+
+    def add_arguments(self, parser):
+        add_hybrid_arguments(parser)
+        add_write_arguments(parser)
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="每次从数据库读取的行数"
+        )
 
     def handle(self, *args, **opts):
-        updated = 0
-        with transaction.atomic():
-            for sv in SongVector.objects.all():
-                cf = sv.cf_vector or []
-                ct = sv.content_vector or []
-
-                # 当 cf 全为空时，hybrid=content
-                if not cf:
-                    hybrid = ct
-                # 当 content 全为空时，hybrid=cf
-                elif not ct:
-                    hybrid = cf
-                else:
-                    # cf 或 ct 都是 list of numbers
-                    cf_arr = np.array(cf, dtype=np.float32)
-                    ct_arr = np.array(ct, dtype=np.float32)
-                    hybrid_arr = np.concatenate([cf_arr, ct_arr])
-                    hybrid = hybrid_arr.tolist()
-
-                SongVector.objects.filter(
-                    song=sv.song).update(hybrid_vector=hybrid)
-                updated += 1
+        cf_weight, content_weight = opts["cf_weight"], opts["content_weight"]
+        cf_dim, ct_dim = _dim("cf_vector"), _dim("content_vector")
+        total = SongVector.objects.count()
+        progress = write_progress(self.stdout)
+
+        # 按主键分块（keyset）读取：无论库多大，内存中只有一块数据。
+        # MySQL 驱动不支持流式游标，.iterator() 仍会把整个结果集读入内存。
+        rows = SongVector.objects.order_by("song_id").values_list(
+            "song_id", "cf_vector", "content_vector"
+        )
+        last_id, seen, updated = 0, 0, 0
+        while True:
+            chunk = list(rows.filter(song_id__gt=last_id)[: opts["chunk_size"]])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            seen += len(chunk)
+
+            # cf 与 content 都为空的行没有可用信息，保持原样
+            chunk = [r for r in chunk if r[1] is not None or r[2] is not None]
+            if chunk:
+                song_ids, cfs, cts = zip(*chunk)
+                hybrid = combine(
+                    _stack(cfs, cf_dim), _stack(cts, ct_dim), cf_weight, content_weight
+                )
+                updated += SongVector.objects.bulk_upsert(
+                    song_ids, batch_size=opts["batch_size"], hybrid_vector=hybrid
+                )
+            progress(seen, total)
+
+        # 增量索引新歌时按相同权重缩放 content 部分
+        save_weights(cf_weight, content_weight)
 
         self.stdout.write(
-            self.style.SUCCESS(f"Updated hybrid_vector for {updated} songs.")
+            self.style.SUCCESS(
+                f"Updated hybrid_vector for {updated} songs (dim {cf_dim + ct_dim})."
+            )
         )
@@ -0,0 +1,139 @@
+# recommender/management/commands/rebuild_recommender.py
+
+import faiss
+import scipy.sparse as sp
+from django.core.management.base import BaseCommand
+from recommender import interactions, pipeline
+from recommender.content import save_encoder
+from recommender.hybrid import combine, save_weights
+from recommender.index import apply_search_params, build_index, publish_index, read_manifest
+from recommender.models import SongVector
+from recommender.trainers import make_trainer, save_user_factors
+
+from .build_faiss_index import add_index_arguments, index_options
+from .generate_content_vectors import (
+    add_content_arguments,
+    add_write_arguments,
+    encoder_from_options,
+    write_progress,
+)
+from .generate_hybrid_vectors import add_hybrid_arguments
+from .train_cf_model import add_cf_arguments, cf_params
+
+
+class Command(BaseCommand):
+    help = (
+        "交互矩阵 → CF → content → hybrid → FAISS 一条龙重建；"
+        "输入未变化的阶段直接复用上次结果，并输出各阶段耗时"
+    )
+
+    def add_arguments(self, parser):
+        add_cf_arguments(parser)
+        add_content_arguments(parser)
+        add_hybrid_arguments(parser)
+        add_index_arguments(parser)
+        add_write_arguments(parser)
+        parser.add_argument(
+            "--force", action="store_true", help="忽略阶段缓存，全部重新计算"
+        )
+
+    def handle(self, *args, **opts):
+        run = pipeline.Pipeline(force=opts["force"])
+
+        # 1. 一次性读入原始数据，并据此计算各阶段的输入哈希
+        song_ids, artists, schools = run.timed("load_songs", pipeline.load_songs)
+        user_ids, likes = run.timed("load_likes", pipeline.load_likes)
+        if not len(song_ids):
+            self.stdout.write(self.style.WARNING("No songs; nothing to rebuild."))
+            return
+
+        encoder = encoder_from_options(opts).fit(list(zip(artists, schools)))
+        songs_key = pipeline.digest(song_ids, artists, schools)
+        matrix_key = pipeline.digest(song_ids, user_ids, likes)
+        algo, trainer_params = cf_params(opts)
+        cf_key = pipeline.digest(matrix_key, algo, trainer_params)
+        content_key = pipeline.digest(songs_key, encoder.config())
+        weights = (opts["cf_weight"], opts["content_weight"])
+        hybrid_key = pipeline.digest(cf_key, content_key, weights)
+        build_kwargs, search = index_options(opts)
+        index_key = pipeline.digest(hybrid_key, build_kwargs, search)
+
+        # 2. 交互矩阵（users × songs，均按 id 排序）
+        def build_interactions():
+            # 与 build_interaction_matrix 共用同一个构建函数
+            csr = interactions.build_matrix(user_ids, song_ids, likes).tocsr()
+            return {"data": csr.data, "indices": csr.indices, "indptr": csr.indptr}
+
+        m = run.stage("interactions", matrix_key, build_interactions)
+        csr = sp.csr_matrix(
+            (m["data"], m["indices"], m["indptr"]), shape=(len(user_ids), len(song_ids))
+        )
+
+        # 3. CF / content / hybrid，全程在内存中以 numpy 数组传递
+        def train():
+            users, items = make_trainer(algo, **trainer_params).fit(csr)
+            return {"cf": items, "users": users}
+
+        factors = run.stage("cf", cf_key, train)
+        cf = factors["cf"]
+        content = run.stage(
+            "content",
+            content_key,
+            lambda: {"content": encoder.encode(list(zip(artists, schools)))},
+        )["content"]
+        hybrid = run.stage(
+            "hybrid", hybrid_key, lambda: {"hybrid": combine(cf, content, *weights)}
+        )["hybrid"]
+
+        # 4. 只写一次数据库：三个向量列一起批量 upsert
+        if run.is_fresh("write", hybrid_key):
+            run.timings.append(("write_vectors", 0.0, True))
+        else:
+            written = run.timed(
+                "write_vectors",
+                lambda: SongVector.objects.bulk_upsert(
+                    song_ids,
+                    batch_size=opts["batch_size"],
+                    progress=write_progress(self.stdout),
+                    cf_vector=cf,
+                    content_vector=content,
+                    hybrid_vector=hybrid,
+                ),
+            )
+            run.mark("write", hybrid_key, rows=written)
+        save_encoder(encoder)
+        save_user_factors(user_ids, factors["users"], algo)
+        save_weights(*weights)
+
+        # 5. FAISS 索引：参数与向量都没变且线上版本仍是上次发布的那个时跳过
+        manifest = read_manifest()
+        published = run.state.get("index", {}).get("version")
+        if run.is_fresh("index", index_key) and manifest and manifest["version"] == published:
+            run.timings.append(("index", 0.0, True))
+            version = published
+        else:
+
+            def build():
+                vecs = hybrid.copy()
+                faiss.normalize_L2(vecs)
+                index, params = build_index(vecs, ids=song_ids, **build_kwargs)
+                params["search"] = search
+                apply_search_params(index, search)
+                return publish_index(index, song_ids, params)
+
+            version = run.timed("index", build)
+            run.mark("index", index_key, version=version)
+
+        # 6. 各阶段耗时
+        total = 0.0
+        for name, seconds, cached in run.timings:
+            total += seconds
+            note = " (cached)" if cached else ""
+            self.stdout.write(f"{name:<16}{seconds * 1000:>10.1f} ms{note}")
+        self.stdout.write(f"{'total':<16}{total * 1000:>10.1f} ms")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt recommender for {len(song_ids)} songs "
+                f"(hybrid dim {hybrid.shape[1]}), index version {version}"
+            )
+        )
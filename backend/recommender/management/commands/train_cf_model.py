@@ -1,47 +1,97 @@
 # recommender/management/commands/train_cf_model.py
 
 import os
-import json
-import scipy.sparse as sp
-from django.core.management.base import BaseCommand
-from sklearn.decomposition import TruncatedSVD
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from music.models import Song
+from recommender import interactions
 from recommender.models import SongVector
-from django.db import transaction
+from recommender.trainers import ALGORITHMS, make_trainer, save_user_factors
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "../../data")
+from .generate_content_vectors import add_write_arguments, write_progress
+
+
+def add_cf_arguments(parser):
+    """CF trainer options shared with rebuild_recommender."""
+    parser.add_argument(
+        "--factors", type=int, default=50, help="Number of latent factors K"
+    )
+    parser.add_argument(
+        "--algo",
+        choices=ALGORITHMS,
+        default="svd",
+        help="svd: TruncatedSVD；als: 隐式反馈 ALS（共轭梯度）；bpr: BPR 排序学习",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=os.cpu_count() or 1, help="als / bpr 的线程数"
+    )
+    parser.add_argument(
+        "--iterations", type=int, help="迭代轮数（svd 默认 10，als 15，bpr 100）"
+    )
+    parser.add_argument(
+        "--regularization", type=float, default=0.01, help="als / bpr: L2 正则系数"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=40.0, help="als: 置信度 c = 1 + alpha·r"
+    )
+    parser.add_argument(
+        "--learning-rate", type=float, default=0.05, help="bpr: SGD 学习率"
+    )
+
+
+def cf_params(opts):
+    """``(algo, trainer params)`` from parsed CF options."""
+    params = {
+        "factors": opts["factors"],
+        "threads": opts["threads"],
+        "regularization": opts["regularization"],
+        "alpha": opts["alpha"],
+        "learning_rate": opts["learning_rate"],
+    }
+    if opts["iterations"] is not None:
+        params["iterations"] = opts["iterations"]
+    return opts["algo"], params
 
 
 class Command(BaseCommand):
-    help = "Train CF model (SVD) and write cf_vector into SongVector"
+    help = "Train CF model (SVD / ALS / BPR) and write cf_vector into SongVector"
 
     def add_arguments(self, parser):
-        parser.add_argument(
-            "--factors", type=int, default=50, help="Number of latent factors K"
-        )
+        add_cf_arguments(parser)
+        add_write_arguments(parser)
 
     def handle(self, *args, **opts):
-        K = opts["factors"]
-        # 1. Load COO
-        coo = sp.load_npz(os.path.join(DATA_DIR, "interaction_coo.npz"))
+        algo, params = cf_params(opts)
+        # 1. Load the matrix built by build_interaction_matrix
+        stored = interactions.load()
+        if stored is None:
+            raise CommandError("Run build_interaction_matrix first.")
+        coo, user_ids, song_ids, _ = stored
         csr = coo.tocsr()
 
-        # 2. SVD: items × users => transpose then n_components=K
-        svd = TruncatedSVD(n_components=K, n_iter=10, random_state=42)
-        item_factors = svd.fit_transform(csr.T)  # shape = (n_songs, K)
+        # 2. Factorise the users × songs matrix
+        start = time.perf_counter()
+        user_factors, item_factors = make_trainer(algo, **params).fit(csr)
+        elapsed = time.perf_counter() - start
 
-        # 3. Load song_ids mapping
-        with open(os.path.join(DATA_DIR, "user_song_map.json")) as f:
-            mapping = json.load(f)
-        song_ids = mapping["song_ids"]
+        # 3. 映射只追加，已删除的歌曲仍占一列，写回时跳过
+        alive = np.isin(song_ids, list(Song.objects.values_list("id", flat=True)))
+        song_ids, item_factors = song_ids[alive], item_factors[alive]
 
-        # 4. Write cf_vector back
-        with transaction.atomic():
-            for idx, song_id in enumerate(song_ids):
-                vec = item_factors[idx].tolist()
-                SongVector.objects.update_or_create(
-                    song_id=song_id, defaults={"cf_vector": vec}
-                )
+        # 4. Write cf_vector back in batches; user factors go next to the data
+        SongVector.objects.bulk_upsert(
+            song_ids,
+            batch_size=opts["batch_size"],
+            progress=write_progress(self.stdout),
+            cf_vector=item_factors,
+        )
+        save_user_factors(user_ids, user_factors, algo)
 
         self.stdout.write(
-            self.style.SUCCESS(f"Trained SVD(K={K}) and wrote cf_vector for {len(song_ids)} songs.")
+            self.style.SUCCESS(
+                f"Trained {algo}(K={opts['factors']}) in {elapsed:.1f}s and wrote "
+                f"cf_vector for {len(song_ids)} songs, user factors for "
+                f"{len(user_factors)} users."
+            )
         )
@@ -0,0 +1,68 @@
+# recommender/management/commands/update_faiss_index.py
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from music.models import Song
+from recommender.content import load_encoder
+from recommender.hybrid import load_weights
+from recommender.incremental import index_songs
+from recommender.index import read_live_params
+
+
+class Command(BaseCommand):
+    help = (
+        "Add songs that have no hybrid_vector to the live FAISS index; "
+        "with --compact, rebuild every vector and the index from scratch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Run the full content → interaction → CF → hybrid → index rebuild",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["compact"]:
+            self._compact()
+            return
+
+        missing = list(
+            Song.objects.filter(songvector__hybrid_vector__isnull=True).values_list(
+                "id", flat=True
+            )
+        )
+        added = index_songs(missing) if missing else 0
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(missing)} songs without vectors, {added} added to index.")
+        )
+
+    def _compact(self):
+        # 沿用当前的内容编码与索引参数，重建后增量追加的歌曲也获得 CF 向量
+        encoder = load_encoder()
+        content_opts = encoder.config() if encoder else {}
+        if content_opts.get("encoding") == "onehot":
+            content_opts = {"encoding": "onehot"}
+
+        params = read_live_params()
+        index_opts = {}
+        if params:
+            index_opts["index_type"] = params["index_type"]
+            # nlist 不沿用，按重建后的歌曲数重新估算
+            for key in ("pq_m", "hnsw_m", "ef_construction"):
+                if key in params:
+                    index_opts[key] = params[key]
+            search = params.get("search", {})
+            if "nprobe" in search:
+                index_opts["nprobe"] = search["nprobe"]
+            if "efSearch" in search:
+                index_opts["ef_search"] = search["efSearch"]
+
+        call_command("generate_content_vectors", **content_opts)
+        call_command("build_interaction_matrix")
+        call_command("train_cf_model")
+        cf_weight, content_weight = load_weights()
+        call_command(
+            "generate_hybrid_vectors", cf_weight=cf_weight, content_weight=content_weight
+        )
+        call_command("build_faiss_index", **index_opts)
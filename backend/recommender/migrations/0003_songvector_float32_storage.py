@@ -0,0 +1,64 @@
+from django.db import migrations
+
+import recommender.fields
+
+VECTOR_FIELDS = ("cf_vector", "content_vector", "hybrid_vector")
+BATCH_SIZE = 500
+
+
+def _copy(apps, src_suffix, dst_suffix, convert):
+    SongVector = apps.get_model("recommender", "SongVector")
+    src = [f + src_suffix for f in VECTOR_FIELDS]
+    dst = [f + dst_suffix for f in VECTOR_FIELDS]
+
+    batch = []
+    for sv in SongVector.objects.only("song_id", *src).iterator(chunk_size=BATCH_SIZE):
+        for s, d in zip(src, dst):
+            value = getattr(sv, s)
+            setattr(sv, d, None if value is None else convert(value))
+        batch.append(sv)
+        if len(batch) >= BATCH_SIZE:
+            SongVector.objects.bulk_update(batch, dst)
+            batch = []
+    if batch:
+        SongVector.objects.bulk_update(batch, dst)
+
+
+def json_to_float32(apps, schema_editor):
+    _copy(apps, "_json", "", list)
+
+
+def float32_to_json(apps, schema_editor):
+    _copy(apps, "", "_json", lambda v: v.tolist())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recommender", "0002_alter_songvector_cf_vector_and_more"),
+    ]
+
+    operations = [
+        migrations.RenameField("songvector", "cf_vector", "cf_vector_json"),
+        migrations.RenameField("songvector", "content_vector", "content_vector_json"),
+        migrations.RenameField("songvector", "hybrid_vector", "hybrid_vector_json"),
+        migrations.AddField(
+            model_name="songvector",
+            name="cf_vector",
+            field=recommender.fields.Float32VectorField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="songvector",
+            name="content_vector",
+            field=recommender.fields.Float32VectorField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="songvector",
+            name="hybrid_vector",
+            field=recommender.fields.Float32VectorField(blank=True, null=True),
+        ),
+        migrations.RunPython(json_to_float32, float32_to_json),
+        migrations.RemoveField("songvector", "cf_vector_json"),
+        migrations.RemoveField("songvector", "content_vector_json"),
+        migrations.RemoveField("songvector", "hybrid_vector_json"),
+    ]
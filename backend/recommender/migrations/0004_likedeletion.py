@@ -0,0 +1,25 @@
+# Generated by Django 6.1.2 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0003_songvector_float32_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('song_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'song_like_deletions',
+            },
+        ),
+    ]
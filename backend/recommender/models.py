@@ -1,16 +1,90 @@
 # recommender/models.py
 
-from django.db import models
+import numpy as np
+from django.db import connection, models
 from music.models import Song
 
+from .fields import Float32VectorField
+
+
+class SongVectorQuerySet(models.QuerySet):
+    def as_matrix(self, field="hybrid_vector"):
+        """
+        Stack *field* of every row into one float32 matrix.
+
+        Returns ``(song_ids, matrix)``: an int64 id array and an ``(n, d)``
+        array aligned with it. Rows whose vector is NULL are skipped.
+        """
+        rows = self.exclude(**{f"{field}__isnull": True}).values_list("song_id", field)
+        song_ids, vecs = [], []
+        for song_id, vec in rows.iterator(chunk_size=2000):
+            song_ids.append(song_id)
+            vecs.append(vec)
+
+        if not vecs:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return np.array(song_ids, dtype=np.int64), np.vstack(vecs)
+
+    def bulk_upsert(self, song_ids, batch_size=1000, progress=None, **columns):
+        """
+        Insert or update SongVector rows for *song_ids*, *batch_size* rows
+        per statement (INSERT … ON CONFLICT / ON DUPLICATE KEY UPDATE).
+
+        *columns* maps a vector field to an ``(n, d)`` array aligned with
+        *song_ids*; other columns of existing rows are left untouched. Each
+        batch commits on its own, so no transaction spans the whole catalog
+        and a rerun after a failure simply overwrites what was written.
+        *progress*, if given, is called with ``(written, total)`` after each
+        batch. Returns the number of rows written.
+        """
+        fields = list(columns)
+        upsert = {"update_conflicts": True, "update_fields": fields + ["updated_at"]}
+        if connection.features.supports_update_conflicts_with_target:
+            upsert["unique_fields"] = ["song"]  # MySQL 不支持指定冲突列
+
+        total = len(song_ids)
+        for start in range(0, total, batch_size):
+            batch = [
+                self.model(song_id=int(song_id), **{f: columns[f][start + i] for f in fields})
+                for i, song_id in enumerate(song_ids[start : start + batch_size])
+            ]
+            self.bulk_create(batch, **upsert)
+            if progress is not None:
+                progress(start + len(batch), total)
+        return total
+
 
 class SongVector(models.Model):
     song = models.OneToOneField(Song, on_delete=models.CASCADE, primary_key=True)
-    cf_vector = models.JSONField(blank=True, null=True)
-    content_vector = models.JSONField(blank=True, null=True)
-    hybrid_vector = models.JSONField(blank=True, null=True)
+    cf_vector = Float32VectorField(blank=True, null=True)
+    content_vector = Float32VectorField(blank=True, null=True)
+    hybrid_vector = Float32VectorField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SongVectorQuerySet.as_manager()
+
     class Meta:
         db_table = "song_vectors"
+
+    def as_numpy(self, field="hybrid_vector"):
+        """Return *field* as a float32 ndarray, or None when it is unset."""
+        value = getattr(self, field)
+        if value is None:
+            return None
+        return np.asarray(value, dtype=np.float32)
+
+
+class LikeDeletion(models.Model):
+    """
+    Tombstone for a removed SongLike, so the delta interaction-matrix build
+    can drop it without rescanning song_likes. Rows older than the build
+    watermark are pruned by the build itself.
+    """
+
+    user_id = models.BigIntegerField()
+    song_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "song_like_deletions"
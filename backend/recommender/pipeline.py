@@ -0,0 +1,113 @@
+# recommender/pipeline.py
+
+"""
+In-memory recommender pipeline used by ``rebuild_recommender``.
+
+Each stage is a plain function over numpy arrays. The Pipeline runner keys
+every stage by a hash of its inputs (raw DB data for the first stages, the
+upstream keys plus parameters for the derived ones), caches stage outputs
+as ``.npz`` files under ``data/pipeline/`` and skips a stage whose key has
+not changed since the last run.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+
+from music.models import Song, SongLike
+
+from .index import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, "pipeline")
+
+
+def digest(*parts):
+    """Stable hash of numpy arrays, strings and JSON-able params."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str((part.dtype.str, part.shape)).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, str):
+            h.update(part.encode("utf-8"))
+        else:
+            h.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# ---------- 各阶段 ----------
+def load_songs():
+    """``(song_ids, artists, schools)`` ordered by id."""
+    rows = list(Song.objects.order_by("id").values_list("id", "artist", "school"))
+    song_ids = np.array([r[0] for r in rows], dtype=np.int64)
+    return song_ids, [r[1] for r in rows], [r[2] for r in rows]
+
+
+def load_likes():
+    """``(user_ids, likes)``; *likes* is an ``(n, 2)`` array of (user_id, song_id)."""
+    User = get_user_model()
+    user_ids = np.fromiter(
+        User.objects.order_by("id").values_list("id", flat=True), dtype=np.int64
+    )
+    likes = np.array(
+        SongLike.objects.order_by("user_id", "song_id").values_list("user_id", "song_id"),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return user_ids, likes
+
+
+# ---------- 带缓存的执行器 ----------
+class Pipeline:
+    def __init__(self, force=False, cache_dir=CACHE_DIR):
+        self.force = force
+        self.cache_dir = cache_dir
+        self.state_path = os.path.join(cache_dir, "state.json")
+        self.timings = []  # [(stage, seconds, cached)]
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {}
+
+    def is_fresh(self, name, key):
+        return not self.force and self.state.get(name, {}).get("key") == key
+
+    def mark(self, name, key, **extra):
+        self.state[name] = {"key": key, **extra}
+        with open(self.state_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+
+    def timed(self, name, fn, cached=False):
+        start = time.perf_counter()
+        result = fn()
+        self.timings.append((name, time.perf_counter() - start, cached))
+        return result
+
+    def stage(self, name, key, compute):
+        """
+        Return the arrays computed by *compute* (a dict of ndarrays), or the
+        cached ones when *key* matches the last run.
+        """
+        path = os.path.join(self.cache_dir, f"{name}.npz")
+        if self.is_fresh(name, key) and os.path.exists(path):
+
+            def load():
+                with np.load(path, allow_pickle=False) as f:
+                    return {k: f[k] for k in f.files}
+
+            return self.timed(name, load, cached=True)
+
+        def run():
+            result = compute()
+            np.savez(path, **result)
+            return result
+
+        result = self.timed(name, run)
+        self.mark(name, key)
+        return result
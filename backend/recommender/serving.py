@@ -0,0 +1,183 @@
+# recommender/serving.py
+
+"""
+Query-side helpers shared by the recommendation views: building query
+vectors (playlist / liked-song centroids, user latent factors), serialising
+ranked results from the song catalog, and the per-user "for you" cache.
+"""
+
+import os
+import threading
+import time
+
+import faiss
+import numpy as np
+from django.core.cache import cache
+
+from music.models import Song
+from music.serializers import SongSerializer
+
+from .catalog import get_catalog
+from .content import load_encoder
+from .models import SongVector
+from .trainers import USER_FACTORS_PATH, load_user_factors
+
+FOR_YOU_KEY = "recommender:for_you:{}"
+
+
+def centroid_queries(members):
+    """
+    *members* maps a key (playlist id, user id, …) → list of song ids.
+
+    Returns ``(keys, queries)``: row i of the float32 *queries* matrix is the
+    normalised centroid of the hybrid vectors of ``members[keys[i]]``. Keys
+    none of whose songs have a hybrid vector are left out.
+    """
+    all_ids = {sid for ids in members.values() for sid in ids}
+    vec_ids, arr = SongVector.objects.filter(song_id__in=all_ids).as_matrix(
+        "hybrid_vector"
+    )
+    if not len(arr):
+        return [], arr
+
+    faiss.normalize_L2(arr)
+    order = np.argsort(vec_ids)
+    vec_ids, arr = vec_ids[order], arr[order]
+
+    # 把每组歌曲映射到 arr 的行号
+    keys, rows, cols = [], [], []
+    for key, ids in members.items():
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(vec_ids, ids).clip(max=len(vec_ids) - 1)
+        pos = pos[vec_ids[pos] == ids]
+        if not len(pos):
+            continue
+        rows.append(np.full(len(pos), len(keys)))
+        cols.append(pos)
+        keys.append(key)
+    if not keys:
+        return [], arr[:0]
+
+    # 一次 numpy 累加得到所有组的向量和；归一化后等价于均值方向
+    queries = np.zeros((len(keys), arr.shape[1]), dtype=np.float32)
+    cols = np.concatenate(cols)
+    np.add.at(queries, np.concatenate(rows), arr[cols])
+    faiss.normalize_L2(queries)
+    return keys, queries
+
+
+def serialize_ranked(recs):
+    """
+    *recs* maps a key → ``(song ids, scores)``. Serialise each list from the
+    in-process catalog, keeping the ranking order and attaching each song's
+    similarity score. The DB is only consulted for ids the catalog has not
+    seen yet.
+    """
+    catalog = get_catalog()
+    wanted = {sid for ids, _ in recs.values() for sid in ids}
+    found, missing = catalog.lookup(wanted)
+    songs = {row["id"]: row for row in found}
+    if missing:
+        for song in Song.objects.filter(id__in=missing):
+            songs[song.id] = SongSerializer(song).data
+
+    return {
+        key: [
+            {**songs[sid], "score": round(score, 6)}
+            for sid, score in zip(ids, scores)
+            if sid in songs
+        ]
+        for key, (ids, scores) in recs.items()
+    }
+
+
+# ---------- 用户隐因子 ----------
+class _UserFactors:
+    """user_factors.npz held in memory, reloaded when the file changes."""
+
+    def __init__(self):
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.factors = np.empty((0, 0), dtype=np.float32)
+        self.content_dim = None  # hybrid 向量中 content 部分的维度
+        self.mtime = None
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, check_interval):
+        now = time.monotonic()
+        if now < self.next_check or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_check = now + check_interval
+            try:
+                mtime = os.stat(USER_FACTORS_PATH).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self.mtime:
+                return
+            loaded = load_user_factors() if mtime else None
+            if loaded is None:
+                user_ids, factors = np.empty(0, dtype=np.int64), np.empty((0, 0), np.float32)
+            else:
+                order = np.argsort(loaded[0])
+                user_ids, factors = loaded[0][order], loaded[1][order]
+            encoder = load_encoder()
+            self.user_ids, self.factors = user_ids, factors
+            self.content_dim = None if encoder is None else encoder.dim
+            self.mtime = mtime
+        finally:
+            self.lock.release()
+
+    def get(self, user_id):
+        user_ids = self.user_ids
+        i = int(np.searchsorted(user_ids, user_id))
+        if i < len(user_ids) and user_ids[i] == user_id:
+            return self.factors[i]
+        return None
+
+
+_user_factors = _UserFactors()
+
+
+def user_query(user_id, liked_ids, dim, check_interval=5.0):
+    """
+    ``(1, dim)`` normalised query vector for *user_id*, or None.
+
+    The user's latent factor is placed in the CF block of the hybrid space
+    (content block zero), so inner products rank songs by ``u · cf_vector``.
+    Users without a usable factor (not trained yet, no likes at training
+    time, or a factor that does not match the index layout) fall back to the
+    centroid of their liked songs' hybrid vectors.
+    """
+    _user_factors.refresh(check_interval)
+    factor = _user_factors.get(user_id)
+    content_dim = _user_factors.content_dim
+    if factor is not None and factor.any() and content_dim is not None:
+        if len(factor) + content_dim == dim:
+            query = np.zeros((1, dim), dtype=np.float32)
+            query[0, : len(factor)] = factor
+            faiss.normalize_L2(query)
+            return query
+
+    if liked_ids:
+        _, queries = centroid_queries({user_id: liked_ids})
+        if len(queries) and queries.shape[1] == dim:
+            return queries
+    return None
+
+
+# ---------- “为你推荐”结果缓存 ----------
+def cached_for_you(user_id, version):
+    """Cached result list for *user_id* computed against index *version*."""
+    entry = cache.get(FOR_YOU_KEY.format(user_id))
+    if entry is not None and entry["version"] == version:
+        return entry["data"]
+    return None
+
+
+def cache_for_you(user_id, version, data, timeout):
+    cache.set(FOR_YOU_KEY.format(user_id), {"version": version, "data": data}, timeout)
+
+
+def invalidate_for_you(user_id):
+    cache.delete(FOR_YOU_KEY.format(user_id))
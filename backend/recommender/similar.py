@@ -0,0 +1,89 @@
+# recommender/similar.py
+
+"""
+Precomputed "similar tracks" table.
+
+build_similar_tracks stores the top-K neighbours of every song in one
+structured ``.npy`` file (rows sorted by song id, neighbour ids padded with
+-1). Serving memory-maps it and answers each request with one binary search;
+the file is replaced atomically and re-opened when its mtime changes.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from .content import DATA_DIR
+
+SIMILAR_PATH = os.path.join(DATA_DIR, "similar_tracks.npy")
+
+
+def table_dtype(k):
+    return np.dtype([("song_id", "<i8"), ("neighbors", "<i8", (k,)), ("scores", "<f4", (k,))])
+
+
+def save_table(song_ids, neighbors, scores, path=None):
+    order = np.argsort(song_ids)
+    table = np.empty(len(song_ids), dtype=table_dtype(neighbors.shape[1]))
+    table["song_id"] = np.asarray(song_ids)[order]
+    table["neighbors"] = neighbors[order]
+    table["scores"] = scores[order]
+
+    path = path or SIMILAR_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}.npy"
+    np.save(tmp, table)
+    os.replace(tmp, path)
+    return table
+
+
+class _SimilarTable:
+    def __init__(self):
+        self.table = None
+        self.mtime = None
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, check_interval):
+        now = time.monotonic()
+        if now < self.next_check or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_check = now + check_interval
+            try:
+                mtime = os.stat(SIMILAR_PATH).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self.mtime:
+                self.table = None if mtime is None else np.load(SIMILAR_PATH, mmap_mode="r")
+                self.mtime = mtime
+        finally:
+            self.lock.release()
+
+    def lookup(self, song_id):
+        table = self.table
+        if table is None or not len(table):
+            return None
+        ids = table["song_id"]
+        i = int(np.searchsorted(ids, song_id))
+        if i == len(ids) or ids[i] != song_id:
+            return None
+        return table[i]
+
+
+_table = _SimilarTable()
+
+
+def similar_songs(song_id, n, check_interval=5.0):
+    """
+    ``(song ids, scores)`` of at most *n* precomputed neighbours of
+    *song_id*, or None when the song is not in the table.
+    """
+    _table.refresh(check_interval)
+    row = _table.lookup(song_id)
+    if row is None:
+        return None
+    valid = row["neighbors"] >= 0
+    return row["neighbors"][valid][:n].tolist(), row["scores"][valid][:n].tolist()
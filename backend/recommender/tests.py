@@ -0,0 +1,410 @@
+# recommender/tests.py
+
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import faiss
+import numpy as np
+import scipy.sparse as sp
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from music.models import Song, SongLike
+from .catalog import SongCatalog, get_catalog, invalidate_catalog
+from .content import HashedContentEncoder, OneHotContentEncoder
+from .hybrid import combine
+from . import index as index_module
+from . import incremental
+from . import interactions
+from . import pipeline
+from .incremental import index_songs
+from .index import INDEX_TYPES, apply_search_params, build_index, search_params
+from .models import SongVector
+from .trainers import ALGORITHMS, make_trainer
+
+
+class SongVectorStorageTest(TestCase):
+    def setUp(self):
+        # 创建两首歌，其中一首没有 hybrid_vector
+        self.song1 = Song.objects.create(title="Song One", artist="Artist A")
+        self.song2 = Song.objects.create(title="Song Two", artist="Artist B")
+        SongVector.objects.create(
+            song=self.song1, cf_vector=[0.5, -1.25], hybrid_vector=[1, 2, 3]
+        )
+        SongVector.objects.create(song=self.song2, cf_vector=np.ones(2))
+
+    def test_roundtrip_float32(self):
+        # 读回来的应是 float32 数组，数值保持不变
+        sv = SongVector.objects.get(song=self.song1)
+        vec = sv.as_numpy("cf_vector")
+        self.assertEqual(vec.dtype, np.float32)
+        np.testing.assert_array_equal(vec, [0.5, -1.25])
+        self.assertIsNone(sv.as_numpy("content_vector"))
+
+    def test_as_matrix_skips_null(self):
+        # 没有 hybrid_vector 的行应被跳过
+        ids, mat = SongVector.objects.as_matrix("hybrid_vector")
+        self.assertEqual(ids.tolist(), [self.song1.id])
+        self.assertEqual(mat.shape, (1, 3))
+
+        ids, mat = SongVector.objects.as_matrix("cf_vector")
+        self.assertEqual(sorted(ids.tolist()), [self.song1.id, self.song2.id])
+        self.assertEqual(mat.dtype, np.float32)
+
+    def test_bulk_upsert(self):
+        # 已有行只更新指定列，新行被插入
+        song3 = Song.objects.create(title="Song Three", artist="Artist C")
+        song_ids = [self.song1.id, self.song2.id, song3.id]
+        content = np.arange(6, dtype=np.float32).reshape(3, 2)
+        progress = mock.Mock()
+
+        written = SongVector.objects.bulk_upsert(
+            song_ids, batch_size=2, progress=progress, content_vector=content
+        )
+        self.assertEqual(written, 3)
+        self.assertEqual(progress.call_args_list, [mock.call(2, 3), mock.call(3, 3)])
+        ids, mat = SongVector.objects.as_matrix("content_vector")
+        self.assertEqual(ids.tolist(), song_ids)
+        np.testing.assert_array_equal(mat, content)
+        sv = SongVector.objects.get(song=self.song1)
+        np.testing.assert_array_equal(sv.as_numpy("cf_vector"), [0.5, -1.25])
+
+
+class GenerateHybridVectorsTest(TestCase):
+    def test_weighted_and_zero_filled(self):
+        songs = [Song.objects.create(title=f"S{i}", artist="A") for i in range(4)]
+        SongVector.objects.create(song=songs[0], cf_vector=[1, 2], content_vector=[3])
+        SongVector.objects.create(song=songs[1], content_vector=[4])
+        SongVector.objects.create(song=songs[2], cf_vector=[5, 6])
+        SongVector.objects.create(song=songs[3])
+
+        with mock.patch("recommender.management.commands.generate_hybrid_vectors.save_weights"):
+            call_command(
+                "generate_hybrid_vectors",
+                cf_weight=2.0,
+                content_weight=0.5,
+                chunk_size=3,
+                stdout=StringIO(),
+            )
+        ids, mat = SongVector.objects.as_matrix("hybrid_vector")
+        self.assertEqual(ids.tolist(), [s.id for s in songs[:3]])
+        np.testing.assert_array_equal(mat, [[2, 4, 1.5], [0, 0, 2], [10, 12, 0]])
+
+
+class TrainerTest(SimpleTestCase):
+    def test_trainers_separate_taste_groups(self):
+        # 两组用户分别只喜欢前 10 / 后 10 首歌（每人随机缺几首）
+        rng = np.random.default_rng(0)
+        likes = np.zeros((40, 20), dtype=np.float32)
+        likes[:20, :10] = rng.random((20, 10)) < 0.7
+        likes[20:, 10:] = rng.random((20, 10)) < 0.7
+        csr = sp.csr_matrix(likes)
+
+        for algo in ALGORITHMS:
+            users, items = make_trainer(algo, factors=4, threads=2).fit(csr)
+            self.assertEqual(users.shape, (40, 4))
+            self.assertEqual(items.shape, (20, 4))
+            scores = users @ items.T
+            in_group = np.r_[scores[:20, :10].ravel(), scores[20:, 10:].ravel()]
+            off_group = np.r_[scores[:20, 10:].ravel(), scores[20:, :10].ravel()]
+            self.assertGreater(in_group.mean(), off_group.mean(), algo)
+
+    def test_empty_matrix(self):
+        for algo in ALGORITHMS:
+            users, items = make_trainer(algo, factors=3).fit(sp.csr_matrix((2, 5)))
+            self.assertFalse(users.any() or items.any())
+
+
+class InteractionMatrixTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.multiple(
+            interactions,
+            DATA_DIR=tmp.name,
+            MATRIX_PATH=os.path.join(tmp.name, "interaction_coo.npz"),
+            MAP_PATH=os.path.join(tmp.name, "user_song_map.npz"),
+            LEGACY_MAP_PATH=os.path.join(tmp.name, "user_song_map.json"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f"u{i}", password="x") for i in range(2)]
+        self.songs = [Song.objects.create(title=f"S{i}", artist="A") for i in range(3)]
+        SongLike.objects.create(user=self.users[0], song=self.songs[0])
+        SongLike.objects.create(user=self.users[1], song=self.songs[1])
+
+    def _liked(self, coo, user_ids, song_ids):
+        return {(int(user_ids[r]), int(song_ids[c])) for r, c in zip(coo.row, coo.col)}
+
+    def test_delta_matches_full_build(self):
+        interactions.build_full()
+        old_users, old_songs = interactions.load()[1:3]
+
+        # 新用户、新歌、新点赞、取消点赞、取消后又点赞
+        user = get_user_model().objects.create_user(username="u2", password="x")
+        song = Song.objects.create(title="S3", artist="B")
+        SongLike.objects.create(user=user, song=song)
+        SongLike.objects.get(user=self.users[1], song=self.songs[1]).delete()
+        SongLike.objects.get(user=self.users[0], song=self.songs[0]).delete()
+        SongLike.objects.create(user=self.users[0], song=self.songs[0])
+
+        coo, user_ids, song_ids, stats = interactions.apply_delta()
+        # 已有的下标保持不变
+        self.assertEqual(user_ids[:2].tolist(), old_users.tolist())
+        self.assertEqual(song_ids[:3].tolist(), old_songs.tolist())
+        self.assertEqual(stats["new_users"], 1)
+        self.assertEqual(stats["new_songs"], 1)
+        expected = set(SongLike.objects.values_list("user_id", "song_id"))
+        self.assertEqual(self._liked(coo, user_ids, song_ids), expected)
+        self.assertEqual(self._liked(*interactions.build_full()[:3]), expected)
+
+
+class ContentEncoderTest(SimpleTestCase):
+    def test_hashed_dim_is_fixed(self):
+        # 维度只由参数决定，与歌曲数量无关
+        encoder = HashedContentEncoder(artist_dim=8, school_dim=4)
+        songs = [(f"Artist {i}", "jazz") for i in range(100)]
+        vecs = encoder.encode(songs)
+        self.assertEqual(vecs.shape, (100, 12))
+        # 每行恰好两个非零项（artist 一个、school 一个）
+        self.assertTrue((np.count_nonzero(vecs, axis=1) == 2).all())
+
+    def test_hashed_is_deterministic(self):
+        a = HashedContentEncoder().encode([("Miles Davis", "jazz")])
+        b = HashedContentEncoder().encode([("Miles Davis", "jazz")])
+        np.testing.assert_array_equal(a, b)
+
+    def test_onehot_matches_vocab(self):
+        songs = [("A", "jazz"), ("B", "rock")]
+        encoder = OneHotContentEncoder().fit(songs)
+        self.assertEqual(encoder.dim, 4)
+        np.testing.assert_array_equal(encoder.encode(songs)[0], [1, 0, 1, 0])
+
+
+class BuildIndexTest(SimpleTestCase):
+    def test_all_index_types_find_self(self):
+        # 每种索引都应能用向量本身查回自己
+        rng = np.random.default_rng(0)
+        vecs = rng.standard_normal((1000, 16)).astype(np.float32)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+        for index_type in INDEX_TYPES:
+            index, params = build_index(vecs, index_type, nlist=4, pq_m=4)
+            self.assertEqual(params["index_type"], index_type)
+            apply_search_params(index, search_params(index_type, nprobe=4))
+            _, I = index.search(vecs[:5], 1)
+            if index_type != "ivf_pq":  # PQ 有损，不要求精确命中
+                self.assertEqual(I[:, 0].tolist(), list(range(5)))
+
+
+class SongCatalogTest(TestCase):
+    def test_lookup_keeps_order_and_reports_missing(self):
+        catalog = SongCatalog([5, 2, 9], ["五", "Two", "Nine"], ["A", "B", "C"],
+                              ["jazz", "rock", "jazz"])
+        rows, missing = catalog.lookup([9, 7, 5])
+        self.assertEqual([r["id"] for r in rows], [9, 5])
+        self.assertEqual(rows[1], {"id": 5, "title": "五", "artist": "A", "school": "jazz"})
+        self.assertEqual(missing, [7])
+
+    def test_reloads_after_song_change(self):
+        get_catalog()
+        song = Song.objects.create(title="Fresh", artist="New")
+        rows, missing = get_catalog().lookup([song.id])
+        self.assertEqual(missing, [])
+        self.assertEqual(rows[0]["title"], "Fresh")
+
+    @override_settings(RECOMMENDER_CATALOG_CHECK_SECONDS=3600)
+    def test_fingerprint_bounds_staleness(self):
+        old = Song.objects.create(title="Old", artist="A", school="jazz")
+        invalidate_catalog()
+        before = get_catalog()
+
+        # 其他进程的写入不会通知本进程：检查间隔内继续使用已加载的曲库
+        Song.objects.bulk_create([Song(title="Bulk", artist="B", school="rock")])
+        Song.objects.filter(pk=old.pk).delete()
+        self.assertIs(get_catalog(), before)
+
+        # 到了检查时间，指纹变化后重新加载
+        with mock.patch("recommender.catalog._next_check", 0.0):
+            catalog = get_catalog()
+        rows, missing = catalog.lookup([old.id])
+        self.assertEqual((rows, missing), ([], [old.id]))
+        self.assertEqual(catalog.genre_ids("jazz").tolist(), [])
+        self.assertEqual(len(catalog.genre_ids("rock")), 1)
+
+    def test_appended_songs_are_merged(self):
+        Song.objects.create(title="Old", artist="A", school="jazz")
+        invalidate_catalog()
+        before = get_catalog()
+        new = Song.objects.create(title="新歌", artist="B", school="blues")
+        with mock.patch.object(SongCatalog, "load", wraps=SongCatalog.load) as load:
+            catalog = get_catalog()
+        # 只读取新增的行
+        self.assertEqual(load.call_count, 1)
+        self.assertIsNotNone(load.call_args.args[0])
+        self.assertEqual(len(catalog), len(before) + 1)
+        self.assertEqual(catalog.lookup([new.id])[0][0]["title"], "新歌")
+        self.assertEqual(catalog.genre_ids("blues").tolist(), [new.id])
+
+
+def _patch_index_dirs(testcase):
+    """把索引发布目录指向临时目录"""
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    patcher = mock.patch.multiple(
+        index_module,
+        DATA_DIR=tmp.name,
+        MANIFEST_PATH=os.path.join(tmp.name, "index_manifest.json"),
+        VERSIONS_DIR=os.path.join(tmp.name, "index_versions"),
+        _handle=None,
+        _manifest_mtime=None,
+        _next_check=0.0,
+    )
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+
+
+class IndexPublishTest(SimpleTestCase):
+    def setUp(self):
+        _patch_index_dirs(self)
+
+    def _publish(self, n):
+        vecs = np.eye(4, dtype=np.float32)[:n]
+        index = faiss.IndexFlatIP(4)
+        index.add(vecs)
+        return index_module.publish_index(index, np.arange(100, 100 + n), {"search": {}})
+
+    def test_new_version_is_swapped_in(self):
+        v1 = self._publish(2)
+        handle = index_module.get_index(check_interval=0)
+        self.assertEqual(handle.version, v1)
+        self.assertEqual(handle.index.ntotal, 2)
+
+        v2 = self._publish(3)
+        new_handle = index_module.get_index(check_interval=0)
+        self.assertEqual(new_handle.version, v2)
+        self.assertEqual(new_handle.song_map.tolist(), [100, 101, 102])
+        # 旧句柄仍可继续检索
+        self.assertEqual(handle.index.search(np.eye(4, dtype=np.float32)[:1], 1)[1][0, 0], 0)
+
+    def test_corrupt_version_keeps_current(self):
+        self._publish(2)
+        current = index_module.get_index(check_interval=0)
+        v2 = self._publish(3)
+        with open(os.path.join(index_module.VERSIONS_DIR, v2, index_module.MAP_FILE), "ab") as f:
+            f.write(b"garbage")
+        self.assertIs(index_module.get_index(check_interval=0), current)
+        # 同一个损坏版本不会在每次检查时重新计算校验和
+        with mock.patch.object(index_module, "load_version") as load:
+            self.assertIs(index_module.get_index(check_interval=0), current)
+        load.assert_not_called()
+
+        v3 = self._publish(1)
+        self.assertEqual(index_module.get_index(check_interval=0).version, v3)
+
+    def test_stale_base_is_rejected(self):
+        v1 = self._publish(2)
+        v2 = self._publish(3)
+        index = faiss.IndexFlatIP(4)
+        with self.assertRaises(index_module.StaleIndexError):
+            index_module.publish_index(index, [], {"search": {}}, base_version=v1)
+        self.assertEqual(index_module.read_manifest()["version"], v2)
+
+
+class IncrementalIndexTest(TestCase):
+    def setUp(self):
+        _patch_index_dirs(self)
+        self.encoder = HashedContentEncoder(artist_dim=8, school_dim=4)
+        for name, value in (("load_encoder", self.encoder), ("load_weights", (1.0, 1.0))):
+            patcher = mock.patch(f"recommender.incremental.{name}", return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # 先发布一个只含一首歌的索引（cf 部分 2 维 + content 12 维）
+        self.old = Song.objects.create(title="Old", artist="A", school="jazz")
+        vec = np.hstack([[1.0, 0.0], self.encoder.encode([("A", "jazz")])[0]])
+        vec = (vec / np.linalg.norm(vec)).astype(np.float32)[None, :]
+        index, params = build_index(vec, "flat", ids=[self.old.id])
+        index_module.publish_index(index, [self.old.id], params)
+
+    def test_new_song_becomes_searchable(self):
+        new = Song.objects.create(title="New", artist="B", school="rock")
+        self.assertEqual(index_songs([new.id]), 1)
+        self.assertEqual(index_songs([new.id]), 0)  # 不会重复加入
+
+        handle = index_module.get_index(check_interval=0)
+        self.assertEqual(handle.index.ntotal, 2)
+        query = SongVector.objects.get(song=new).as_numpy().copy()[None, :]
+        faiss.normalize_L2(query)
+        ids, _ = index_module.search_excluding(handle.index, handle.song_map, query, [set()], 1)
+        self.assertEqual(ids, [[new.id]])
+
+    def test_full_rebuild_during_add_is_kept(self):
+        new = Song.objects.create(title="New", artist="B", school="rock")
+        rebuilt = faiss.IndexIDMap2(faiss.IndexFlatIP(14))
+        rebuilt.add_with_ids(np.eye(14, dtype=np.float32)[:1], np.array([self.old.id]))
+        real_combine = combine
+        calls = []
+
+        def combine_during_rebuild(*args):
+            # 第一次尝试读完基准版本后，全量重建发布了新版本
+            if not calls:
+                params = {"search": {}, "id_map": True, "rebuilt": True}
+                index_module.publish_index(rebuilt, [self.old.id], params)
+            calls.append(args)
+            return real_combine(*args)
+
+        with mock.patch("recommender.incremental.combine", side_effect=combine_during_rebuild):
+            self.assertEqual(index_songs([new.id]), 1)
+        self.assertEqual(len(calls), 2)
+        handle = index_module.get_index(check_interval=0)
+        self.assertTrue(handle.params.get("rebuilt"))
+        self.assertEqual(handle.index.ntotal, 2)
+
+
+class ScheduleTest(TestCase):
+    def test_ids_are_queued_only_after_commit(self):
+        with mock.patch.object(incremental, "_executor") as executor, mock.patch.object(
+            incremental, "_pending", set()
+        ) as pending:
+            with self.captureOnCommitCallbacks() as callbacks:
+                incremental.schedule([1, 2])
+                # 提交前其他事务触发的 _drain 看不到这些歌曲
+                self.assertEqual(pending, set())
+            executor.submit.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+            self.assertEqual(pending, {1, 2})
+            executor.submit.assert_called_once_with(incremental._drain)
+
+
+class PipelineTest(TestCase):
+    def test_interaction_matrix(self):
+        songs = [Song.objects.create(title=f"S{i}", artist="A", school="jazz") for i in range(3)]
+        song_ids = np.array([s.id for s in songs], dtype=np.int64)
+        user_ids = np.array([1, 2], dtype=np.int64)
+        # 最后一条指向不存在的用户，应被丢弃
+        likes = np.array([[1, song_ids[0]], [2, song_ids[2]], [9, song_ids[1]]])
+        coo = interactions.build_matrix(user_ids, song_ids, likes)
+        self.assertEqual(coo.toarray().tolist(), [[1, 0, 0], [0, 0, 1]])
+        self.assertEqual(interactions.build_matrix(user_ids[:0], song_ids, likes).shape, (0, 3))
+
+
+    def test_stage_is_skipped_when_key_unchanged(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        compute = mock.Mock(return_value={"x": np.ones(2)})
+
+        pipeline.Pipeline(cache_dir=tmp.name).stage("s", "k1", compute)
+        run = pipeline.Pipeline(cache_dir=tmp.name)
+        np.testing.assert_array_equal(run.stage("s", "k1", compute)["x"], np.ones(2))
+        self.assertEqual(compute.call_count, 1)
+        self.assertTrue(run.timings[0][2])
+
+        run.stage("s", "k2", compute)
+        pipeline.Pipeline(cache_dir=tmp.name, force=True).stage("s", "k2", compute)
+        self.assertEqual(compute.call_count, 3)
@@ -0,0 +1,239 @@
+# recommender/trainers.py
+
+"""
+Collaborative-filtering trainers behind SongVector.cf_vector.
+
+Every trainer takes the binary users × songs like matrix (CSR) and returns
+``(user_factors, item_factors)`` such that ``user_factors @ item_factors.T``
+scores songs for users:
+
+``svd``  TruncatedSVD of the like matrix (the original model).
+``als``  implicit-feedback ALS (Hu, Koren & Volinsky 2008) solved with a few
+         conjugate-gradient steps per sweep (Takács et al. 2011); all rows of
+         a block are solved at once with sparse / dense matrix products and
+         blocks run on a thread pool.
+``bpr``  Bayesian personalised ranking, Hogwild-style mini-batch SGD where
+         each thread updates the shared factors with its own sample stream.
+
+User factors are saved to ``data/user_factors.npz`` for per-user serving.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+from threadpoolctl import threadpool_limits
+
+from .content import DATA_DIR
+
+USER_FACTORS_PATH = os.path.join(DATA_DIR, "user_factors.npz")
+
+ALGORITHMS = ("svd", "als", "bpr")
+
+
+def _blocks(n, parts):
+    bounds = np.linspace(0, n, max(1, min(parts, n)) + 1, dtype=np.int64)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+class SVDTrainer:
+    def __init__(self, factors=50, iterations=10, random_state=42, **_):
+        self.factors = factors
+        self.iterations = iterations
+        self.random_state = random_state
+
+    def fit(self, csr):
+        n_users, n_songs = csr.shape
+        user_factors = np.zeros((n_users, self.factors), dtype=np.float32)
+        item_factors = np.zeros((n_songs, self.factors), dtype=np.float32)
+        k = min(self.factors, n_users - 1, n_songs - 1)
+        if k < 1 or not csr.nnz:
+            return user_factors, item_factors
+
+        svd = TruncatedSVD(
+            n_components=k, n_iter=self.iterations, random_state=self.random_state
+        )
+        # items × users 分解：item_factors = U·Σ，user_factors = Vᵀ
+        item_factors[:, :k] = svd.fit_transform(csr.T)
+        user_factors[:, :k] = svd.components_.T
+        return user_factors, item_factors
+
+
+class ALSTrainer:
+    def __init__(
+        self,
+        factors=50,
+        iterations=15,
+        regularization=0.01,
+        alpha=40.0,
+        cg_steps=3,
+        threads=1,
+        random_state=42,
+        **_,
+    ):
+        self.factors = factors
+        self.iterations = iterations
+        self.regularization = regularization
+        self.alpha = alpha
+        self.cg_steps = cg_steps
+        self.threads = threads
+        self.random_state = random_state
+
+    def fit(self, csr):
+        rng = np.random.default_rng(self.random_state)
+        n_users, n_songs = csr.shape
+        X = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        Y = (rng.standard_normal((n_songs, self.factors)) * 0.01).astype(np.float32)
+        if not csr.nnz:
+            return np.zeros_like(X), np.zeros_like(Y)
+
+        Cui = csr.astype(np.float32).tocsr()
+        Cui.data[:] = self.alpha  # 置信度 c = 1 + alpha·r，这里存 c - 1
+        Ciu = Cui.T.tocsr()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool, threadpool_limits(1):
+            for _ in range(self.iterations):
+                self._sweep(pool, Cui, X, Y)
+                self._sweep(pool, Ciu, Y, X)
+        return X, Y
+
+    def _sweep(self, pool, Cui, X, Y):
+        """Update every row of *X* with *Y* fixed, block by block."""
+        YtY = Y.T @ Y + self.regularization * np.eye(self.factors, dtype=np.float32)
+        futures = [
+            pool.submit(self._cg_block, Cui[a:b], X[a:b], Y, YtY)
+            for a, b in _blocks(X.shape[0], self.threads * 4)
+        ]
+        for f in futures:
+            f.result()
+
+    def _cg_block(self, C, x, Y, YtY):
+        """
+        A few CG steps on ``(YᵀC_uY + λI) x_u = YᵀC_u p_u`` for every row of
+        the block at once. ``YᵀC_uY = YᵀY + Yᵀ(C_u - I)Y`` so only the liked
+        items of each row are touched. *x* is a view and updated in place.
+        """
+        rows = np.repeat(np.arange(C.shape[0]), np.diff(C.indptr))
+        cols = C.indices
+        confidence = C.data  # c - 1
+
+        def matvec(p):
+            d = np.einsum("ij,ij->i", p[rows], Y[cols]) * confidence
+            return p @ YtY + sp.csr_matrix((d, (rows, cols)), shape=C.shape) @ Y
+
+        b = sp.csr_matrix((confidence + 1, (rows, cols)), shape=C.shape) @ Y
+        r = b - matvec(x)
+        p = r.copy()
+        rs_old = np.einsum("ij,ij->i", r, r)
+        for _ in range(self.cg_steps):
+            Ap = matvec(p)
+            pAp = np.einsum("ij,ij->i", p, Ap)
+            step = np.divide(rs_old, pAp, out=np.zeros_like(rs_old), where=pAp > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * Ap
+            rs_new = np.einsum("ij,ij->i", r, r)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+            p = r + beta[:, None] * p
+            rs_old = rs_new
+
+
+class BPRTrainer:
+    def __init__(
+        self,
+        factors=50,
+        iterations=100,
+        learning_rate=0.05,
+        regularization=0.01,
+        batch_size=1024,
+        threads=1,
+        random_state=42,
+        **_,
+    ):
+        self.factors = factors
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.regularization = regularization
+        self.batch_size = batch_size
+        self.threads = threads
+        self.random_state = random_state
+
+    def fit(self, csr):
+        rng = np.random.default_rng(self.random_state)
+        n_users, n_songs = csr.shape
+        U = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        V = (rng.standard_normal((n_songs, self.factors)) * 0.01).astype(np.float32)
+        if not csr.nnz or n_songs < 2:
+            return np.zeros_like(U), np.zeros_like(V)
+
+        csr = csr.tocsr()
+        csr.sort_indices()
+        users = np.repeat(np.arange(n_users), np.diff(csr.indptr))
+        items = csr.indices
+        # (user, song) 编码成有序的一维键，用 searchsorted 判断是否为正样本
+        liked = users.astype(np.int64) * n_songs + items
+        # 每轮（epoch）采样与正样本数相同的三元组，平均分给各线程
+        per_thread = -(-csr.nnz // self.threads)
+        seeds = rng.integers(2**31, size=(self.iterations, self.threads))
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool, threadpool_limits(1):
+            for epoch in range(self.iterations):
+                futures = [
+                    pool.submit(self._epoch, liked, users, items, U, V, per_thread, seed)
+                    for seed in seeds[epoch]
+                ]
+                for f in futures:
+                    f.result()
+        return U, V
+
+    def _epoch(self, liked, users, items, U, V, n_samples, seed):
+        rng = np.random.default_rng(seed)
+        lr, reg = self.learning_rate, self.regularization
+        for start in range(0, n_samples, self.batch_size):
+            picked = rng.integers(len(items), size=min(self.batch_size, n_samples - start))
+            u, i = users[picked], items[picked]
+            j = rng.integers(V.shape[0], size=len(picked))
+            # 负样本若恰好是用户喜欢的歌，本次不更新
+            keys = u.astype(np.int64) * V.shape[0] + j
+            pos = np.searchsorted(liked, keys).clip(max=len(liked) - 1)
+            keep = liked[pos] != keys
+            u, i, j = u[keep], i[keep], j[keep]
+
+            Uu, Vi, Vj = U[u], V[i], V[j]
+            x_uij = np.einsum("ij,ij->i", Uu, Vi - Vj)
+            g = (1.0 / (1.0 + np.exp(x_uij)))[:, None].astype(np.float32)  # σ(-x)
+            np.add.at(U, u, lr * (g * (Vi - Vj) - reg * Uu))
+            np.add.at(V, i, lr * (g * Uu - reg * Vi))
+            np.add.at(V, j, lr * (-g * Uu - reg * Vj))
+
+
+TRAINERS = {"svd": SVDTrainer, "als": ALSTrainer, "bpr": BPRTrainer}
+
+
+def make_trainer(algo="svd", **params):
+    try:
+        return TRAINERS[algo](**params)
+    except KeyError:
+        raise ValueError(f"Unknown CF algorithm: {algo}") from None
+
+
+def save_user_factors(user_ids, user_factors, algo, path=USER_FACTORS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(
+        tmp,
+        user_ids=np.asarray(user_ids, dtype=np.int64),
+        factors=np.asarray(user_factors, dtype=np.float32),
+        algo=np.array(algo),
+    )
+    os.replace(tmp, path)
+
+
+def load_user_factors(path=USER_FACTORS_PATH):
+    """``(user_ids, factors)`` saved by the last CF training, or None."""
+    try:
+        with np.load(path, allow_pickle=False) as f:
+            return f["user_ids"], f["factors"]
+    except FileNotFoundError:
+        return None
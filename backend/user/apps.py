@@ -8,4 +8,13 @@ class UserConfig(AppConfig):
     verbose_name = "用户管理"
 
     def ready(self):
-        pass
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save
+        from .authentication import bump_auth_version
+
+        # 用户资料、密码、启用状态变化后，缓存的用户对象立即失效
+        User = get_user_model()
+        post_save.connect(bump_auth_version, sender=User, dispatch_uid="user_auth_saved")
+        post_delete.connect(
+            bump_auth_version, sender=User, dispatch_uid="user_auth_deleted"
+        )
@@ -0,0 +1,239 @@
+# user/authentication.py
+
+"""
+JWT authentication without per-request DB work.
+
+CachedJWTAuthentication keeps recently seen users in a small in-process
+TTL/LRU cache keyed by ``(user id, auth version)``. The auth version lives
+in the Django cache and is bumped whenever a User row is saved or deleted,
+so profile changes, deactivation and password changes take effect at once
+in this process (and in every process when the cache backend is shared);
+the TTL bounds staleness otherwise.
+
+``blacklist`` answers "is this refresh token's jti blacklisted?" from a
+Bloom filter rebuilt from BlacklistedToken and topped up incrementally
+every few seconds. A negative answer needs no query; only a Bloom hit is
+confirmed against the DB. Until the first build succeeds, and after a
+failed refresh, every lookup goes to the DB instead.
+"""
+
+import copy
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+logger = logging.getLogger(__name__)
+
+AUTH_VERSION_KEY = "user:auth_version:{}"
+# 增量刷新与上一次扫描的重叠时间，覆盖晚提交的黑名单记录
+OVERLAP = timedelta(minutes=5)
+
+
+# ---------- 用户缓存 ----------
+def auth_version(user_id):
+    return cache.get(AUTH_VERSION_KEY.format(user_id), 0)
+
+
+def bump_auth_version(sender, instance, **kwargs):
+    """Signal receiver: drop every cached copy of *instance*."""
+    key = AUTH_VERSION_KEY.format(instance.pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 用时间戳作为起点，版本键被淘汰后也不会与旧条目重合
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+class _UserCache:
+    def __init__(self):
+        self.entries = OrderedDict()  # (user id, version) → (user, expires)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, user, ttl, max_size):
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_users = _UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose user lookup is served from _users."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        key = (str(user_id), auth_version(user_id))
+        user = _users.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(
+                    _("User not found"), code="user_not_found"
+                ) from e
+            _users.put(key, user, settings.USER_CACHE_TTL, settings.USER_CACHE_SIZE)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        # 每个请求拿到独立的副本，视图修改 request.user 不会影响缓存中的对象
+        return copy.copy(user)
+
+
+# ---------- 黑名单 ----------
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (blake2b double hashing)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity = max(capacity, 1)
+        self.size = max(1024, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class _Blacklist:
+    """
+    Blacklisted jtis of unexpired tokens. Rebuilt from scratch every
+    TOKEN_BLACKLIST_REBUILD_SECONDS (dropping expired tokens); in between,
+    rows blacklisted since the last refresh are added every
+    TOKEN_BLACKLIST_REFRESH_SECONDS. The scan overlaps the previous one by
+    OVERLAP, since ids and timestamps can commit out of order.
+    """
+
+    def __init__(self):
+        self.bloom = BloomFilter(1)
+        self.count = 0
+        self.watermark = None  # 上一次扫描开始的时间
+        self.recent = {}  # 重叠窗口内已加入的行：id → blacklisted_at
+        self.next_refresh = 0.0
+        self.next_rebuild = 0.0
+        self.ready = False  # 过滤器是否覆盖到最近一次扫描；否则直接查库
+        self.lock = threading.Lock()
+
+    def _rows(self, queryset):
+        return queryset.filter(token__expires_at__gt=timezone.now()).values_list(
+            "id", "token__jti", "blacklisted_at"
+        )
+
+    def refresh(self):
+        now = time.monotonic()
+        if now < self.next_refresh or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_refresh = now + settings.TOKEN_BLACKLIST_REFRESH_SECONDS
+            self._refresh(now)
+            self.ready = True
+        except Exception:
+            # 构建失败时不能用不完整的过滤器放行，退回精确查询直到下次刷新成功
+            self.ready = False
+            logger.exception("Token blacklist refresh failed")
+        finally:
+            self.lock.release()
+
+    def _refresh(self, now):
+        started = timezone.now()
+        if now >= self.next_rebuild:
+            rows = list(self._rows(BlacklistedToken.objects.all()))
+            # 预留一倍容量给增量追加，超出后提前重建
+            bloom = BloomFilter(2 * len(rows) + 1024)
+            for _id, jti, _at in rows:
+                bloom.add(jti)
+            self.bloom, self.count = bloom, len(rows)
+            self.recent = {
+                row_id: at for row_id, _jti, at in rows if at >= started - OVERLAP
+            }
+            self.watermark = started
+            self.next_rebuild = now + settings.TOKEN_BLACKLIST_REBUILD_SECONDS
+            return
+
+        since = self.watermark - OVERLAP
+        rows = self._rows(BlacklistedToken.objects.filter(blacklisted_at__gte=since))
+        for row_id, jti, at in rows:
+            if row_id not in self.recent:
+                self.add(jti)
+                self.recent[row_id] = at
+        self.recent = {
+            row_id: at for row_id, at in self.recent.items() if at >= started - OVERLAP
+        }
+        self.watermark = started
+        if self.count > self.bloom.capacity:
+            self.next_rebuild = 0.0  # 超出容量后误报率上升，下次刷新时重建
+
+    def add(self, jti):
+        """Record a token blacklisted by this process without waiting for a refresh."""
+        self.bloom.add(jti)
+        self.count += 1
+
+    def reset(self):
+        self.__init__()
+
+    def __contains__(self, jti):
+        self.refresh()
+        if self.ready and jti not in self.bloom:
+            return False
+        # Bloom 过滤器可能误报，首次构建完成前或刷新失败后也不可信：精确查一次
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+blacklist = _Blacklist()
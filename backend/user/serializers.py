@@ -3,6 +3,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import UntypedToken
 
 User = get_user_model()
 
@@ -60,3 +61,16 @@ class LoginSerializer(TokenObtainPairSerializer):
         # 可以在 token 内塞自定义声明
         token["username"] = user.username
         return token
+
+
+class TokenVerifySerializer(serializers.Serializer):
+    """
+    只校验签名与有效期；黑名单由视图通过内存中的 Bloom 过滤器检查，
+    避免 simplejwt 默认实现每次都查询 BlacklistedToken。
+    """
+
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        UntypedToken(attrs["token"])
+        return {}
@@ -1,7 +1,15 @@
 # user/tests.py
 
-from django.test import TestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import BloomFilter, _users, blacklist
 
 User = get_user_model()
 
@@ -21,3 +29,100 @@ class UserModelTest(TestCase):
         # 测试用户是否成功创建，并检查字段
         self.assertTrue(self.user.check_password("testpass123"))
         self.assertEqual(self.user.email, "test@example.com")
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _users.clear()
+        blacklist.reset()
+        self.user = User.objects.create_user(username="cached", password="testpass123")
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.refresh.access_token}")
+
+    def test_user_lookup_is_cached(self):
+        self.assertEqual(self.client.get("/api/user/profile/").data["username"], "cached")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/user/profile/").status_code, 200)
+
+    def test_user_change_invalidates(self):
+        self.client.get("/api/user/profile/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/user/profile/").status_code, 401)
+
+        self.user.is_active = True
+        self.user.bio = "updated"
+        self.user.save()
+        self.assertEqual(self.client.get("/api/user/profile/").data["bio"], "updated")
+
+    def test_verify_uses_blacklist(self):
+        token = str(self.refresh)
+        self.client.get("/api/user/profile/")  # 预热用户缓存
+        blacklist.refresh()
+        with self.assertNumQueries(0):
+            # 刷新间隔内、Bloom 过滤器未命中：不访问数据库
+            blacklist.next_refresh = float("inf")
+            resp = self.client.post("/api/user/verify/", {"token": token})
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.post("/api/user/logout/", {"refresh": token})
+        self.assertEqual(resp.status_code, 205)
+        resp = self.client.post("/api/user/verify/", {"token": token})
+        self.assertEqual(resp.status_code, 401)
+
+    def test_refresh_picks_up_other_processes(self):
+        other = RefreshToken.for_user(self.user)
+        self.assertFalse(other["jti"] in blacklist)
+        # 模拟其他进程拉黑：直接写表，等到下一次刷新
+        BlacklistedToken.objects.create(
+            token=OutstandingToken.objects.get(jti=other["jti"])
+        )
+        self.assertFalse(other["jti"] in blacklist)
+        blacklist.next_refresh = 0.0
+        self.assertTrue(other["jti"] in blacklist)
+
+    def test_refresh_picks_up_rows_committed_out_of_order(self):
+        early, late = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        outstanding = {t.jti: t for t in OutstandingToken.objects.all()}
+        # early 先拿到较小的 id，但比 late 晚提交
+        reserved = BlacklistedToken.objects.create(token=outstanding[early["jti"]])
+        reserved_id = reserved.id
+        reserved.delete()
+        BlacklistedToken.objects.create(token=outstanding[late["jti"]])
+        blacklist.next_refresh = 0.0
+        self.assertTrue(late["jti"] in blacklist)
+
+        BlacklistedToken.objects.create(id=reserved_id, token=outstanding[early["jti"]])
+        blacklist.next_refresh = 0.0
+        self.assertTrue(early["jti"] in blacklist)
+
+    def test_falls_back_to_db_until_built(self):
+        jti = self.refresh["jti"]
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=jti))
+        # 其他线程正在首次构建（拿不到锁）：不能用空过滤器放行
+        blacklist.next_refresh = float("inf")
+        self.assertTrue(jti in blacklist)
+
+        # 构建失败：记录日志，之后的查询仍走数据库
+        blacklist.next_refresh = 0.0
+        with mock.patch.object(blacklist, "_rows", side_effect=RuntimeError("db down")):
+            with self.assertLogs("user.authentication", "ERROR"):
+                self.assertTrue(jti in blacklist)
+        self.assertFalse(blacklist.ready)
+        self.assertTrue(jti in blacklist)
+
+        blacklist.next_refresh = 0.0
+        blacklist.refresh()
+        self.assertTrue(blacklist.ready)
+        self.assertTrue(jti in blacklist)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        values = [f"jti-{i}" for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
@@ -9,17 +9,16 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
-from rest_framework_simplejwt.token_blacklist.models import (
-    BlacklistedToken,
-    OutstandingToken,
-)
 
+from .authentication import blacklist
 from .serializers import (
     UserSerializer,
     RegisterSerializer,
     LoginSerializer,
+    TokenVerifySerializer,
 )
 
 
@@ -80,6 +79,7 @@ class UserLogoutAPIView(APIView):
         try:
             token = RefreshToken(refresh_token)
             token.blacklist()  # 需要 token_blacklist app
+            blacklist.add(token["jti"])  # 本进程立即生效，其他进程在下次刷新时看到
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except TokenError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
@@ -91,6 +91,7 @@ class UserTokenRefreshAPIView(TokenRefreshView):
 
 class UserTokenVerifyAPIView(TokenVerifyView):
     permission_classes = [permissions.AllowAny]
+    serializer_class = TokenVerifySerializer
 
     def post(self, request, *args, **kwargs):
         token_str = request.data.get("token")
@@ -106,24 +107,17 @@ class UserTokenVerifyAPIView(TokenVerifyView):
             # 签名或过期失败
             return Response({"detail": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # 2. 用 RefreshToken API 解析出 jti 并检查黑名单
-        try:
-            rt = RefreshToken(token_str)
-            jti = rt["jti"]
-        except TokenError:
-            # 不是合法的 refresh token，就按非黑名单处理，通过即可
+        # 2. 取出 jti；签名已在第 1 步校验过。RefreshToken(token_str) 会自行查询
+        #    黑名单表，这里直接读取载荷
+        token = UntypedToken(token_str)
+        if token.get(api_settings.TOKEN_TYPE_CLAIM) != RefreshToken.token_type:
+            # 不是 refresh token，就按非黑名单处理，通过即可
             return Response({}, status=status.HTTP_200_OK)
+        jti = token.get(api_settings.JTI_CLAIM)
 
-        # 3. 查询是否在黑名单中
-        try:
-            outstanding = OutstandingToken.objects.get(jti=jti)
-        except OutstandingToken.DoesNotExist:
-            # 如果数据库中找不到，说明这个 token 从未发放过 → 视作无效
-            return Response(
-                {"detail": "Token not recognized"}, status=status.HTTP_401_UNAUTHORIZED
-            )
-
-        if BlacklistedToken.objects.filter(token=outstanding).exists():
+        # 3. 查询是否在黑名单中：先查内存中的 Bloom 过滤器，命中时才访问数据库。
+        #    签名有效即说明 token 由本服务签发，无需再查 OutstandingToken
+        if jti in blacklist:
             return Response(
                 {"detail": "Token has been blacklisted"},
                 status=status.HTTP_401_UNAUTHORIZED,
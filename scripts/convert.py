@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 
 # convert.py
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from csv2json import csv_to_json  # 复用你已有的函数
+
+from csv2json import csv_to_json, csv_to_ndjson, iter_records  # 复用你已有的函数
 
 INPUT_DIR = Path("input")
 OUTPUT_DIR = Path("output")
-OUTPUT_DIR.mkdir(exist_ok=True)
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
 
 
 def infer_school(csv_file: Path) -> str:
@@ -15,12 +21,102 @@ def infer_school(csv_file: Path) -> str:
     return stem.split("_", 1)[0]  # 取第一个下划线前的部分
 
 
-def main() -> None:
-    for csv_file in sorted(INPUT_DIR.glob("*.csv")):
+def convert_file(csv_file: Path, fmt: str) -> tuple[Path, str, int]:
+    """Convert one CSV in a worker process; returns (output, school, rows)."""
+    school = infer_school(csv_file)
+    if fmt == "ndjson":
+        out = OUTPUT_DIR / (csv_file.stem + ".ndjson")
+        rows = csv_to_ndjson(csv_file, school=school, output=out)
+    else:
+        out = OUTPUT_DIR / (csv_file.stem + ".json")
+        rows = len(csv_to_json(csv_file, school=school, output=out))
+    return out, school, rows
+
+
+def convert_all(csv_files: list[Path], fmt: str, workers: int) -> int:
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = pool.map(convert_file, csv_files, [fmt] * len(csv_files))
+        for csv_file, (out, school, rows) in zip(csv_files, jobs):
+            total += rows
+            print(f"✓ {csv_file.name}  →  {out.name}  (School={school}, {rows} rows)")
+    return total
+
+
+def load_into_db(csv_files: list[Path], settings: str) -> int:
+    """
+    Insert the CSV rows straight into the DB via music.ingest (no HTTP),
+    then add the new songs to the FAISS index with update_faiss_index.
+    """
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings)
+    import django
+
+    django.setup()
+    from django.conf import settings as conf
+    from django.core.management import call_command
+    from music.ingest import ingest_items
+
+    if conf.CACHES["default"]["BACKEND"].endswith("LocMemCache"):
+        # 缓存失效只发生在本进程：运行中的服务看不到新歌，直到缓存过期或重启
+        print(
+            "⚠ CACHE_BACKEND=locmem: running servers keep serving cached catalog / search "
+            "results; use the shared cache backend (redis / memcached) or restart them."
+        )
+    # 后台增量索引线程会与脚本退出竞争，导入完成后改为同步建索引
+    conf.RECOMMENDER_INCREMENTAL_INDEXING = False
+
+    total = created = 0
+    for csv_file in csv_files:
         school = infer_school(csv_file)
-        json_fn = OUTPUT_DIR / (csv_file.stem + ".json")
-        csv_to_json(csv_file, school=school, output=json_fn)
-        print(f"✓ {csv_file.name}  →  {json_fn.name}  (School={school})")
+        start = time.perf_counter()
+        # 每个文件一个事务；已在库中的 (title, artist) 会被跳过
+        summary = ingest_items(
+            iter_records(csv_file, school=school), conf.MUSIC_UPLOAD_BATCH_SIZE
+        )
+        elapsed = time.perf_counter() - start
+        total += summary["received"]
+        created += summary["created"]
+        print(
+            f"✓ {csv_file.name}  →  DB  (School={school}, {summary['received']} rows, "
+            f"{summary['created']} created, {summary['duplicates']} duplicates, "
+            f"{summary['invalid']} invalid, {summary['received'] / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+    if created:
+        call_command("update_faiss_index")
+    return total
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert input/*.csv to JSON / NDJSON or load them into the DB.")
+    ap.add_argument(
+        "--format",
+        choices=("ndjson", "json"),
+        default="ndjson",
+        help="ndjson: 每行一条的紧凑格式（默认）；json: 旧的缩进 JSON 数组",
+    )
+    ap.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="并行转换的进程数"
+    )
+    ap.add_argument(
+        "--db", action="store_true", help="不生成文件，直接通过批量导入写入数据库"
+    )
+    ap.add_argument(
+        "--settings",
+        default="backend.settings",
+        help="--db 使用的 Django settings 模块（DJANGO_SETTINGS_MODULE 优先）",
+    )
+    args = ap.parse_args()
+
+    csv_files = sorted(INPUT_DIR.glob("*.csv"))
+    start = time.perf_counter()
+    if args.db:
+        total = load_into_db(csv_files, args.settings)
+    else:
+        total = convert_all(csv_files, args.format, max(1, args.workers))
+    elapsed = time.perf_counter() - start
+    print(f"{total} rows from {len(csv_files)} files in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
 
 
 if __name__ == "__main__":
@@ -5,6 +5,20 @@ import csv
 import json
 import argparse
 from pathlib import Path
+from typing import Iterator
+
+KEEP = ("Track name", "Artist name")  # 仅保留这两列
+
+
+def iter_records(
+    csv_path: str | Path, *, school: str, encoding: str = "utf-8"
+) -> Iterator[dict]:
+    """Yield the slim records of the CSV at *csv_path* one row at a time."""
+    with open(csv_path, newline="", encoding=encoding) as f:
+        for row in csv.DictReader(f):
+            record = {k: row[k] for k in KEEP}
+            record["School"] = school  # 新增字段
+            yield record
 
 
 def csv_to_json(
@@ -15,14 +29,7 @@ def csv_to_json(
     encoding: str = "utf-8",
 ) -> list[dict]:
     """Convert the CSV at *csv_path* to the target JSON list."""
-    keep = ("Track name", "Artist name")  # 仅保留这两列
-    result: list[dict] = []
-
-    with open(csv_path, newline="", encoding=encoding) as f:
-        for row in csv.DictReader(f):
-            record = {k: row[k] for k in keep}
-            record["School"] = school  # 新增字段
-            result.append(record)
+    result = list(iter_records(csv_path, school=school, encoding=encoding))
 
     if output:  # 写文件；否则直接返回
         with open(output, "w", encoding=encoding) as out:
@@ -30,6 +37,26 @@ def csv_to_json(
     return result
 
 
+def csv_to_ndjson(
+    csv_path: str | Path,
+    *,
+    school: str,
+    output: str | Path,
+    encoding: str = "utf-8",
+) -> int:
+    """
+    Stream the CSV at *csv_path* to compact NDJSON (one record per line)
+    without holding it in memory. Returns the number of rows written.
+    """
+    rows = 0
+    with open(output, "w", encoding=encoding) as out:
+        for record in iter_records(csv_path, school=school, encoding=encoding):
+            out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            out.write("\n")
+            rows += 1
+    return rows
+
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(
         description="Convert a Spotify-like CSV to slim JSON (Track name, Artist name, School)."
@@ -41,8 +68,18 @@ if __name__ == "__main__":
     ap.add_argument(
         "-o", "--output", help="output JSON file (default: print to stdout)"
     )
+    ap.add_argument(
+        "--ndjson", action="store_true", help="write compact NDJSON instead of a JSON array"
+    )
     args = ap.parse_args()
 
-    data = csv_to_json(args.csvfile, school=args.school, output=args.output)
-    if args.output is None:  # 未指定 -o 时，打印到 stdout
-        print(json.dumps(data, ensure_ascii=False, indent=2))
+    if args.ndjson:
+        if args.output:
+            csv_to_ndjson(args.csvfile, school=args.school, output=args.output)
+        else:
+            for record in iter_records(args.csvfile, school=args.school):
+                print(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+    else:
+        data = csv_to_json(args.csvfile, school=args.school, output=args.output)
+        if args.output is None:  # 未指定 -o 时，打印到 stdout
+            print(json.dumps(data, ensure_ascii=False, indent=2))
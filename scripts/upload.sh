@@ -7,10 +7,14 @@ DIR="output"
 # 如果没有匹配，则 nullglob 会让 for 循环体跳过
 shopt -s nullglob
 
-for file in "${DIR}"/*.json; do
+for file in "${DIR}"/*.ndjson "${DIR}"/*.json; do
+  case "${file}" in
+    *.ndjson) content_type="application/x-ndjson" ;;
+    *)        content_type="application/json" ;;
+  esac
   echo "▶ Uploading ${file}..."
   curl -s -w "\nHTTP status: %{http_code}\n\n" \
        -X POST "${API_URL}" \
-       -H "Content-Type: application/json" \
+       -H "Content-Type: ${content_type}" \
        --data-binary @"${file}"
 done